@@ -0,0 +1,125 @@
+""" Bytes and CPU time per 1k messages of the htmlfile transport
+
+Messages are sent to a session in bursts, an htmlfile response streams
+them to a sink the way it would to an ASGI server. A burst is what queues
+up between two wakeups of the response: messages, a broadcast frame and
+every few bursts a heartbeat.
+
+    python benchmarks/htmlfile.py
+    python benchmarks/htmlfile.py --bursts 1,10,100 --codec orjson --json -
+
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+if not settings.configured:
+    settings.configure()
+    django.setup()
+
+from sockjs import SessionManager, protocol  # noqa: E402
+from sockjs.transports import HTMLFileConsumer  # noqa: E402
+
+DEFAULT_BURSTS = (1, 10, 100)
+
+
+async def handler(msg, session):
+    pass
+
+
+class Sink(object):
+    """Stand-in for an ASGI connection, counts response body chunks."""
+
+    def __init__(self):
+        self.chunks = 0
+        self.size = 0
+
+    async def __call__(self, message):
+        self.chunks += 1
+        self.size += len(message["body"])
+
+
+async def run_burst(burst, *, messages, codec, heartbeat_every=5):
+    manager = SessionManager("bench", handler, codec=codec)
+    session = manager.get("000000000", True)
+    transport = HTMLFileConsumer(manager=manager, session=session)
+    transport.maxsize = 1 << 62
+    transport.base_send = sink = Sink()
+    task = asyncio.ensure_future(transport.handle_session())
+    await asyncio.sleep(0)
+
+    message = "message from a busy room, %d"
+    sent = 0
+    bursts = 0
+    started = time.process_time()
+    while sent < messages:
+        for _ in range(min(burst, messages - sent) - 1):
+            session.send(message % sent)
+            sent += 1
+        manager.broadcast(message % sent)
+        sent += 1
+        bursts += 1
+        if bursts % heartbeat_every == 0:
+            session._feed(protocol.FRAME_HEARTBEAT, protocol.FRAME_HEARTBEAT)
+        await asyncio.sleep(0)  # the response wakes up and writes the burst
+    cpu = time.process_time() - started
+
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await manager.clear()
+    return {
+        "burst": burst,
+        "messages": messages,
+        "chunks": sink.chunks,
+        "bytes_per_1k": round(sink.size * 1000 / messages),
+        "cpu_ms_per_1k": round(cpu * 1e6 / messages, 3),
+    }
+
+
+async def run(bursts, *, messages, codec, rounds):
+    results = []
+    for burst in bursts:
+        # best CPU time of the rounds, the byte count does not change
+        rounds_results = [await run_burst(burst, messages=messages, codec=codec) for _ in range(rounds)]
+        results.append(min(rounds_results, key=lambda result: result["cpu_ms_per_1k"]))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0].strip())
+    parser.add_argument("--bursts", default=",".join(map(str, DEFAULT_BURSTS)),
+                        help="comma separated messages per wakeup")
+    parser.add_argument("--messages", type=int, default=20000, help="messages per round")
+    parser.add_argument("--rounds", type=int, default=5, help="rounds per burst size")
+    parser.add_argument("--codec", choices=sorted(protocol.CODECS), help="JSON codec, the default codec if not set")
+    parser.add_argument("--json", help="write results to this file, - for stdout")
+    args = parser.parse_args(argv)
+
+    bursts = tuple(int(value) for value in args.bursts.split(","))
+    results = asyncio.run(run(bursts, messages=args.messages, codec=args.codec, rounds=args.rounds))
+
+    if args.json:
+        report = {"codec": args.codec or protocol.default_codec.name, "results": results}
+        if args.json == "-":
+            json.dump(report, sys.stdout, indent=2)
+            sys.stdout.write("\n")
+        else:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+                f.write("\n")
+    else:
+        for result in results:
+            print("burst %5d %8d chunks %10d bytes/1k msgs %10.3f cpu ms/1k msgs" % (
+                result["burst"], result["chunks"], result["bytes_per_1k"], result["cpu_ms_per_1k"]))
+
+
+if __name__ == "__main__":
+    main()
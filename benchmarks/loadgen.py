@@ -0,0 +1,426 @@
+""" In-process load generator for SockJS endpoints
+
+Builds an echo endpoint with ``make_routing()`` and drives the ASGI
+application directly, with no server or network in between. Every
+transport gets ``--clients`` simulated clients; each one opens its session
+the way the SockJS client does (polling, streaming or websocket), then sends
+``--rate`` messages per second through the transport's send path and waits
+for the echoes. Reports, per transport, the echoed messages per second and
+percentiles of the send-to-receive latency.
+
+Sends follow a fixed schedule and latency is measured from the scheduled
+time, so a server that falls behind is charged for the wait of the messages
+queued behind it.
+
+    python benchmarks/loadgen.py
+    python benchmarks/loadgen.py --clients 200 --rate 20 --transport websocket --transport xhr
+    python benchmarks/loadgen.py --mixed --dispatcher --json results.json
+
+"""
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import quote_plus
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+if not settings.configured:
+    settings.configure()
+    django.setup()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+
+import sockjs  # noqa: E402
+from sockjs import SockJSDispatcher, make_routing  # noqa: E402
+
+FORMAT = 1
+PREFIX = "/sockjs"
+TRANSPORTS = ("websocket", "xhr", "xhr_streaming", "eventsource", "htmlfile", "jsonp", "raw_websocket")
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+async def echo(msg, session):
+    if msg.type == sockjs.MSG_MESSAGE:
+        session.send(msg.data)
+
+
+def make_application(routing, dispatcher=False):
+    if dispatcher:
+        return SockJSDispatcher(routing)
+    return ProtocolTypeRouter({
+        "http": URLRouter(routing.http),
+        "websocket": URLRouter(routing.websocket),
+    })
+
+
+class Stats(object):
+    """ Counters of one transport """
+
+    def __init__(self, transport, clients):
+        self.transport = transport
+        self.clients = clients
+        self.sent = 0
+        self.received = 0
+        self.errors = 0
+        self.latencies = []
+
+    def record(self, message):
+        sent_at = float(message.split(" ", 1)[0])
+        self.received += 1
+        self.latencies.append(time.perf_counter() - sent_at)
+
+    def percentile(self, latencies, pct):
+        if not latencies:
+            return None
+        idx = min(len(latencies) - 1, max(0, int(round(pct / 100.0 * len(latencies))) - 1))
+        return latencies[idx]
+
+    def result(self, elapsed):
+        latencies = sorted(self.latencies)
+        result = {
+            "transport": self.transport,
+            "clients": self.clients,
+            "sent": self.sent,
+            "received": self.received,
+            "errors": self.errors,
+            "messages_per_sec": round(self.received / elapsed, 1),
+        }
+        for pct in PERCENTILES:
+            value = self.percentile(latencies, pct)
+            result["p%s_ms" % pct] = None if value is None else round(value * 1e3, 3)
+        result["max_ms"] = round(latencies[-1] * 1e3, 3) if latencies else None
+        return result
+
+
+async def http_request(app, method, path, *, query=b"", body=b"", headers=(), on_body=None):
+    """Run one HTTP request through ``app``, return the response status."""
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("utf-8"),
+        "root_path": "",
+        "query_string": query,
+        "headers": [(b"host", b"localhost"), *headers],
+    }
+    requested = False
+    status = None
+
+    async def receive():
+        nonlocal requested
+        if requested:
+            return {"type": "http.disconnect"}
+        requested = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and on_body is not None:
+            on_body(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status
+
+
+class Client(object):
+    """ Simulated SockJS client
+
+    ``run()`` keeps the receiving side of the session going until the load
+    generator stops, ``send()`` sends one message.
+
+    """
+
+    transport = None
+
+    def __init__(self, app, stats, sid):
+        self.app = app
+        self.stats = stats
+        self.sid = sid
+        self.url = "%s/000/%s/" % (PREFIX, sid)
+        self.opened = asyncio.Event()
+        self.stopping = False
+
+    async def run(self):
+        raise NotImplementedError
+
+    async def send(self, message):
+        raise NotImplementedError
+
+    def on_frame(self, frame):
+        if frame == "o":
+            self.opened.set()
+        elif frame.startswith("a"):
+            for message in json.loads(frame[1:]):
+                self.stats.record(message)
+        elif frame.startswith("c"):
+            self.stats.errors += 1
+            self.stopping = True
+
+
+class WebsocketClient(Client):
+    transport = "websocket"
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.incoming = asyncio.Queue()
+
+    @property
+    def path(self):
+        return self.url + "websocket"
+
+    async def run(self):
+        scope = {
+            "type": "websocket",
+            "scheme": "ws",
+            "path": self.path,
+            "raw_path": self.path.encode("utf-8"),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", b"localhost")],
+            "subprotocols": [],
+        }
+        self.incoming.put_nowait({"type": "websocket.connect"})
+        await self.app(scope, self.incoming.get, self.on_message)
+
+    async def on_message(self, message):
+        if message["type"] == "websocket.send":
+            self.on_text(message.get("text") or message["bytes"].decode("utf-8"))
+        elif message["type"] == "websocket.close":
+            self.stopping = True
+
+    def on_text(self, text):
+        self.on_frame(text)
+
+    async def send(self, message):
+        self.incoming.put_nowait({"type": "websocket.receive", "text": json.dumps([message])})
+
+    def close(self):
+        self.incoming.put_nowait({"type": "websocket.disconnect", "code": 1000})
+
+
+class RawWebsocketClient(WebsocketClient):
+    transport = "raw_websocket"
+
+    @property
+    def path(self):
+        return PREFIX + "/websocket"
+
+    async def on_message(self, message):
+        if message["type"] == "websocket.accept":
+            self.opened.set()
+        await super().on_message(message)
+
+    def on_text(self, text):
+        self.stats.record(text)
+
+    async def send(self, message):
+        self.incoming.put_nowait({"type": "websocket.receive", "text": message})
+
+
+class HttpClient(Client):
+    """ Polling and streaming transports, messages are sent with xhr_send """
+
+    method = "POST"
+    query = b""
+
+    async def run(self):
+        while not self.stopping:
+            status = await http_request(self.app, self.method, self.url + self.transport,
+                                        query=self.query, on_body=self.on_body)
+            if status != 200:
+                self.stats.errors += 1
+                break
+
+    def on_body(self, body):
+        for frame in self.frames(body.decode("utf-8")):
+            self.on_frame(frame)
+
+    def frames(self, chunk):
+        return [frame for frame in chunk.split("\n") if frame]
+
+    async def send(self, message):
+        status = await http_request(self.app, "POST", self.url + "xhr_send",
+                                    body=json.dumps([message]).encode("utf-8"))
+        if status != 204:
+            self.stats.errors += 1
+
+
+class XhrClient(HttpClient):
+    transport = "xhr"
+
+
+class XhrStreamingClient(HttpClient):
+    transport = "xhr_streaming"
+
+
+class EventsourceClient(HttpClient):
+    transport = "eventsource"
+    method = "GET"
+
+    def frames(self, chunk):
+        return [part[6:] for part in chunk.split("\r\n\r\n") if part.startswith("data: ")]
+
+
+class HtmlfileClient(HttpClient):
+    transport = "htmlfile"
+    method = "GET"
+    query = b"c=p"
+
+    def frames(self, chunk):
+        if chunk.startswith("<script>\np(") and chunk.endswith(");\n</script>\r\n"):
+            return [json.loads(chunk[11:-14])]
+        return []
+
+
+class JsonpClient(HttpClient):
+    transport = "jsonp"
+    method = "GET"
+    query = b"c=p"
+
+    def frames(self, chunk):
+        if chunk.startswith("/**/p(") and chunk.endswith(");\r\n"):
+            return [json.loads(chunk[6:-4])]
+        return []
+
+    async def send(self, message):
+        body = "d=" + quote_plus(json.dumps([message]))
+        status = await http_request(self.app, "POST", self.url + "jsonp_send", body=body.encode("utf-8"),
+                                    headers=[(b"content-type", b"application/x-www-form-urlencoded")])
+        if status != 200:
+            self.stats.errors += 1
+
+
+CLIENTS = {client.transport: client for client in (
+    WebsocketClient, RawWebsocketClient, XhrClient, XhrStreamingClient,
+    EventsourceClient, HtmlfileClient, JsonpClient,
+)}
+
+
+async def send_loop(client, rate, phase, started, duration, padding):
+    """Send on a fixed schedule, the message carries its scheduled time."""
+    loop = asyncio.get_event_loop()
+    interval = 1.0 / rate
+    scheduled = started + interval * phase
+    offset = time.perf_counter() - loop.time()
+
+    while scheduled < started + duration and not client.stopping:
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        client.stats.sent += 1
+        await client.send("%r %s" % (scheduled + offset, padding))
+        scheduled += interval
+
+
+async def run(transports, *, clients, rate, duration, size, dispatcher, open_timeout=10.0):
+    routing = make_routing(echo, name="loadgen", prefix=PREFIX.strip("/"))
+    app = make_application(routing, dispatcher)
+    manager = routing.config["__sockjs_managers__"]["loadgen"]
+
+    stats = {transport: Stats(transport, clients) for transport in transports}
+    population = [CLIENTS[transport](app, stats[transport], "%s-%d" % (transport, idx))
+                  for transport in transports for idx in range(clients)]
+    receivers = [asyncio.ensure_future(client.run()) for client in population]
+
+    loop = asyncio.get_event_loop()
+    try:
+        await asyncio.wait_for(asyncio.gather(*(client.opened.wait() for client in population)),
+                               open_timeout)
+
+        started = loop.time()
+        padding = "x" * size
+        if rate > 0:
+            # spread the clients over the first interval
+            await asyncio.gather(*(send_loop(client, rate, idx / len(population), started, duration, padding)
+                                   for idx, client in enumerate(population)))
+        remaining = started + duration - loop.time()
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+
+        # wait a little for echoes in flight
+        deadline = loop.time() + 1.0
+        while loop.time() < deadline and any(s.received < s.sent for s in stats.values()):
+            await asyncio.sleep(0.01)
+        elapsed = loop.time() - started
+    finally:
+        for client, receiver in zip(population, receivers):
+            client.stopping = True
+            if isinstance(client, WebsocketClient):
+                client.close()
+            else:
+                receiver.cancel()
+        await asyncio.gather(*receivers, return_exceptions=True)
+        manager.stop()
+        await manager.clear()
+
+    return [stats[transport].result(elapsed) for transport in transports]
+
+
+def print_result(result):
+    latency = " ".join("p%s %8s" % (pct, "-" if result["p%s_ms" % pct] is None else "%.3f" % result["p%s_ms" % pct])
+                       for pct in PERCENTILES)
+    print("%-14s %5d clients %9.1f msg/s %8d sent %8d received %4d errors  latency ms: %s" % (
+        result["transport"], result["clients"], result["messages_per_sec"], result["sent"],
+        result["received"], result["errors"], latency))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0].strip())
+    parser.add_argument("--transport", action="append", choices=TRANSPORTS, default=[],
+                        help="transport to load, may be repeated, all by default")
+    parser.add_argument("--clients", type=int, default=100, help="clients per transport")
+    parser.add_argument("--rate", type=float, default=10.0, help="messages per second per client")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of sending")
+    parser.add_argument("--size", type=int, default=32, help="bytes of padding per message")
+    parser.add_argument("--mixed", action="store_true",
+                        help="load all transports at once instead of one after another")
+    parser.add_argument("--dispatcher", action="store_true",
+                        help="route with SockJSDispatcher instead of URLRouter")
+    parser.add_argument("--json", help="write results to this file, - for stdout")
+    args = parser.parse_args(argv)
+
+    transports = args.transport or list(TRANSPORTS)
+    options = dict(clients=args.clients, rate=args.rate, duration=args.duration,
+                   size=args.size, dispatcher=args.dispatcher)
+
+    results = []
+    for group in ([transports] if args.mixed else [[transport] for transport in transports]):
+        group_results = asyncio.run(run(group, **options))
+        results.extend(group_results)
+        if args.json != "-":
+            for result in group_results:
+                print_result(result)
+
+    if args.json:
+        report = {
+            "format": FORMAT,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sockjs": sockjs.__version__,
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "options": dict(options, mixed=args.mixed),
+            "results": results,
+        }
+        if args.json == "-":
+            json.dump(report, sys.stdout, indent=2)
+            sys.stdout.write("\n")
+        else:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+                f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
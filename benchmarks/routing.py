@@ -0,0 +1,98 @@
+""" Cost of routing SockJS urls
+
+Routes xhr_send requests for an unknown session (answered with a 404 by
+the SockJS route handler) to the last of 1, 10 and 100 endpoints, once
+through a Channels ``URLRouter`` over ``routing.http`` plus a catch-all
+url, and once through ``SockJSDispatcher``. Reports microseconds per
+request.
+
+    python benchmarks/routing.py --requests 5000
+
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+if not settings.configured:
+    settings.configure()
+    django.setup()
+
+from channels.routing import URLRouter  # noqa: E402
+from django.urls import re_path  # noqa: E402
+
+from sockjs import SockJSDispatcher  # noqa: E402
+from sockjs.routing import Routing, add_endpoint  # noqa: E402
+
+
+async def handler(msg, session):
+    pass
+
+
+async def catch_all(scope, receive, send):
+    pass
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+def make_routing(endpoints):
+    routing = Routing(http=[], websocket=[], config={})
+    for idx in range(endpoints):
+        add_endpoint(routing, handler, name="bench%d" % idx, prefix="bench%d/sockjs" % idx)
+    return routing
+
+
+async def measure(app, path, count):
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": path,
+        "query_string": b"",
+        "headers": [],
+    }
+
+    started = time.perf_counter()
+    for _ in range(count):
+        await app(scope, receive, send)
+    return (time.perf_counter() - started) / count * 1e6
+
+
+async def run(endpoints, count):
+    routing = make_routing(endpoints)
+    path = "/bench%d/sockjs/000/unknown/xhr_send" % (endpoints - 1)
+
+    router = URLRouter([*routing.http, re_path(r"", catch_all)])
+    dispatcher = SockJSDispatcher(routing, fallback=catch_all)
+
+    result = (await measure(router, path, count), await measure(dispatcher, path, count))
+
+    for manager in routing.config["__sockjs_managers__"].values():
+        manager.stop()
+        await manager.clear()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0].strip())
+    parser.add_argument("--requests", type=int, default=5000, help="requests per measurement")
+    args = parser.parse_args(argv)
+
+    for endpoints in (1, 10, 100):
+        router, dispatcher = asyncio.run(run(endpoints, args.requests))
+        print("%3d endpoints: URLRouter %6.1f us, SockJSDispatcher %6.1f us" % (endpoints, router, dispatcher))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+""" Memory footprint of idle sessions
+
+Opens sessions through a session manager the way a transport does
+(acquire, consume the open frame, release) and reports the memory
+allocated per session, measured with tracemalloc.
+
+    python benchmarks/session_memory.py --sessions 20000
+
+"""
+import argparse
+import asyncio
+import gc
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sockjs import SessionManager  # noqa: E402
+
+
+async def handler(msg, session):
+    pass
+
+
+async def open_sessions(manager, count):
+    for idx in range(count):
+        session = manager.get("%09d" % idx, True)
+        await manager.acquire(session)
+        await session.wait()
+        await manager.release(session)
+
+
+async def measure(count):
+    manager = SessionManager("bench", handler)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    await open_sessions(manager, count)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    await manager.clear()
+    return (after - before) / count, snapshot
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0].strip())
+    parser.add_argument("--sessions", type=int, default=10000, help="number of sessions to open")
+    parser.add_argument("--top", type=int, default=0, help="show the top allocation sites")
+    args = parser.parse_args(argv)
+
+    per_session, snapshot = asyncio.run(measure(args.sessions))
+    print("%d idle sessions: %.0f bytes per session" % (args.sessions, per_session))
+
+    for stat in snapshot.statistics("lineno")[:args.top]:
+        print("  %s" % stat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+""" Micro-benchmarks of protocol, session, manager and transport hot paths
+
+Every benchmark runs at each of the requested session counts (benchmarks
+that do not depend on the number of sessions run once). For each one the
+runner reports operations per second (best of several timed rounds),
+memory blocks still held after a round per operation and the peak of
+traced memory during a round, measured in a separate, untimed round.
+
+Retained blocks show what operations keep (queued frames, caches), not
+what they allocate: temporaries freed within an operation are not seen,
+CPython does not count allocations, only the blocks in use.
+
+    python benchmarks/suite.py
+    python benchmarks/suite.py --sessions 1,1000 --filter manager
+    python benchmarks/suite.py --json results.json
+    python benchmarks/suite.py --filter stream --codec orjson
+
+JSON output has a stable layout so runs can be diffed::
+
+    {"format": 2, "python": ..., "platform": ..., "sockjs": ..., "codec": ..., "created": ...,
+     "results": [{"name": ..., "sessions": ..., "ops_per_sec": ..., "mean_us": ...,
+                  "rounds": ..., "number": ..., "retained_blocks_per_op": ..., "peak_bytes": ...}]}
+
+"""
+import argparse
+import asyncio
+import functools
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+if not settings.configured:
+    settings.configure()
+    django.setup()
+
+import sockjs  # noqa: E402
+from sockjs import SessionManager, protocol, transports  # noqa: E402
+
+FORMAT = 2  # 2: blocks_per_op renamed to retained_blocks_per_op
+DEFAULT_SESSIONS = (1, 1000, 100000)
+
+codec = None  # codec of the benchmarked session managers, --codec
+
+BENCHMARKS = []
+
+
+def benchmark(name, scaled=True):
+    """Register ``setup(sessions) -> Bench`` as benchmark ``name``.
+
+    Benchmarks that are not ``scaled`` ignore the number of sessions and
+    run once, with ``sessions`` set to 1.
+
+    """
+    def decorator(setup):
+        BENCHMARKS.append((name, scaled, setup))
+        return setup
+
+    return decorator
+
+
+class Bench(object):
+    """ Operation to measure
+
+    ``op`` is called (or awaited) repeatedly, ``reset`` runs untimed between
+    rounds to bring state back (i.e. drain queues), ``teardown`` runs once.
+
+    """
+
+    def __init__(self, op, *, reset=None, teardown=None, number=None):
+        self.op = op
+        self.reset = reset
+        self.teardown = teardown
+        self.number = number  # operations per round, calibrated if not set
+        self.is_async = asyncio.iscoroutinefunction(op)
+
+    async def round(self, number):
+        op = self.op
+        if self.reset is not None:
+            self.reset()
+
+        if self.is_async:
+            started = time.perf_counter()
+            for _ in range(number):
+                await op()
+        else:
+            started = time.perf_counter()
+            for _ in range(number):
+                op()
+        return time.perf_counter() - started
+
+
+async def handler(msg, session):
+    pass
+
+
+def make_manager(sessions, **kwargs):
+    manager = SessionManager("bench", handler, codec=codec, **kwargs)
+    for idx in range(sessions):
+        session = manager.get("%09d" % idx, True)
+        session.state = protocol.STATE_OPEN
+    return manager
+
+
+def drain(manager):
+    for session in manager.values():
+        session._take_queue()
+
+
+async def clear(manager):
+    manager.stop()
+    await manager.clear()
+
+
+# protocol
+
+@benchmark("protocol.message_frame", scaled=False)
+def bench_message_frame(sessions):
+    return Bench(lambda: protocol.message_frame("message"))
+
+
+@benchmark("protocol.messages_frame", scaled=False)
+def bench_messages_frame(sessions):
+    messages = ["message %d" % idx for idx in range(10)]
+    return Bench(lambda: protocol.messages_frame(messages))
+
+
+@benchmark("protocol.close_frame", scaled=False)
+def bench_close_frame(sessions):
+    return Bench(lambda: protocol.close_frame(3000, "Go away!"))
+
+
+# session
+
+@benchmark("session.feed_wait")
+def bench_feed_wait(sessions):
+    manager = make_manager(sessions)
+    ring = list(manager.values())
+    position = [0]
+
+    async def op():
+        session = ring[position[0]]
+        position[0] = (position[0] + 1) % len(ring)
+        session._feed(protocol.FRAME_MESSAGE, "message")
+        await session.wait()
+
+    return Bench(op, teardown=lambda: clear(manager))
+
+
+@benchmark("session.feed_wait_batch", scaled=False)
+def bench_feed_wait_batch(sessions):
+    manager = make_manager(1)
+    session = manager["000000000"]
+    blob = protocol.SharedFrame(protocol.message_frame("broadcast"))
+
+    async def op():
+        for _ in range(5):
+            session._feed(protocol.FRAME_MESSAGE, "message")
+            session._feed(protocol.FRAME_MESSAGE_BLOB, blob)
+        await session.wait()
+
+    return Bench(op, teardown=lambda: clear(manager))
+
+
+# session manager
+
+@benchmark("manager.get")
+def bench_manager_get(sessions):
+    manager = make_manager(sessions)
+    sids = list(manager)
+    position = [0]
+
+    def op():
+        manager.get(sids[position[0]])
+        position[0] = (position[0] + 1) % len(sids)
+
+    return Bench(op, teardown=lambda: clear(manager))
+
+
+@benchmark("manager.get_create")
+def bench_manager_get_create(sessions):
+    manager = make_manager(sessions)
+    counter = [sessions]
+
+    def op():
+        manager.get("%09d" % counter[0], True)
+        counter[0] += 1
+
+    return Bench(op, teardown=lambda: clear(manager))
+
+
+@benchmark("manager.broadcast")
+def bench_manager_broadcast(sessions):
+    manager = make_manager(sessions)
+    return Bench(lambda: manager.broadcast("message"), reset=lambda: drain(manager),
+                 teardown=lambda: clear(manager), number=max(1, 10000 // sessions))
+
+
+@benchmark("manager.publish")
+def bench_manager_publish(sessions):
+    manager = make_manager(sessions)
+    for session in manager.values():
+        manager.subscribe(session, "room")
+    return Bench(lambda: manager.publish("room", "message"), reset=lambda: drain(manager),
+                 teardown=lambda: clear(manager), number=max(1, 10000 // sessions))
+
+
+async def gc_pass(manager):
+    await manager._gc_task()
+    manager.stop()  # drop the timer of the next pass
+
+
+@benchmark("manager.gc_idle")
+def bench_manager_gc_idle(sessions):
+    manager = make_manager(sessions)
+    return Bench(functools.partial(gc_pass, manager), teardown=lambda: clear(manager))
+
+
+@benchmark("manager.gc_reap")
+def bench_manager_gc_reap(sessions):
+    manager = SessionManager("bench", handler, gc_budget=3600.0, codec=codec)
+
+    def reset():
+        for idx in range(sessions):
+            session = manager.get("%09d" % idx, True)
+            session._tick(-1.0)
+
+    return Bench(functools.partial(gc_pass, manager), reset=reset, teardown=lambda: clear(manager), number=1)
+
+
+# transports
+
+class TransportSink(object):
+    """Stand-in for an ASGI connection."""
+
+    async def __call__(self, message):
+        pass
+
+
+def make_http_transport(consumer):
+    manager = make_manager(1)
+    transport = consumer(manager=manager, session=manager["000000000"])
+    transport.base_send = TransportSink()
+    transport.callback = "callback"
+    return transport
+
+
+def bench_http_send_message(consumer):
+    def setup(sessions):
+        transport = make_http_transport(consumer)
+        transport.maxsize = 1 << 62
+        frame = protocol.message_frame("message")
+
+        async def op():
+            await transport.send_message(frame, more_body=True)
+
+        return Bench(op, teardown=lambda: clear(transport.manager))
+
+    return setup
+
+
+def bench_http_stream(consumer):
+    # a message from the session queue to the ASGI send, as the streaming loop does it
+    def setup(sessions):
+        transport = make_http_transport(consumer)
+        transport.maxsize = 1 << 62
+        session = transport.session
+
+        async def op():
+            session._feed(protocol.FRAME_MESSAGE, "message")
+            frame, payload = await session.wait(encoded=True)
+            await transport.send_message(payload, more_body=True)
+
+        return Bench(op, teardown=lambda: clear(transport.manager))
+
+    return setup
+
+
+for _cid in ("xhr", "xhr_streaming", "eventsource", "htmlfile", "jsonp"):
+    benchmark("transport.%s.send_message" % _cid, scaled=False)(
+        bench_http_send_message(transports.consumers[_cid][1]))
+    benchmark("transport.%s.stream" % _cid, scaled=False)(
+        bench_http_stream(transports.consumers[_cid][1]))
+
+
+@benchmark("transport.websocket.send", scaled=False)
+def bench_websocket_send(sessions):
+    manager = make_manager(1)
+    transport = transports.WebsocketConsumer(manager=manager, session=manager["000000000"])
+    transport.base_send = TransportSink()
+    frame = protocol.message_frame("message")
+
+    async def op():
+        await transport.send(frame)
+
+    return Bench(op, teardown=lambda: clear(manager))
+
+
+# runner
+
+def calibrate_number(seconds_per_op, min_time):
+    return max(1, int(min_time / max(seconds_per_op, 1e-9)))
+
+
+async def run_benchmark(name, sessions, setup, *, rounds, min_time):
+    bench = setup(sessions)
+    try:
+        number = bench.number
+        if number is None:
+            elapsed = await bench.round(1)
+            number = calibrate_number(elapsed, min_time)
+            elapsed = await bench.round(number)
+            number = calibrate_number(elapsed / number, min_time)
+
+        best = min([await bench.round(number) for _ in range(rounds)])
+
+        # memory, untimed
+        if bench.reset is not None:
+            bench.reset()
+        gc.collect()
+        tracemalloc.start()
+        blocks = sys.getallocatedblocks()  # blocks in use, not allocations
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        await bench.round(number)
+        peak = tracemalloc.get_traced_memory()[1] - base
+        blocks = sys.getallocatedblocks() - blocks
+        tracemalloc.stop()
+    finally:
+        if bench.teardown is not None:
+            await bench.teardown()
+
+    return {
+        "name": name,
+        "sessions": sessions,
+        "ops_per_sec": round(number / best, 1),
+        "mean_us": round(best / number * 1e6, 3),
+        "rounds": rounds,
+        "number": number,
+        "retained_blocks_per_op": round(blocks / number, 3),
+        "peak_bytes": peak,
+    }
+
+
+async def run(names, session_counts, *, rounds, min_time, progress=None):
+    results = []
+    for name, scaled, setup in BENCHMARKS:
+        if names and not any(part in name for part in names):
+            continue
+        for sessions in (session_counts if scaled else (1,)):
+            result = await run_benchmark(name, sessions, setup, rounds=rounds, min_time=min_time)
+            results.append(result)
+            if progress is not None:
+                progress(result)
+    return results
+
+
+def print_result(result):
+    print("%-34s %7d sessions %14.1f ops/s %10.3f us %8.2f retained blocks/op %10d peak bytes" % (
+        result["name"], result["sessions"], result["ops_per_sec"], result["mean_us"],
+        result["retained_blocks_per_op"], result["peak_bytes"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0].strip())
+    parser.add_argument("--sessions", default=",".join(map(str, DEFAULT_SESSIONS)),
+                        help="comma separated session counts")
+    parser.add_argument("--filter", action="append", default=[],
+                        help="run benchmarks with names containing this, may be repeated")
+    parser.add_argument("--rounds", type=int, default=5, help="timed rounds per benchmark")
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds per round")
+    parser.add_argument("--json", help="write results to this file, - for stdout")
+    parser.add_argument("--codec", choices=sorted(protocol.CODECS), help="JSON codec, the default codec if not set")
+    args = parser.parse_args(argv)
+
+    global codec
+    codec = args.codec
+
+    session_counts = tuple(int(value) for value in args.sessions.split(","))
+    progress = None if args.json == "-" else print_result
+    results = asyncio.run(run(args.filter, session_counts, rounds=args.rounds,
+                              min_time=args.min_time, progress=progress))
+
+    if args.json:
+        report = {
+            "format": FORMAT,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sockjs": sockjs.__version__,
+            "codec": codec or protocol.default_codec.name,
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "results": results,
+        }
+        if args.json == "-":
+            json.dump(report, sys.stdout, indent=2)
+            sys.stdout.write("\n")
+        else:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+                f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
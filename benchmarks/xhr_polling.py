@@ -0,0 +1,84 @@
+""" Throughput of xhr polling requests
+
+Runs xhr polls for one session straight through the SockJS route
+handler, with a message waiting on every poll, and reports requests
+per second. No server or network is involved, the number is the cost
+of the SockJS dispatch and consumer path.
+
+    python benchmarks/xhr_polling.py --requests 20000
+
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+if not settings.configured:
+    settings.configure()
+    django.setup()
+
+from sockjs import SessionManager, transports  # noqa: E402
+from sockjs.routing import SockJSRoute  # noqa: E402
+
+
+async def handler(msg, session):
+    pass
+
+
+def make_scope(sid):
+    return {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "POST",
+        "path": "/sockjs/000/%s/xhr" % sid,
+        "query_string": b"",
+        "headers": [(b"host", b"localhost"), (b"origin", b"http://localhost")],
+        "url_route": {"args": (), "kwargs": {"server": "000", "sid": sid, "cid": "xhr"}},
+    }
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+async def run(count):
+    manager = SessionManager("bench", handler)
+    route = SockJSRoute(manager, transports.consumers, ())
+    scope = make_scope("bench")
+
+    # open the session
+    await route.handler(dict(scope), receive, send)
+    session = manager["bench"]
+
+    started = time.perf_counter()
+    for _ in range(count):
+        session.send("message")
+        await route.handler(dict(scope), receive, send)
+    elapsed = time.perf_counter() - started
+
+    manager.stop()
+    await manager.clear()
+    return count / elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0].strip())
+    parser.add_argument("--requests", type=int, default=10000, help="number of polls")
+    args = parser.parse_args(argv)
+
+    rate = asyncio.run(run(args.requests))
+    print("xhr polling: %d requests, %.0f requests/sec" % (args.requests, rate))
+
+
+if __name__ == "__main__":
+    main()
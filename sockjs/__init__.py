@@ -1,5 +1,12 @@
+from .clock import LoopClock
+from .clock import VirtualClock
+from .constants import OVERFLOW_CLOSE
+from .constants import OVERFLOW_DROP_NEWEST
+from .constants import OVERFLOW_DROP_OLDEST
 from .exceptions import SessionIsAcquired
 from .exceptions import SessionIsClosed
+from .hooks import Hooks
+from .layers import LayerSessionManager
 from .protocol import MSG_CLOSE
 from .protocol import MSG_CLOSED
 from .protocol import MSG_MESSAGE
@@ -8,19 +15,35 @@ from .protocol import STATE_CLOSED
 from .protocol import STATE_CLOSING
 from .protocol import STATE_NEW
 from .protocol import STATE_OPEN
+from .routing import SockJSDispatcher
 from .routing import get_manager, make_routing
+from .session import DictSession
 from .session import Session
 from .session import SessionManager
+from .store import CacheSessionStore
+from .store import MemorySessionStore
+from .store import SessionStore
+from .transports import StreamingBudget
 
 __version__ = "0.1.2"
 
 __all__ = (
     "get_manager",
     "make_routing",
+    "SockJSDispatcher",
     "Session",
+    "DictSession",
     "SessionManager",
+    "Hooks",
+    "StreamingBudget",
+    "LayerSessionManager",
+    "SessionStore",
+    "MemorySessionStore",
+    "CacheSessionStore",
     "SessionIsClosed",
     "SessionIsAcquired",
+    "LoopClock",
+    "VirtualClock",
     "STATE_NEW",
     "STATE_OPEN",
     "STATE_CLOSING",
@@ -29,4 +52,7 @@ __all__ = (
     "MSG_MESSAGE",
     "MSG_CLOSE",
     "MSG_CLOSED",
+    "OVERFLOW_DROP_OLDEST",
+    "OVERFLOW_DROP_NEWEST",
+    "OVERFLOW_CLOSE",
 )
@@ -0,0 +1,136 @@
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import timedelta
+
+
+def to_seconds(value):
+    """Convert ``timedelta`` or number of seconds to float seconds."""
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return float(value)
+
+
+class Clock(object):
+    """ Time source for sessions, garbage collection and cache headers
+
+    ``time()`` returns monotonic float seconds, ``wall()`` returns unix time
+    and ``call_at()``/``call_later()`` schedule callbacks on the clock's time.
+
+    """
+
+    def time(self):
+        raise NotImplementedError
+
+    def wall(self):
+        raise NotImplementedError
+
+    def call_at(self, when, callback):
+        raise NotImplementedError
+
+    def call_later(self, delay, callback):
+        return self.call_at(self.time() + delay, callback)
+
+
+class LoopClock(Clock):
+    """ Coarse event loop clock
+
+    The loop time is read once per loop iteration and cached until the next
+    one, so hot paths asking for the time many times per iteration pay for a
+    single read. Outside of a running loop it falls back to ``time.monotonic()``.
+
+    """
+
+    def __init__(self):
+        self._now = None
+        self._wall = None
+
+    def _reset(self):
+        self._now = None
+        self._wall = None
+
+    def _cache(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+
+        self._now = loop.time()
+        self._wall = time.time()
+        loop.call_soon(self._reset)
+        return True
+
+    def time(self):
+        if self._now is None and not self._cache():
+            return time.monotonic()
+        return self._now
+
+    def wall(self):
+        if self._wall is None and not self._cache():
+            return time.time()
+        return self._wall
+
+    def call_at(self, when, callback):
+        return asyncio.get_event_loop().call_at(when, callback)
+
+
+class VirtualTimerHandle(object):
+    __slots__ = ("when", "callback", "cancelled")
+
+    def __init__(self, when, callback):
+        self.when = when
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class VirtualClock(Clock):
+    """ Manually advanced clock for tests and benchmarks
+
+    Time only moves on ``advance()``, which runs the callbacks scheduled on the
+    clock in deadline order and lets the event loop run the tasks they spawn,
+    so hours of heartbeats and expiry can be simulated in no time.
+
+    """
+
+    def __init__(self, start=0.0, epoch=None):
+        self._now = float(start)
+        self._epoch = time.time() - self._now if epoch is None else epoch
+        self._timers = []
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return sum(1 for _, _, handle in self._timers if not handle.cancelled)
+
+    def time(self):
+        return self._now
+
+    def wall(self):
+        return self._epoch + self._now
+
+    def call_at(self, when, callback):
+        handle = VirtualTimerHandle(when, callback)
+        heapq.heappush(self._timers, (when, next(self._counter), handle))
+        return handle
+
+    async def advance(self, seconds):
+        """Move time forward by ``seconds``, running due callbacks on the way."""
+        target = self._now + seconds
+        timers = self._timers
+
+        while timers and timers[0][0] <= target:
+            when, _, handle = heapq.heappop(timers)
+            if handle.cancelled:
+                continue
+
+            self._now = max(self._now, when)
+            handle.callback()
+            await asyncio.sleep(0)
+
+        self._now = target
+
+
+default_clock = LoopClock()
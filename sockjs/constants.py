@@ -2,6 +2,23 @@ from datetime import timedelta
 
 DEFAULT_SESSION_TIMEOUT = timedelta(seconds=600)
 DEFAULT_GC_INTERVAL = 5.0
+DEFAULT_GC_BUDGET = 0.005
+DEFAULT_STORE_POLL_INTERVAL = 0.5
+STORE_RENEW_RATIO = 0.25  # held sessions renew their store lock and record after this part of their timeout
 DEFAULT_HEARTBEAT_INTERVAL = 25.0
+DEFAULT_HEARTBEAT_SLOTS = 64
+DEFAULT_HEARTBEAT_JITTER = 0.25
+DEFAULT_LAYER_BATCH_SIZE = 100
+DEFAULT_LAYER_GROUP_REFRESH = 3600.0
+DEFAULT_LAYER_RETRY_DELAY = 1.0  # first delay before a failed layer listener restarts, doubled up to the max
+DEFAULT_LAYER_MAX_RETRY_DELAY = 30.0
+
+# What a session does with a new message when its send queue is full
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DROP_NEWEST = "drop_newest"
+OVERFLOW_CLOSE = "close"
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_CLOSE)
+DEFAULT_QUEUE_OVERFLOW = OVERFLOW_DROP_OLDEST
+QUEUE_OVERFLOW_CLOSE = (3000, "Send queue overflow")
 
 SOCKJS_CDN = "https://cdn.jsdelivr.net/npm/sockjs-client@1/dist/sockjs.min.js"  # noqa
@@ -0,0 +1,120 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from .hooks import clock
+
+_handler_thread = threading.local()  # event loop of the sync handler call running in a thread
+
+
+def threadsafe(method):
+    """ Run ``method`` on the event loop when a sync handler calls it
+
+    Sessions and managers are not thread-safe. Called from the thread of a
+    sync handler, the call is scheduled on the event loop the handler was
+    called from, in call order, and returns ``None``.
+
+    """
+
+    @functools.wraps(method)
+    def call(*args, **kwargs):
+        loop = getattr(_handler_thread, "loop", None)
+        if loop is None:
+            return method(*args, **kwargs)
+        loop.call_soon_threadsafe(functools.partial(method, *args, **kwargs))
+
+    return call
+
+
+def _call_handler(loop, handler, msg, session):
+    # Drop stale database connections of the thread like database_sync_to_async,
+    # transports do not close them per ASGI message.
+    _handler_thread.loop = loop
+    close_old_connections()
+    try:
+        return handler(msg, session)
+    finally:
+        close_old_connections()
+        _handler_thread.loop = None
+
+
+def sync_handler(handler):
+    """Run sync ``handler`` with ``sync_to_async``, see ``threadsafe``."""
+    call = sync_to_async(_call_handler)
+
+    async def handle(msg, session):
+        return await call(asyncio.get_running_loop(), handler, msg, session)
+
+    return handle
+
+
+class HandlerExecutor(object):
+    """ Runs a synchronous handler on a bounded thread pool
+
+    Calls of different sessions run in parallel on up to ``max_workers``
+    threads, calls of one session run one after another in the order they
+    were made. A session has at most one call in the pool, so the pool
+    queue never holds more calls than there are sessions.
+
+    Calls waiting for a thread and the time they waited are counted in
+    ``metrics``, the ``SessionMetrics`` of the endpoint's manager. Session
+    and manager calls of the handler run on the event loop, see ``threadsafe``.
+
+    """
+
+    def __init__(self, handler, max_workers=None, *, metrics=None):
+        self.handler = handler
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="sockjs-handler")
+        self.metrics = metrics
+        self._tails = {}  # session -> future that is done when its last call ends
+        self._lock = threading.Lock()  # metrics are updated from the pool threads
+
+    async def __call__(self, msg, session):
+        loop = asyncio.get_running_loop()
+        tails = self._tails
+        previous = tails.get(session)
+        tail = tails[session] = loop.create_future()
+        future = None
+        try:
+            if previous is not None and not previous.done():
+                await asyncio.wait((previous,))  # unlike await, does not cancel it with this call
+
+            self._account(1)
+            try:
+                future = self.executor.submit(self._run, loop, clock(), msg, session)
+            except BaseException:
+                self._account(-1)
+                raise
+
+            # the next call of the session starts when this one ends, even if it is cancelled
+            future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._done, session, tail))
+            return await asyncio.wrap_future(future, loop=loop)
+        finally:
+            if future is None:
+                self._done(session, tail)
+
+    def _account(self, queued, waited=None):
+        metrics = self.metrics
+        if metrics is not None:
+            with self._lock:
+                metrics.handler_queued += queued
+                if waited is not None:
+                    metrics.handler_calls += 1
+                    metrics.handler_wait_seconds += waited
+
+    def _run(self, loop, queued_at, msg, session):
+        self._account(-1, clock() - queued_at)
+        return _call_handler(loop, self.handler, msg, session)
+
+    def _done(self, session, tail):
+        if not tail.done():
+            tail.set_result(None)
+        if self._tails.get(session) is tail:
+            del self._tails[session]
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,64 @@
+import time
+
+HOOKS = (
+    "on_feed",  # (session, frame, timestamp), a frame is queued
+    "on_dequeue",  # (session, frame, timestamp), a frame is handed to a transport
+    "on_transport_write",  # (transport, session, size, timestamp), bytes are written to a client
+    "on_handler_start",  # (session, message, timestamp), the handler is called
+    "on_handler_end",  # (session, message, duration, exception), the handler returned or raised
+    "on_gc_pass",  # (manager, duration, reaped), a garbage collector pass finished
+)
+
+clock = time.perf_counter  # timestamps and durations passed to hooks
+
+
+class Hooks(object):
+    """ Instrumentation callbacks of session managers
+
+    Every hook is an attribute that is ``None`` while nothing is registered
+    for it, call sites check it before doing any work, so instrumentation
+    costs an attribute lookup when it is not used. With several callbacks
+    registered for a hook the attribute calls them in order.
+
+    Callbacks are plain functions, they run inline on the hot path and
+    should only record what they are given. Timestamps and durations are
+    ``time.perf_counter()`` seconds.
+
+    """
+
+    __slots__ = HOOKS + ("_callbacks",)
+
+    def __init__(self):
+        self._callbacks = {}
+        for name in HOOKS:
+            setattr(self, name, None)
+
+    def register(self, name, callback=None):
+        """Register callback for hook, can be used as a decorator."""
+        if name not in HOOKS:
+            raise ValueError("Unknown hook: %r" % (name,))
+        if callback is None:
+            return lambda callback: self.register(name, callback)
+
+        self._callbacks.setdefault(name, []).append(callback)
+        self._update(name)
+        return callback
+
+    def unregister(self, name, callback):
+        callbacks = self._callbacks.get(name, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+            self._update(name)
+
+    def _update(self, name):
+        callbacks = tuple(self._callbacks.get(name, ()))
+        if not callbacks:
+            setattr(self, name, None)
+        elif len(callbacks) == 1:
+            setattr(self, name, callbacks[0])
+        else:
+            def call(*args):
+                for callback in callbacks:
+                    callback(*args)
+
+            setattr(self, name, call)
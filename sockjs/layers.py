@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import re
+import uuid
+from collections import deque
+
+from channels.layers import DEFAULT_CHANNEL_LAYER, get_channel_layer
+
+from .constants import DEFAULT_LAYER_BATCH_SIZE, DEFAULT_LAYER_GROUP_REFRESH
+from .constants import DEFAULT_LAYER_RETRY_DELAY, DEFAULT_LAYER_MAX_RETRY_DELAY
+from .session import SessionManager
+
+logger = logging.getLogger("sockjs")
+
+LAYER_MESSAGE_TYPE = "sockjs.publish"
+
+
+class LayerSessionManager(SessionManager):
+    """ Session manager that broadcasts through a Channels channel layer
+
+    Broadcasts and topic publishes are delivered to local sessions right away
+    and sent once to the layer group of the endpoint, every other worker with
+    a manager of the same name fans them out to its own sessions.
+
+    Messages published during one loop iteration (or ``batch_delay`` seconds)
+    are sent together, up to ``batch_size`` messages per layer message, by a
+    single sender task so they reach other workers in order. Broadcasts from
+    other threads, i.e. sync handlers, are handed to the event loop.
+
+    The listener is restarted with a growing delay when the layer fails,
+    i.e. on a lost Redis connection.
+
+    """
+
+    _listener = None  # channel layer receive task
+    _sender = None  # channel layer send task
+
+    def __init__(self, name, handler, *, channel_layer=None,
+                 batch_size=DEFAULT_LAYER_BATCH_SIZE, batch_delay=0.0, **kwargs):
+        super().__init__(name, handler, **kwargs)
+
+        if channel_layer is None or isinstance(channel_layer, str):
+            channel_layer = get_channel_layer(channel_layer or DEFAULT_CHANNEL_LAYER)
+        if channel_layer is None:
+            raise ValueError("Channel layer is not configured.")
+
+        self.channel_layer = channel_layer
+        self.group = "sockjs.%s" % re.sub(r"[^\w.-]", "_", name)
+        self.origin = uuid.uuid4().hex
+        self.batch_size = max(1, batch_size)
+        self.batch_delay = batch_delay
+
+        self._loop = None
+        self._channel = None
+        self._pending = []
+        self._flush_scheduled = False
+        self._outbox = deque()  # batches waiting for the sender task
+        self._retry_delay = DEFAULT_LAYER_RETRY_DELAY
+
+    def start(self):
+        super().start()
+        if self._listener is None or self._listener.done():
+            self._loop = asyncio.get_event_loop()
+            self._listener = asyncio.ensure_future(self._listen())
+
+    def stop(self):
+        super().stop()
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+    def _on_loop(self):
+        """Whether the caller runs on the event loop of the manager."""
+        if self._loop is None:
+            return True
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    async def _listen(self):
+        while True:
+            try:
+                await self._receive()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                delay = self._retry_delay
+                self._retry_delay = min(delay * 2, DEFAULT_LAYER_MAX_RETRY_DELAY)
+                logger.exception("Channel layer listener of group %s failed, restarting in %.1f seconds.",
+                                 self.group, delay)
+                await asyncio.sleep(delay)
+
+    async def _receive(self):
+        loop = asyncio.get_event_loop()
+        layer = self.channel_layer
+        if self._channel is None:
+            self._channel = await layer.new_channel()
+        channel = self._channel
+        await layer.group_add(self.group, channel)
+        refreshed = loop.time()
+
+        while True:
+            try:
+                message = await asyncio.wait_for(layer.receive(channel), DEFAULT_LAYER_GROUP_REFRESH)
+            except asyncio.TimeoutError:
+                message = None
+            self._retry_delay = DEFAULT_LAYER_RETRY_DELAY  # the layer works again
+
+            # Renew the group membership before it expires.
+            if loop.time() - refreshed >= DEFAULT_LAYER_GROUP_REFRESH:
+                await layer.group_add(self.group, channel)
+                refreshed = loop.time()
+
+            if message is None:
+                continue
+
+            if message.get("type") != LAYER_MESSAGE_TYPE or message.get("origin") == self.origin:
+                continue
+
+            for topic, data in message["messages"]:
+                try:
+                    if topic is None:
+                        super().broadcast(data)
+                    else:
+                        super().publish(topic, data)
+                except Exception:
+                    logger.exception("Exception in channel layer message handling.")
+
+    def broadcast(self, message):
+        if not self._on_loop():
+            self._loop.call_soon_threadsafe(self.broadcast, message)
+            return
+        super().broadcast(message)
+        self._queue(None, message)
+
+    def publish(self, topic, message):
+        if not self._on_loop():
+            self._loop.call_soon_threadsafe(self.publish, topic, message)
+            return
+        super().publish(topic, message)
+        self._queue(topic, message)
+
+    def _queue(self, topic, message):
+        self._pending.append((topic, message))
+        if self._flush_scheduled:
+            return
+
+        self._flush_scheduled = True
+        loop = self._loop or asyncio.get_event_loop()
+        if self.batch_delay:
+            loop.call_later(self.batch_delay, self._flush)
+        else:
+            loop.call_soon(self._flush)
+
+    def _flush(self):
+        pending, self._pending = self._pending, []
+        self._flush_scheduled = False
+
+        outbox = self._outbox
+        for idx in range(0, len(pending), self.batch_size):
+            outbox.append(pending[idx:idx + self.batch_size])
+        if outbox and (self._sender is None or self._sender.done()):
+            self._sender = asyncio.ensure_future(self._send_outbox())
+
+    async def _send_outbox(self):
+        # One batch at a time, a batch is sent after the ones before it.
+        outbox = self._outbox
+        while outbox:
+            await self._send(outbox.popleft())
+
+    async def _send(self, batch):
+        message = {
+            "type": LAYER_MESSAGE_TYPE,
+            "origin": self.origin,
+            "messages": [[topic, data] for topic, data in batch],
+        }
+        try:
+            await self.channel_layer.group_send(self.group, message)
+        except Exception:
+            logger.exception("Can not publish messages to channel layer group %s.", self.group)
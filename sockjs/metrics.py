@@ -0,0 +1,166 @@
+from collections import defaultdict
+
+from .constants import OVERFLOW_POLICIES
+from .protocol import STATE_NEW, STATE_OPEN, STATE_CLOSING, STATE_CLOSED
+
+STATE_NAMES = {
+    STATE_NEW: "new",
+    STATE_OPEN: "open",
+    STATE_CLOSING: "closing",
+    STATE_CLOSED: "closed",
+}
+
+
+class MinuteRate(object):
+    """ Events per minute, counted in minutes of the clock """
+
+    __slots__ = ("minute", "count", "last")
+
+    def __init__(self):
+        self.minute = None
+        self.count = 0  # events in the current minute
+        self.last = 0  # events in the minute before
+
+    def add(self, now):
+        minute = int(now // 60)
+        if minute != self.minute:
+            self.last = self.count if self.minute is not None and minute == self.minute + 1 else 0
+            self.minute = minute
+            self.count = 0
+        self.count += 1
+
+    def value(self, now):
+        """Events in the last full minute."""
+        minute = int(now // 60)
+        if minute == self.minute:
+            return self.last
+        elif self.minute is not None and minute == self.minute + 1:
+            return self.count
+        return 0
+
+
+class SessionMetrics(object):
+    """ Live counters of a session manager
+
+    Counters are updated as sessions change, reading them never walks the
+    sessions. Sessions get the metrics of the manager they are added to and
+    stop reporting to it when they are removed.
+
+    """
+
+    def __init__(self):
+        self.sessions = dict.fromkeys(STATE_NAMES, 0)  # state -> sessions
+        self.acquired = 0
+        self.queued_messages = 0
+        self.queued_bytes = 0
+        self.messages_in = 0
+        self.messages_out = 0
+        self.bytes_written = defaultdict(int)  # transport -> bytes
+        self.heartbeats_sent = 0
+        self.heartbeats_missed = 0
+        self.overflows = dict.fromkeys(OVERFLOW_POLICIES, 0)  # policy -> times applied
+        self.gc_passes = 0
+        self.gc_seconds = 0.0  # total duration of gc passes
+        self.gc_last_seconds = 0.0
+        self.sessions_reaped = 0
+        self.budget_spent = defaultdict(int)  # (transport, limit) -> responses ended on a streaming budget limit
+        self.reconnects = defaultdict(int)  # transport -> streaming responses to sessions that had a connection before
+        self.reconnect_rates = defaultdict(MinuteRate)  # transport -> reconnects per minute
+        self.handler_queued = 0  # handler calls waiting for a thread of the handler pool
+        self.handler_calls = 0  # handler calls run on the handler pool
+        self.handler_wait_seconds = 0.0  # total time handler calls waited for a thread
+
+    def add_session(self, session):
+        self.sessions[session.state] += 1
+        self.queued_messages += session._queue_size
+        self.queued_bytes += session._queue_bytes
+
+    def remove_session(self, session):
+        self.sessions[session.state] -= 1
+        self.queued_messages -= session._queue_size
+        self.queued_bytes -= session._queue_bytes
+
+    def state_changed(self, old, new):
+        self.sessions[old] -= 1
+        self.sessions[new] += 1
+
+    def reconnected(self, transport, now):
+        self.reconnects[transport] += 1
+        self.reconnect_rates[transport].add(now)
+
+    def gc_pass(self, seconds, reaped):
+        self.gc_passes += 1
+        self.gc_seconds += seconds
+        self.gc_last_seconds = seconds
+        self.sessions_reaped += reaped
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render_prometheus(managers):
+    """Render metrics of session managers in the Prometheus text format."""
+    families = {}  # name -> (type, help, samples), samples of a name are rendered together
+
+    def add(name, kind, help, value, **labels):
+        samples = families.setdefault(name, (kind, help, []))[2]
+        samples.append((labels, value))
+
+    for manager in managers:
+        metrics = manager.metrics
+        name = manager.name
+        for state, count in metrics.sessions.items():
+            add("sockjs_sessions", "gauge", "Sessions by state.", count, manager=name, state=STATE_NAMES[state])
+        add("sockjs_sessions_acquired", "gauge", "Sessions held by a connection.",
+            metrics.acquired, manager=name)
+        add("sockjs_queued_messages", "gauge", "Messages waiting in session queues.",
+            metrics.queued_messages, manager=name)
+        add("sockjs_queued_bytes", "gauge", "Length of messages waiting in session queues.",
+            metrics.queued_bytes, manager=name)
+        add("sockjs_messages_received_total", "counter", "Messages received from clients.",
+            metrics.messages_in, manager=name)
+        add("sockjs_messages_sent_total", "counter", "Messages handed to transports.",
+            metrics.messages_out, manager=name)
+        for transport, size in sorted(metrics.bytes_written.items()):
+            add("sockjs_bytes_written_total", "counter", "Bytes written to clients.",
+                size, manager=name, transport=transport)
+        add("sockjs_heartbeats_sent_total", "counter", "Heartbeat frames sent.",
+            metrics.heartbeats_sent, manager=name)
+        add("sockjs_heartbeats_missed_total", "counter", "Sessions closed for not consuming a heartbeat.",
+            metrics.heartbeats_missed, manager=name)
+        for policy, count in metrics.overflows.items():
+            add("sockjs_queue_overflows_total", "counter", "Times the queue overflow policy was applied.",
+                count, manager=name, policy=policy)
+        add("sockjs_gc_passes_total", "counter", "Garbage collector passes.",
+            metrics.gc_passes, manager=name)
+        add("sockjs_gc_seconds_total", "counter", "Time spent in garbage collector passes.",
+            repr(metrics.gc_seconds), manager=name)
+        add("sockjs_gc_last_seconds", "gauge", "Duration of the last garbage collector pass.",
+            repr(metrics.gc_last_seconds), manager=name)
+        add("sockjs_sessions_reaped_total", "counter", "Sessions removed by the garbage collector.",
+            metrics.sessions_reaped, manager=name)
+        for (transport, limit), count in sorted(metrics.budget_spent.items()):
+            add("sockjs_streaming_budget_spent_total", "counter", "Streaming responses ended on a budget limit.",
+                count, manager=name, transport=transport, limit=limit)
+        add("sockjs_handler_queued", "gauge", "Handler calls waiting for a thread of the handler pool.",
+            metrics.handler_queued, manager=name)
+        add("sockjs_handler_calls_total", "counter", "Handler calls run on the handler pool.",
+            metrics.handler_calls, manager=name)
+        add("sockjs_handler_wait_seconds_total", "counter", "Time handler calls waited for a thread.",
+            repr(metrics.handler_wait_seconds), manager=name)
+        now = manager.clock.time()
+        for transport, count in sorted(metrics.reconnects.items()):
+            add("sockjs_reconnects_total", "counter", "Streaming responses to sessions that had a connection before.",
+                count, manager=name, transport=transport)
+            add("sockjs_reconnects_per_minute", "gauge", "Reconnects in the last full minute.",
+                metrics.reconnect_rates[transport].value(now), manager=name, transport=transport)
+
+    lines = []
+    for name, (kind, help, samples) in families.items():
+        lines.append("# HELP %s %s" % (name, help))
+        lines.append("# TYPE %s %s" % (name, kind))
+        for labels, value in samples:
+            labels = ",".join('%s="%s"' % (label, _escape(text)) for label, text in labels.items())
+            lines.append("%s{%s} %s" % (name, labels, value))
+    return "\n".join(lines) + "\n"
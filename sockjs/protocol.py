@@ -1,7 +1,10 @@
 import collections
+import functools
 import hashlib
 from datetime import datetime
 
+from .constants import QUEUE_OVERFLOW_CLOSE
+
 STATE_NEW = 0
 STATE_OPEN = 1
 STATE_CLOSING = 2
@@ -26,33 +29,146 @@ _months = [
 # json
 # -----------
 
-# Fastest
-try:
-    import ujson as json
-
-    dumps_kwargs = {}  # pragma: no cover
-except ImportError:  # pragma: no cover
-    def datetime_handler(obj):
-        if isinstance(obj, datetime):
-            now = obj.timetuple()
-            return "%s, %02d %s %04d %02d:%02d:%02d -0000" % (
-                _days[now[6]],
-                now[2],
-                _months[now[1] - 1],
-                now[0],
-                now[3],
-                now[4],
-                now[5],
-            )
-
-    dumps_kwargs = {"default": datetime_handler, "separators": (",", ":")}
-
-    # Faster
-    try:
-        import simplejson as json
-    except ImportError:
-        # Slowest
+
+def datetime_handler(obj):
+    if isinstance(obj, datetime):
+        now = obj.timetuple()
+        return "%s, %02d %s %04d %02d:%02d:%02d -0000" % (
+            _days[now[6]],
+            now[2],
+            _months[now[1] - 1],
+            now[0],
+            now[3],
+            now[4],
+            now[5],
+        )
+
+
+class Codec(object):
+    """ JSON codec of messages and frames
+
+    ``dumps()`` returns ``str``, ``dumpb()`` UTF-8 encoded ``bytes`` and
+    ``loads()`` takes either. Codecs build the frames of their endpoint,
+    the ``*_bytes`` frame methods encode straight to bytes, without a
+    ``str`` in between for codecs that produce bytes natively.
+
+    """
+
+    name = None
+    common_close_frames = None  # encoded by close_frame_bytes() on first use
+
+    def dumps(self, data):
+        raise NotImplementedError
+
+    def dumpb(self, data):
+        return self.dumps(data).encode("utf-8")
+
+    def loads(self, data):
+        raise NotImplementedError
+
+    def message_frame(self, message):
+        return FRAME_MESSAGE + self.dumps([message])
+
+    def messages_frame(self, messages):
+        return FRAME_MESSAGE + self.dumps(messages)
+
+    def close_frame(self, code, reason):
+        return FRAME_CLOSE + self.dumps([code, reason])
+
+    def message_frame_bytes(self, message):
+        return b"a" + self.dumpb([message])
+
+    def messages_frame_bytes(self, messages):
+        return b"a" + self.dumpb(messages)
+
+    def close_frame_bytes(self, code, reason):
+        return b"c" + self.dumpb([code, reason])
+
+    def quote_frame(self, frame):
+        """JSON string literal of an encoded frame, for the javascript transports."""
+        return self.dumpb(frame.decode("utf-8"))
+
+
+class ModuleCodec(Codec):
+    """ Codec of a module with the ``json`` module interface """
+
+    def __init__(self, module, **dumps_kwargs):
+        self.module = module
+        self.dumps = functools.partial(module.dumps, **dumps_kwargs) if dumps_kwargs else module.dumps
+        self.loads = module.loads
+
+    def messages_frame_bytes(self, messages):
+        return ("a" + self.dumps(messages)).encode("utf-8")
+
+
+class JSONCodec(ModuleCodec):
+    name = "json"
+
+    def __init__(self):
         import json
+        super().__init__(json, default=datetime_handler, separators=(",", ":"))
+
+
+class SimplejsonCodec(ModuleCodec):
+    name = "simplejson"
+
+    def __init__(self):
+        import simplejson
+        super().__init__(simplejson, default=datetime_handler, separators=(",", ":"))
+
+
+class UjsonCodec(ModuleCodec):
+    name = "ujson"
+
+    def __init__(self):
+        import ujson
+        super().__init__(ujson)  # a default function makes ujson several times slower
+
+
+class OrjsonCodec(Codec):
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self._dumps = orjson.dumps
+        self._option = orjson.OPT_PASSTHROUGH_DATETIME
+        self.loads = orjson.loads
+
+    def dumps(self, data):
+        return self._dumps(data, default=datetime_handler, option=self._option).decode("utf-8")
+
+    def dumpb(self, data):
+        # keyword arguments are cheaper here than a functools.partial
+        return self._dumps(data, default=datetime_handler, option=self._option)
+
+
+CODECS = {codec.name: codec for codec in (JSONCodec, SimplejsonCodec, UjsonCodec, OrjsonCodec)}
+
+
+def get_codec(codec=None):
+    """Return codec instance for a codec name, ``None`` for the default codec."""
+    if codec is None:
+        return default_codec
+    if isinstance(codec, str):
+        try:
+            factory = CODECS[codec]
+        except KeyError:
+            raise ValueError("Unknown codec: %r" % (codec,))
+        return factory()
+    return codec
+
+
+def _default_codec():
+    # Fastest of ujson, simplejson and json
+    for factory in (UjsonCodec, SimplejsonCodec):
+        try:
+            return factory()
+        except ImportError:
+            pass
+    return JSONCodec()
+
+
+default_codec = _default_codec()
 
 # Frames
 # ------
@@ -99,23 +215,107 @@ IFRAME_HTML = """<!DOCTYPE html>
 
 IFRAME_MD5 = hashlib.md5(IFRAME_HTML.encode("utf-8")).hexdigest()
 
-loads = json.loads
-
-
-def dumps(data):
-    return json.dumps(data, **dumps_kwargs)
+loads = default_codec.loads
+dumps = default_codec.dumps
 
 
 def close_frame(code, reason):
-    return FRAME_CLOSE + json.dumps([code, reason], **dumps_kwargs)
+    return FRAME_CLOSE + dumps([code, reason])
 
 
 def message_frame(message):
-    return FRAME_MESSAGE + json.dumps([message], **dumps_kwargs)
+    return FRAME_MESSAGE + dumps([message])
 
 
 def messages_frame(messages):
-    return FRAME_MESSAGE + json.dumps(messages, **dumps_kwargs)
+    return FRAME_MESSAGE + dumps(messages)
+
+
+class SharedFrame(str):
+    """ Encoded frame that is sent to many sessions, i.e. a broadcast message
+
+    Transports turn frames into wire bytes with ``encode_frame()``, which
+    memoizes the result on shared frames per encoder, so each transport
+    format is encoded once no matter how many sessions receive the frame.
+
+    ``messages`` keeps the original messages of a message frame for
+    transports that deliver them unframed, i.e. raw websocket.
+
+    """
+
+    __slots__ = ("messages", "_encoded")
+
+    def __new__(cls, frame, messages=None):
+        self = super().__new__(cls, frame)
+        self.messages = messages
+        return self
+
+
+class SharedBytes(bytes):
+    """ UTF-8 encoded shared frame, see ``SharedFrame`` """
+
+    def __new__(cls, frame, messages=None):
+        self = super().__new__(cls, frame)
+        self.messages = messages
+        return self
+
+
+def encode_frame(frame, encoder):
+    """Encode ``frame`` with ``encoder``, reusing the result for shared frames."""
+    if not isinstance(frame, (SharedFrame, SharedBytes)):
+        return encoder(frame)
+
+    try:
+        cache = frame._encoded
+    except AttributeError:
+        cache = frame._encoded = {}
+
+    encoded = cache.get(encoder)
+    if encoded is None:
+        encoded = cache[encoder] = encoder(frame)
+    return encoded
+
+
+def _shared_bytes(frame):
+    return SharedBytes(frame.encode("utf-8"), frame.messages)
+
+
+def frame_bytes(frame):
+    """UTF-8 encoded ``frame``, shared frames are encoded once."""
+    if frame.__class__ is bytes or frame.__class__ is SharedBytes:
+        return frame
+    if frame.__class__ is SharedFrame:
+        return encode_frame(frame, _shared_bytes)
+    return frame.encode("utf-8")
+
+
+# Frames that do not depend on the session, encoded once
+OPEN_FRAME_BYTES = b"o"
+HEARTBEAT_FRAME_BYTES = b"h"
+EMPTY_MESSAGES_FRAME_BYTES = b"a[]"
+
+# Close frames of the transports and the session manager, encoded once per codec
+COMMON_CLOSE_FRAMES = (
+    (3000, "Go away!"),
+    (3000, "Session timeout!"),
+    (3000, "Internal error"),
+    (1002, "Connection interrupted"),
+    (2010, "Another connection still open"),
+    QUEUE_OVERFLOW_CLOSE,
+)
+
+
+def close_frame_bytes(code, reason, codec=None):
+    """Encoded close frame of ``codec``, common close frames are built once."""
+    if codec is None:
+        codec = default_codec
+    frames = codec.common_close_frames
+    if frames is None:
+        frames = codec.common_close_frames = {key: codec.close_frame_bytes(*key) for key in COMMON_CLOSE_FRAMES}
+    frame = frames.get((code, reason))
+    if frame is None:
+        frame = codec.close_frame_bytes(code, reason)
+    return frame
 
 
 # Handler messages
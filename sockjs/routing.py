@@ -1,10 +1,12 @@
 import asyncio
+import functools
 import inspect
 import logging
 import random
+import re
 from collections import namedtuple
 
-from asgiref.sync import sync_to_async, async_to_sync
+from asgiref.sync import async_to_sync
 from channels.exceptions import StopConsumer
 from django.urls import re_path
 
@@ -18,14 +20,19 @@ from .constants import (
     DEFAULT_HEARTBEAT_INTERVAL,
     DEFAULT_SESSION_TIMEOUT,
     DEFAULT_GC_INTERVAL,
+    DEFAULT_QUEUE_OVERFLOW,
     SOCKJS_CDN
 )
+from .executor import HandlerExecutor, sync_handler
+from .layers import LayerSessionManager
 from .session import SessionManager
 
 logger = logging.getLogger("sockjs")
 
 Routing = namedtuple("Routing", ["http", "websocket", "config"], defaults=([], [], {}))
 
+Endpoint = namedtuple("Endpoint", ["route", "greeting", "info", "iframe", "stats"], defaults=(None,))
+
 
 def get_manager(routing, name):
     return routing.config["__sockjs_managers__"][name]
@@ -35,6 +42,19 @@ def gen_endpoint_name():
     return "n" + str(random.randint(1000, 9999))
 
 
+def get_budget(streaming_budget, cid, consumer):
+    """Streaming budget of consumer ``cid``, a budget or a dict of budgets by consumer."""
+    streaming = getattr(consumer, "streaming", False)
+    if isinstance(streaming_budget, dict):
+        budget = streaming_budget.get(cid)
+        if budget is not None and not streaming:
+            raise ValueError("Streaming budget of %r, it is not a streaming transport" % cid)
+        return budget
+    if streaming_budget is not None and streaming:
+        return streaming_budget
+    return None
+
+
 def teardown_session_manager(session_manager):
     async_to_sync(session_manager.clear)()
 
@@ -53,59 +73,97 @@ def add_endpoint(
         heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL,
         session_timeout=DEFAULT_SESSION_TIMEOUT,
         gc_interval=DEFAULT_GC_INTERVAL,
-        debug=False
+        debug=False,
+        clock=None,
+        channel_layer=None,
+        store=None,
+        max_queue_size=None,
+        max_queue_bytes=None,
+        queue_overflow=DEFAULT_QUEUE_OVERFLOW,
+        stats=False,
+        hooks=None,
+        codec=None,
+        replay_size=None,
+        streaming_budget=None,
+        poll_timeout=None,
+        handler_threads=None,
+        session_factory=None
 ):
     assert callable(handler), handler
+    executor = None
     if not asyncio.iscoroutinefunction(handler) and not inspect.isgeneratorfunction(handler):
-        handler = sync_to_async(handler)
+        if handler_threads is None:
+            handler = sync_handler(handler)
+        else:
+            handler = executor = HandlerExecutor(handler, handler_threads)
 
     if not name:
         name = gen_endpoint_name()
 
     # set session manager
     if manager is None:
-        manager = SessionManager(name, handler,
-                                 heartbeat_interval=heartbeat_interval,
-                                 session_timeout=session_timeout,
-                                 gc_interval=gc_interval,
-                                 debug=debug)
+        if channel_layer is None:
+            factory = SessionManager
+        else:
+            factory = functools.partial(LayerSessionManager, channel_layer=channel_layer)
+        manager = factory(name, handler,
+                          heartbeat_interval=heartbeat_interval,
+                          session_timeout=session_timeout,
+                          gc_interval=gc_interval,
+                          debug=debug,
+                          clock=clock,
+                          store=store,
+                          max_queue_size=max_queue_size,
+                          max_queue_bytes=max_queue_bytes,
+                          queue_overflow=queue_overflow,
+                          hooks=hooks,
+                          codec=codec,
+                          replay_size=replay_size,
+                          session_factory=session_factory)
 
     if manager.name != name:
         raise ValueError("Session manage must have same name as sockjs route.")
 
+    if executor is not None:
+        executor.metrics = manager.metrics
+
     managers = routing.config.setdefault("__sockjs_managers__", {})
     if name in managers:
         raise ValueError('SockJS "%s" route already registered.' % name)
 
+    route = SockJSRoute(manager, consumers, disable_consumers, streaming_budget, poll_timeout)
     managers[name] = manager
 
     # register urls
-    route = SockJSRoute(manager, consumers, disable_consumers)
+    greeting = transports.GreetingConsumer.as_asgi()
+    info = transports.InfoConsumer.as_asgi(cookie_needed=cookie_needed, disable_consumers=disable_consumers)
+    iframe = transports.IframeConsumer.as_asgi(sockjs_cdn=sockjs_cdn, clock=manager.clock)
+    stats_consumer = transports.StatsConsumer.as_asgi(manager=manager) if stats else None
 
     if prefix.endswith("/"):
         prefix = prefix[:-1]
 
+    endpoints = routing.config.setdefault("__sockjs_endpoints__", {})
+    endpoints[prefix] = Endpoint(route, greeting, info, iframe, stats_consumer)
+
     route_name = "sockjs-url-%s-greeting" % name
-    routing.http.append(re_path(r"^%s$" % prefix, transports.GreetingConsumer.as_asgi(), name=route_name))
+    routing.http.append(re_path(r"^%s$" % prefix, greeting, name=route_name))
 
     route_name = "sockjs-url-%s" % name
-    routing.http.append(re_path(r"^%s/$" % prefix, transports.GreetingConsumer.as_asgi(), name=route_name))
+    routing.http.append(re_path(r"^%s/$" % prefix, greeting, name=route_name))
 
     route_name = "sockjs-info-%s" % name
-    routing.http.append(re_path(r"^%s/info$" % prefix,
-                                transports.InfoConsumer.as_asgi(cookie_needed=cookie_needed,
-                                                                disable_consumers=disable_consumers),
-                                name=route_name))
+    routing.http.append(re_path(r"^%s/info$" % prefix, info, name=route_name))
+
+    if stats_consumer is not None:
+        route_name = "sockjs-stats-%s" % name
+        routing.http.append(re_path(r"^%s/stats$" % prefix, stats_consumer, name=route_name))
 
     route_name = "sockjs-iframe-%s" % name
-    routing.http.append(re_path(r"^%s/iframe.html$" % prefix,
-                                transports.IframeConsumer.as_asgi(sockjs_cdn=sockjs_cdn),
-                                name=route_name))
+    routing.http.append(re_path(r"^%s/iframe.html$" % prefix, iframe, name=route_name))
 
     route_name = "sockjs-iframe-ver-%s" % name
-    routing.http.append(re_path(r"^%s/iframe(?P<version>[\w-]+).html$" % prefix,
-                                transports.IframeConsumer.as_asgi(sockjs_cdn=sockjs_cdn),
-                                name=route_name))
+    routing.http.append(re_path(r"^%s/iframe(?P<version>[\w-]+).html$" % prefix, iframe, name=route_name))
 
     route_name = "sockjs-%s" % name
     routing.http.append(re_path(r"^%s/(?P<server>.*)/(?P<sid>.*)/(?P<cid>[\w-]+)$" % prefix,
@@ -120,21 +178,36 @@ def add_endpoint(
 
 
 class SockJSRoute(object):
-    def __init__(self, manager, consumers, disable_consumers):
+    def __init__(self, manager, consumers, disable_consumers, streaming_budget=None, poll_timeout=None):
         self.manager = manager
         self.consumers = consumers
         self.disable_consumers = disable_consumers
 
+        # Consumer factories are bound to the manager, streaming budget and
+        # poll timeout once, a request only passes its session.
+        self.factories = {}
+        for cid, (create, consumer) in consumers.items():
+            if cid in disable_consumers:
+                continue
+            kwargs = {"manager": manager}
+            budget = get_budget(streaming_budget, cid, consumer)
+            if budget is not None:
+                kwargs["budget"] = budget
+            if poll_timeout is not None and not getattr(consumer, "streaming", True):
+                kwargs["timeout"] = poll_timeout
+            self.factories[cid] = (create, functools.partial(consumer, **kwargs))
+        self.raw_websocket = functools.partial(transports.RawWebsocketConsumer, manager=manager)
+
     async def handler(self, scope, receive, send):
         kwargs = scope["url_route"]["kwargs"]
         server = kwargs["server"]
         sid = kwargs["sid"]
         cid = kwargs["cid"]
-        if cid not in self.consumers or cid in self.disable_consumers:
+        if cid not in self.factories:
             await self.handle_404(cid, send, b"SockJS consumer handler not found.")
             return
 
-        create, consumer = self.consumers[cid]
+        create, factory = self.factories[cid]
 
         # session manager
         manager = self.manager
@@ -146,14 +219,14 @@ class SockJSRoute(object):
             return
 
         try:
-            session = manager.get(sid, create, scope=scope)
+            session = await manager.aget(sid, create, scope=scope)
         except KeyError:
             await self.handle_404(cid, send, b"SockJS session not found.")
             return
 
         try:
-            c = consumer.as_asgi(manager=manager, session=session, create=create)
-            return await c(scope, receive, send)
+            consumer = factory(session=session, create=create)
+            return await consumer(scope, receive, send)
         except asyncio.CancelledError:
             pass
         except StopConsumer as exc:
@@ -174,9 +247,9 @@ class SockJSRoute(object):
 
         session = manager.get(sid, True, scope=scope)
 
-        c = transports.RawWebsocketConsumer.as_asgi(manager=manager, session=session)
         try:
-            return await c(scope, receive, send)
+            consumer = self.raw_websocket(session=session)
+            return await consumer(scope, receive, send)
         except asyncio.CancelledError:
             raise
         except StopConsumer as exc:
@@ -195,6 +268,90 @@ class SockJSRoute(object):
             await send({"type": "http.response.body", "body": body, "more_body": False})
 
 
+class SockJSDispatcher(object):
+    """ ASGI application that routes the SockJS urls of a routing
+
+    An alternative to adding ``routing.http`` and ``routing.websocket`` to a
+    ``URLRouter``: endpoints are looked up by prefix in a dict and the rest of
+    the path is split with string operations, instead of trying every url
+    pattern in turn. Consumers get the same ``url_route`` kwargs. Prefixes are
+    matched literally, the longest registered one wins.
+
+    Requests that are not SockJS urls go to ``fallback``, i.e. the Django ASGI
+    application, or get a 404 without it.
+
+    """
+
+    check_cid = re.compile(r"[\w-]+").fullmatch
+    check_version = re.compile(r"iframe[\w-]+\.html").fullmatch
+
+    def __init__(self, routing, fallback=None):
+        self.endpoints = routing.config.setdefault("__sockjs_endpoints__", {})
+        self.fallback = fallback
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path_remaining", scope["path"])
+        if "path_remaining" not in scope:
+            root_path = scope.get("root_path", "")
+            if root_path and path.startswith(root_path):
+                path = path[len(root_path):]
+
+        match = self.resolve(path.lstrip("/"), scope["type"] == "websocket")
+        if match is None:
+            if self.fallback is not None:
+                return await self.fallback(scope, receive, send)
+            if scope["type"] == "websocket":
+                await send({"type": "websocket.close", "code": 1000})
+            else:
+                await send({"type": "http.response.start", "status": 404,
+                            "headers": [(b"Content-Type", b"text/plain; charset=UTF-8")]})
+                await send({"type": "http.response.body", "body": b"Not found."})
+            return
+
+        app, kwargs = match
+        scope = dict(scope, path_remaining="", url_route={"args": (), "kwargs": kwargs})
+        return await app(scope, receive, send)
+
+    def resolve(self, path, websocket=False):
+        """Return ``(application, url kwargs)`` for path, or ``None``."""
+        endpoints = self.endpoints
+        endpoint = endpoints.get(path)
+        rest = ""
+        if endpoint is None:
+            idx = path.rfind("/")
+            while idx > 0:
+                endpoint = endpoints.get(path[:idx])
+                if endpoint is not None:
+                    rest = path[idx + 1:]
+                    break
+                idx = path.rfind("/", 0, idx)
+            else:
+                return None
+
+        if websocket:
+            if rest == "websocket":
+                return endpoint.route.websocket, {}
+        elif not rest:
+            # "prefix" and "prefix/"
+            return endpoint.greeting, {}
+        elif rest == "info":
+            return endpoint.info, {}
+        elif rest == "iframe.html":
+            return endpoint.iframe, {}
+        elif rest == "stats" and endpoint.stats is not None:
+            return endpoint.stats, {}
+        elif self.check_version(rest):
+            return endpoint.iframe, {"version": rest[6:-5]}
+
+        parts = rest.rsplit("/", 2)
+        if len(parts) != 3 or not self.check_cid(parts[2]):
+            return None
+        server, sid, cid = parts
+        if websocket and not (server and sid):
+            return None
+        return endpoint.route.handler, {"server": server, "sid": sid, "cid": cid}
+
+
 def make_routing(
         handler,
         *,
@@ -208,13 +365,32 @@ def make_routing(
         heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL,
         session_timeout=DEFAULT_SESSION_TIMEOUT,
         gc_interval=DEFAULT_GC_INTERVAL,
-        debug=False
+        debug=False,
+        clock=None,
+        channel_layer=None,
+        store=None,
+        max_queue_size=None,
+        max_queue_bytes=None,
+        queue_overflow=DEFAULT_QUEUE_OVERFLOW,
+        stats=False,
+        hooks=None,
+        codec=None,
+        replay_size=None,
+        streaming_budget=None,
+        poll_timeout=None,
+        handler_threads=None,
+        session_factory=None
 ):
     routing = Routing(http=[], websocket=[], config={})
     add_endpoint(routing, handler, name=name, prefix=prefix,
                  consumers=consumers, disable_consumers=disable_consumers,
                  sockjs_cdn=sockjs_cdn, cookie_needed=cookie_needed,
                  manager=manager, heartbeat_interval=heartbeat_interval,
-                 session_timeout=session_timeout, gc_interval=gc_interval, debug=debug)
+                 session_timeout=session_timeout, gc_interval=gc_interval, debug=debug,
+                 clock=clock, channel_layer=channel_layer, store=store,
+                 max_queue_size=max_queue_size, max_queue_bytes=max_queue_bytes,
+                 queue_overflow=queue_overflow, stats=stats, hooks=hooks, codec=codec,
+                 replay_size=replay_size, streaming_budget=streaming_budget, poll_timeout=poll_timeout,
+                 handler_threads=handler_threads, session_factory=session_factory)
 
     return routing
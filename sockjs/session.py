@@ -1,21 +1,64 @@
 import asyncio
+import heapq
+import itertools
 import logging
+import uuid
 import warnings
 from collections import deque
-from datetime import datetime
 
+from .clock import default_clock, to_seconds
 from .constants import DEFAULT_SESSION_TIMEOUT, DEFAULT_HEARTBEAT_INTERVAL, DEFAULT_GC_INTERVAL
+from .constants import DEFAULT_HEARTBEAT_SLOTS, DEFAULT_HEARTBEAT_JITTER, DEFAULT_GC_BUDGET
+from .constants import DEFAULT_STORE_POLL_INTERVAL, DEFAULT_QUEUE_OVERFLOW, STORE_RENEW_RATIO
+from .constants import OVERFLOW_DROP_NEWEST, OVERFLOW_CLOSE, OVERFLOW_POLICIES, QUEUE_OVERFLOW_CLOSE
 from .exceptions import SessionIsAcquired, SessionIsClosed
+from .executor import threadsafe
+from .hooks import Hooks, clock as hooks_clock
+from .metrics import SessionMetrics
 from .protocol import FRAME_MESSAGE, FRAME_MESSAGE_BLOB, FRAME_HEARTBEAT
 from .protocol import FRAME_OPEN, FRAME_CLOSE
 from .protocol import MSG_CLOSE, MSG_MESSAGE
 from .protocol import STATE_NEW, STATE_OPEN, STATE_CLOSING, STATE_CLOSED
 from .protocol import SockjsMessage, OpenMessage, ClosedMessage
-from .protocol import close_frame, message_frame, messages_frame
+from .protocol import EMPTY_MESSAGES_FRAME_BYTES, HEARTBEAT_FRAME_BYTES, OPEN_FRAME_BYTES
+from .protocol import SharedFrame, close_frame_bytes, frame_bytes, get_codec
+from .timer import PeriodicTimer, TimingWheel
 
 logger = logging.getLogger("sockjs")
 
 
+class SessionConfig(object):
+    """ Settings shared by the sessions of one session manager """
+
+    __slots__ = ("handler", "timeout", "heartbeat_interval", "debug", "clock",
+                 "max_queue_size", "max_queue_bytes", "queue_overflow", "hooks", "codec", "replay_size")
+
+    def __init__(self, handler, *, timeout=DEFAULT_SESSION_TIMEOUT,
+                 heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL, debug=False, clock=None,
+                 max_queue_size=None, max_queue_bytes=None, queue_overflow=DEFAULT_QUEUE_OVERFLOW,
+                 hooks=None, codec=None, replay_size=None):
+        self.handler = handler
+        self.timeout = to_seconds(timeout)
+        self.heartbeat_interval = heartbeat_interval
+        self.debug = debug
+        self.clock = default_clock if clock is None else clock
+        self.max_queue_size = max_queue_size
+        self.max_queue_bytes = max_queue_bytes
+        self.queue_overflow = queue_overflow
+        self.hooks = Hooks() if hooks is None else hooks
+        self.codec = get_codec(codec)
+        self.replay_size = replay_size
+
+    def replace(self, **changes):
+        """Copy of the settings with ``changes``."""
+        config = SessionConfig.__new__(SessionConfig)
+        for name in self.__slots__:
+            setattr(config, name, changes.get(name, getattr(self, name)))
+        if "timeout" in changes:
+            config.timeout = to_seconds(changes["timeout"])
+        return config
+
+
 class Session(object):
     """ SockJS session object
 
@@ -25,37 +68,112 @@ class Session(object):
 
     ``acquired``: Acquired state, indicates that consumer is using session
 
-    ``timeout``: Session timeout
+    ``config``: Settings shared with other sessions, other keyword
+    arguments are ignored when it is given
 
-    """
+    ``timeout``: Session timeout in seconds
+
+    ``clock``: Time source, ``expires`` is measured on it
 
-    scope = None
-    manager = None
-    acquired = False
-    state = STATE_NEW
-    interrupted = False
-    exception = None
+    ``max_queue_size``, ``max_queue_bytes``: Limits of queued outgoing
+    messages and of their length, ``None`` for no limit
 
-    _heartbeat_timer = None  # heartbeat event loop timer
-    _heartbeat_future_task = None  # heartbeat task
-    _heartbeat_consumed = True
+    ``queue_overflow``: What to do with a message that does not fit the
+    queue: drop the oldest queued message, drop the new one or close
+    the session
+
+    ``replay``: Log of the last message frames sent by transports that
+    can resume, ``None`` unless the manager has a ``replay_size``
+
+    """
+
+    __slots__ = (
+        "id", "scope", "config", "manager", "acquired", "_state", "expired", "expires",
+        "interrupted", "exception", "dropped", "replay",
+        "stream_scale",  # multiplier of adaptive streaming budgets
+        "_hits", "_heartbeats", "_heartbeat_consumer", "_heartbeat_consumed", "_heartbeat_timer",
+        "_waiter", "_queue", "_queue_size", "_queue_bytes",
+        "_expiry_index",  # expiry index of the session manager
+        "_expiry_key",  # expires the session is indexed with
+        "_shared_feed",  # queues frames in the session store while not acquired
+        "_metrics",  # metrics of the session manager
+    )
 
     def __init__(self, sid, handler, scope, *, timeout=DEFAULT_SESSION_TIMEOUT,
-                 heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL, debug=False):
+                 heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL, debug=False, clock=None,
+                 max_queue_size=None, max_queue_bytes=None, queue_overflow=DEFAULT_QUEUE_OVERFLOW,
+                 config=None):
+        if config is None:
+            config = SessionConfig(handler, timeout=timeout, heartbeat_interval=heartbeat_interval,
+                                   debug=debug, clock=clock, max_queue_size=max_queue_size,
+                                   max_queue_bytes=max_queue_bytes, queue_overflow=queue_overflow)
+
         self.id = sid
-        self.handler = handler
         self.scope = scope
+        self.config = config
+        self.manager = None
+        self.acquired = False
+        self._state = STATE_NEW
         self.expired = False
-        self.timeout = timeout
-        self.heartbeat_interval = heartbeat_interval
-        self.expires = datetime.now() + timeout
+        self.expires = config.clock.time() + config.timeout
+        self.interrupted = False
+        self.exception = None
+        self.dropped = 0  # messages dropped on queue overflow
+        self.replay = None  # allocated on first logged frame
+        self.stream_scale = 1
 
         self._hits = 0
         self._heartbeats = 0
         self._heartbeat_consumer = False
-        self._debug = debug
+        self._heartbeat_consumed = True
+        self._heartbeat_timer = None
         self._waiter = None
-        self._queue = deque()
+        self._queue = None  # allocated on first frame
+        self._queue_size = 0  # queued messages
+        self._queue_bytes = 0  # length of queued messages
+
+        self._expiry_index = None
+        self._expiry_key = None
+        self._shared_feed = None
+        self._metrics = None
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        if self._metrics is not None:
+            self._metrics.state_changed(self._state, state)
+        self._state = state
+
+    @property
+    def handler(self):
+        return self.config.handler
+
+    @property
+    def timeout(self):
+        return self.config.timeout
+
+    @property
+    def heartbeat_interval(self):
+        return self.config.heartbeat_interval
+
+    @property
+    def clock(self):
+        return self.config.clock
+
+    @property
+    def max_queue_size(self):
+        return self.config.max_queue_size
+
+    @property
+    def max_queue_bytes(self):
+        return self.config.max_queue_bytes
+
+    @property
+    def queue_overflow(self):
+        return self.config.queue_overflow
 
     def __str__(self):
         result = ["id=%r" % (self.id,)]
@@ -76,18 +194,53 @@ class Session(object):
             result.append("hits=%s" % self._hits)
         if self._heartbeats:
             result.append("heartbeats=%s" % self._heartbeats)
+        if self.dropped:
+            result.append("dropped=%s" % self.dropped)
 
         return " ".join(result)
 
+    @property
+    def hits(self):
+        """Times the session was acquired by a connection."""
+        return self._hits
+
     @property
     def message_length(self):
-        return len(self._queue)
+        return len(self._queue) if self._queue else 0
 
     def _tick(self, timeout=None):
+        config = self.config
         if timeout is None:
-            self.expires = datetime.now() + self.timeout
+            self.expires = config.clock.time() + config.timeout
         else:
-            self.expires = datetime.now() + timeout
+            self.expires = config.clock.time() + to_seconds(timeout)
+
+        # Later expiry is picked up lazily by the index, earlier has to be indexed.
+        if self._expiry_index is not None and self.expires < self._expiry_key:
+            self._expiry_index.push(self)
+
+    def _handle(self, msg):
+        config = self.config
+        hooks = config.hooks
+        if hooks.on_handler_start is not None or hooks.on_handler_end is not None:
+            return self._handle_hooked(msg)
+        return config.handler(msg, self)
+
+    async def _handle_hooked(self, msg):
+        hooks = self.config.hooks
+        started = hooks_clock()
+        if hooks.on_handler_start is not None:
+            hooks.on_handler_start(self, msg, started)
+
+        exception = None
+        try:
+            return await self.config.handler(msg, self)
+        except BaseException as exc:
+            exception = exc
+            raise
+        finally:
+            if hooks.on_handler_end is not None:
+                hooks.on_handler_end(self, msg, hooks_clock() - started, exception)
 
     async def acquire(self, manager, heartbeat=True):
         self.acquired = True
@@ -101,7 +254,7 @@ class Session(object):
             self.state = STATE_OPEN
             self._feed(FRAME_OPEN, FRAME_OPEN)
             try:
-                await self.handler(OpenMessage, self)
+                await self._handle(OpenMessage)
                 self.start_heartbeat()
             except asyncio.CancelledError:
                 raise
@@ -119,8 +272,14 @@ class Session(object):
 
     def start_heartbeat(self):
         if self._heartbeat_consumer and not self._heartbeat_timer:
-            loop = asyncio.get_event_loop()
-            self._heartbeat_timer = loop.call_later(self.heartbeat_interval, self._heartbeat)
+            # Heartbeats are driven by the manager's timing wheel when it
+            # beats at the session's interval, otherwise by a timer of our own.
+            config = self.config
+            wheel = getattr(self.manager, "heartbeat_wheel", None)
+            if wheel is not None and wheel.interval == config.heartbeat_interval:
+                self._heartbeat_timer = wheel.schedule(self._heartbeat)
+            else:
+                self._heartbeat_timer = PeriodicTimer(config.heartbeat_interval, self._heartbeat, config.clock)
 
     def stop_heartbeat(self):
         if self._heartbeat_timer is not None:
@@ -128,8 +287,15 @@ class Session(object):
             self._heartbeat_timer = None
 
     def _heartbeat(self):
+        # Shared sessions only beat to connections held by this process.
+        if self._shared_feed is not None and not self.acquired:
+            return
+
         # If the last heartbeat was not consumed, the client was closed.
         if not self._heartbeat_consumed:
+            if self._metrics is not None:
+                self._metrics.heartbeats_missed += 1
+            self.stop_heartbeat()
             asyncio.ensure_future(self.remote_closed())
             return
 
@@ -138,33 +304,132 @@ class Session(object):
             return
 
         self._heartbeats += 1
+        if self._metrics is not None:
+            self._metrics.heartbeats_sent += 1
         self._feed(FRAME_HEARTBEAT, FRAME_HEARTBEAT)
         self._heartbeat_consumed = False
 
-        loop = asyncio.get_event_loop()
-        self._heartbeat_timer = loop.call_later(self.heartbeat_interval, self._heartbeat)
-
     def _feed(self, frame, data):
+        if self._shared_feed is not None and not self.acquired:
+            self._shared_feed(self, frame, data)
+            return
+
+        if (frame == FRAME_MESSAGE or frame == FRAME_MESSAGE_BLOB) and not self._reserve(len(data)):
+            return
+
+        queue = self._queue
+        if queue is None:
+            queue = self._queue = deque()
+
         if frame == FRAME_MESSAGE:
-            if self._queue and self._queue[-1][0] == FRAME_MESSAGE:
-                self._queue[-1][1].append(data)
+            if queue and queue[-1][0] == FRAME_MESSAGE:
+                queue[-1][1].append(data)
             else:
-                self._queue.append((frame, [data]))
+                queue.append((frame, [data]))
         else:
-            self._queue.append((frame, data))
+            queue.append((frame, data))
+
+        hook = self.config.hooks.on_feed
+        if hook is not None:
+            hook(self, frame, hooks_clock())
 
         # notify waiter
         self.notify_waiter()
 
-    async def wait(self, pack=True):
+    def _reserve(self, size):
+        """Account a new message, return ``False`` if it is dropped."""
+        config = self.config
+        max_size, max_bytes = config.max_queue_size, config.max_queue_bytes
+        if max_size is not None or max_bytes is not None:
+            # A message larger than the byte limit still goes to an empty queue.
+            while self._queue_size and (
+                    (max_size is not None and self._queue_size >= max_size) or
+                    (max_bytes is not None and self._queue_bytes + size > max_bytes)):
+                self._overflowed()
+                if config.queue_overflow == OVERFLOW_DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                if config.queue_overflow == OVERFLOW_CLOSE:
+                    self.dropped += self._queue_size + 1
+                    self._queue = deque(item for item in self._queue
+                                        if item[0] != FRAME_MESSAGE and item[0] != FRAME_MESSAGE_BLOB)
+                    self._account(-self._queue_size, -self._queue_bytes)
+                    self.close(*QUEUE_OVERFLOW_CLOSE)
+                    return False
+                self._drop_oldest()
+
+        self._queue_size += 1
+        self._queue_bytes += size
+        metrics = self._metrics
+        if metrics is not None:
+            metrics.queued_messages += 1
+            metrics.queued_bytes += size
+        return True
+
+    def _account(self, messages, size):
+        """Add to the counts of queued messages and of their length."""
+        self._queue_size += messages
+        self._queue_bytes += size
+        metrics = self._metrics
+        if metrics is not None:
+            metrics.queued_messages += messages
+            metrics.queued_bytes += size
+
+    def _drop_oldest(self):
+        queue = self._queue
+        for idx, (frame, data) in enumerate(queue):
+            if frame == FRAME_MESSAGE:
+                message = data.pop(0)
+                if not data:
+                    del queue[idx]
+                break
+            elif frame == FRAME_MESSAGE_BLOB:
+                message = data
+                del queue[idx]
+                break
+        else:
+            return
+
+        self.dropped += 1
+        self._account(-1, -len(message))
+
+    def _overflowed(self):
+        if self._metrics is not None:
+            self._metrics.overflows[self.config.queue_overflow] += 1
+
+    def _take_queue(self):
+        """Remove and return all queued frames."""
+        queue, self._queue = self._queue, None
+        self._account(-self._queue_size, -self._queue_bytes)
+        return queue or ()
+
+    async def wait(self, pack=True, encoded=False, timeout=None, replay=False):
+        """Wait for the next frame, with ``encoded`` packed frames are UTF-8 ``bytes``.
+
+        With ``timeout`` seconds it returns ``None`` when no frame is queued in
+        time, a clock timer wakes the waiter up, no task or exception is involved.
+
+        With ``replay`` packed message frames are logged in ``replay``, for
+        transports that can resume from them.
+
+        """
         if not self._queue and self.state != STATE_CLOSED:
             assert not self._waiter
             loop = asyncio.get_event_loop()
-            self._waiter = loop.create_future()
-            await self._waiter
+            waiter = self._waiter = loop.create_future()
+            if timeout is None:
+                await waiter
+            else:
+                timer = self.config.clock.call_later(timeout, self.notify_waiter)
+                try:
+                    await waiter
+                finally:
+                    timer.cancel()
+                if not self._queue and self.state != STATE_CLOSED:
+                    return None
 
         if self._queue:
-            frame, message = self._queue.popleft()
+            frame, message = self._popleft()
 
             if frame == FRAME_HEARTBEAT:
                 self._heartbeat_consumed = True
@@ -172,15 +437,86 @@ class Session(object):
                 self._tick()
 
             if pack:
-                if frame == FRAME_CLOSE:
-                    return FRAME_CLOSE, close_frame(*message)
-                elif frame == FRAME_MESSAGE:
-                    return FRAME_MESSAGE, messages_frame(message)
-
+                if frame == FRAME_MESSAGE or frame == FRAME_MESSAGE_BLOB:
+                    frame, message = self._coalesce(frame, message, encoded)
+                    if replay and self.config.replay_size:
+                        if self.replay is None:
+                            self.replay = ReplayLog(self.config.replay_size)
+                        self.replay.append(message)
+                elif encoded:
+                    frame, message = self._encode(frame, message)
+                elif frame == FRAME_CLOSE:
+                    frame, message = FRAME_CLOSE, self.config.codec.close_frame(*message)
+
+            hook = self.config.hooks.on_dequeue
+            if hook is not None:
+                hook(self, frame, hooks_clock())
             return frame, message
         else:
             raise SessionIsClosed()
 
+    def _popleft(self):
+        queue = self._queue
+        frame, message = queue.popleft()
+        if not queue:
+            self._queue = None  # do not hold an empty deque for idle sessions
+        if frame == FRAME_MESSAGE:
+            count = len(message)
+            size = sum(map(len, message))
+        elif frame == FRAME_MESSAGE_BLOB:
+            count = 1
+            size = len(message)
+        else:
+            return frame, message
+
+        self._queue_size -= count
+        self._queue_bytes -= size
+        metrics = self._metrics
+        if metrics is not None:
+            metrics.queued_messages -= count
+            metrics.queued_bytes -= size
+            metrics.messages_out += count
+        return frame, message
+
+    def _encode(self, frame, message):
+        """Encoded frame of a non message entry."""
+        if frame == FRAME_CLOSE:
+            return frame, close_frame_bytes(*message, codec=self.config.codec)
+        elif frame == FRAME_HEARTBEAT:
+            return frame, HEARTBEAT_FRAME_BYTES
+        elif frame == FRAME_OPEN:
+            return frame, OPEN_FRAME_BYTES
+        return frame, frame_bytes(message)
+
+    def _coalesce(self, frame, message, encoded=False):
+        """Pack a message entry and the message entries queued after it into one frame."""
+        codec = self.config.codec
+        messages_frame = codec.messages_frame_bytes if encoded else codec.messages_frame
+        queue = self._queue
+        if frame == FRAME_MESSAGE:
+            payload = messages_frame(message)
+        elif message[:2] == "a[":
+            payload = frame_bytes(message) if encoded else message
+        else:
+            return frame, frame_bytes(message) if encoded else message  # not a messages frame, send as is
+
+        if not queue or not _is_messages(*queue[0]):
+            # Keep a single broadcast frame as is, its encoding is shared.
+            return frame if frame == FRAME_MESSAGE_BLOB else FRAME_MESSAGE, payload
+
+        payloads = [payload]
+        while queue and _is_messages(*queue[0]):
+            frame, message = self._popleft()
+            if frame == FRAME_MESSAGE:
+                payloads.append(messages_frame(message))
+            else:
+                payloads.append(frame_bytes(message) if encoded else message)
+
+        if encoded:
+            parts = [payload[2:-1] for payload in payloads if payload != EMPTY_MESSAGES_FRAME_BYTES]
+            return FRAME_MESSAGE, b"".join((b"a[", b",".join(parts), b"]"))
+        return FRAME_MESSAGE, "a[%s]" % ",".join(payload[2:-1] for payload in payloads if payload != "a[]")
+
     def notify_waiter(self):
         waiter = self._waiter
         if waiter is not None:
@@ -188,11 +524,12 @@ class Session(object):
             if not waiter.cancelled():
                 waiter.set_result(True)
 
+    @threadsafe
     def send(self, message):
         """send message to client."""
         assert isinstance(message, str), "String is required"
 
-        if self._debug:
+        if self.config.debug:
             logger.info("outgoing message: %s, %s", self.id, str(message)[:200])
 
         if self.state != STATE_OPEN:
@@ -200,9 +537,10 @@ class Session(object):
 
         self._feed(FRAME_MESSAGE, message)
 
+    @threadsafe
     def send_frame(self, frame):
         """send message frame to client."""
-        if self._debug:
+        if self.config.debug:
             logger.info("outgoing message: %s, %s", self.id, frame[:200])
 
         if self.state != STATE_OPEN:
@@ -210,28 +548,36 @@ class Session(object):
 
         self._feed(FRAME_MESSAGE_BLOB, frame)
 
+    @threadsafe
     def expire(self):
         """Manually expire a session."""
         self.expired = True
 
         self.stop_heartbeat()
 
+        if self._expiry_index is not None:
+            self._expiry_index.expire(self)
+
     async def remote_message(self, message):
         logger.debug("incoming message: %s, %s", self.id, message[:200])
         self._tick()
+        if self._metrics is not None:
+            self._metrics.messages_in += 1
 
         try:
-            await self.handler(SockjsMessage(MSG_MESSAGE, message), self)
+            await self._handle(SockjsMessage(MSG_MESSAGE, message))
         except Exception as exc:
             logger.exception("Exception in message handler, %s." % str(exc))
 
     async def remote_messages(self, messages):
         self._tick()
+        if self._metrics is not None:
+            self._metrics.messages_in += len(messages)
 
         for message in messages:
             logger.debug("incoming message: %s, %s", self.id, message[:200])
             try:
-                await self.handler(SockjsMessage(MSG_MESSAGE, message), self)
+                await self._handle(SockjsMessage(MSG_MESSAGE, message))
             except Exception as exc:
                 logger.exception("Exception in message handler, %s." % str(exc))
 
@@ -246,7 +592,7 @@ class Session(object):
             self.exception = exc
             self.interrupted = True
         try:
-            await self.handler(SockjsMessage(MSG_CLOSE, exc), self)
+            await self._handle(SockjsMessage(MSG_CLOSE, exc))
         except Exception as exc:
             logger.exception("Exception in close handler, %s." % str(exc))
 
@@ -260,19 +606,20 @@ class Session(object):
         self.state = STATE_CLOSED
         self.expire()
         try:
-            await self.handler(ClosedMessage, self)
+            await self._handle(ClosedMessage)
         except Exception as exc:
             logger.exception("Exception in closed handler, %s." % str(exc))
 
         # notify waiter
         self.notify_waiter()
 
+    @threadsafe
     def close(self, code=3000, reason="Go away!"):
         """close session"""
         if self.state in (STATE_CLOSING, STATE_CLOSED):
             return
 
-        if self._debug:
+        if self.config.debug:
             logger.debug("close session: %s", self.id)
 
         self.state = STATE_CLOSING
@@ -280,6 +627,128 @@ class Session(object):
         self.stop_heartbeat()
 
 
+def _is_messages(frame, data):
+    return frame == FRAME_MESSAGE or (frame == FRAME_MESSAGE_BLOB and data[:2] == "a[")
+
+
+class ExpiryIndex(object):
+    """ Sessions ordered by expiry time for the garbage collector
+
+    Sessions are kept in a min-heap keyed on ``Session.expires`` at the time
+    they were indexed. Extending the expiry (``Session._tick``) does not touch
+    the heap, stale entries are re-indexed when they reach the top. Manually
+    expired sessions are queued to be collected first.
+
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._expired = deque()
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._heap) + len(self._expired)
+
+    def push(self, session):
+        session._expiry_key = session.expires
+        heapq.heappush(self._heap, (session.expires, next(self._counter), session))
+
+    def expire(self, session):
+        self._expired.append(session)
+
+    def pop(self, now, deadline=None, time=None):
+        """Return next session that is due for collection or ``None``.
+
+        Re-indexing stale entries stops with ``None`` once ``time()``
+        reaches ``deadline``, the rest is left to the next call.
+
+        """
+        if self._expired:
+            return self._expired.popleft()
+
+        heap = self._heap
+        while heap and heap[0][0] < now:
+            _, _, session = heapq.heappop(heap)
+            if session._expiry_key is None:
+                continue  # removed from index
+            if session.expired or session.expires < now:
+                return session
+
+            self.push(session)
+            if deadline is not None and time() >= deadline:
+                break
+
+        return None
+
+    def discard(self, session):
+        session._expiry_key = None
+        session._expiry_index = None
+
+    def clear(self):
+        self._heap.clear()
+        self._expired.clear()
+
+
+class ReplayLog(object):
+    """ Bounded log of the message frames a session sent
+
+    Frames are numbered from 1 in the order they were sent. A client that
+    reconnects with the number of the last frame it got is sent the logged
+    frames after it, older frames are dropped once ``size`` are logged.
+
+    """
+
+    __slots__ = ("seq", "_frames")
+
+    def __init__(self, size):
+        self.seq = 0  # number of the last logged frame
+        self._frames = deque(maxlen=size)
+
+    def __len__(self):
+        return len(self._frames)
+
+    @property
+    def last(self):
+        return self._frames[-1] if self._frames else None
+
+    def append(self, frame):
+        self.seq += 1
+        self._frames.append(frame)
+        return self.seq
+
+    def since(self, seq):
+        """Return ``(seq, frame)`` pairs of the logged frames after ``seq``."""
+        count = min(self.seq - seq, len(self._frames))
+        if count <= 0:
+            return []
+        frames = itertools.islice(self._frames, len(self._frames) - count, None)
+        return list(zip(range(self.seq - count + 1, self.seq + 1), frames))
+
+
+class DictSession(Session):
+    """ Session that takes attributes of its own, i.e. ``session.user = user``
+
+    ``Session`` is slotted to keep idle sessions small. This subclass has a
+    ``__dict__`` and assignable ``handler``, ``timeout`` and
+    ``heartbeat_interval``, assigning one gives the session a copy of the
+    settings it shares with the other sessions of its manager. Select it with
+    ``make_routing(..., session_factory=DictSession)``.
+
+    """
+
+    @Session.handler.setter
+    def handler(self, handler):
+        self.config = self.config.replace(handler=handler)
+
+    @Session.timeout.setter
+    def timeout(self, timeout):
+        self.config = self.config.replace(timeout=timeout)
+
+    @Session.heartbeat_interval.setter
+    def heartbeat_interval(self, heartbeat_interval):
+        self.config = self.config.replace(heartbeat_interval=heartbeat_interval)
+
+
 empty = object()
 
 
@@ -295,19 +764,67 @@ class SessionManager(dict):
                  heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL,
                  session_timeout=DEFAULT_SESSION_TIMEOUT,
                  gc_interval=DEFAULT_GC_INTERVAL,
-                 debug=False):
+                 heartbeat_slots=DEFAULT_HEARTBEAT_SLOTS,
+                 heartbeat_jitter=DEFAULT_HEARTBEAT_JITTER,
+                 gc_budget=DEFAULT_GC_BUDGET,
+                 debug=False,
+                 clock=None,
+                 store=None,
+                 store_poll_interval=DEFAULT_STORE_POLL_INTERVAL,
+                 max_queue_size=None,
+                 max_queue_bytes=None,
+                 queue_overflow=DEFAULT_QUEUE_OVERFLOW,
+                 hooks=None,
+                 codec=None,
+                 replay_size=None,
+                 session_factory=None):
         super().__init__()
         self.name = name
         self.route_name = "sockjs-url-%s" % name
         self.handler = handler
-        self.factory = Session
+        self.factory = Session if session_factory is None else session_factory
         self.gc_interval = gc_interval
+        self.gc_budget = gc_budget
         self.heartbeat_interval = heartbeat_interval
         self.session_timeout = session_timeout
         self.debug = debug
+        self.clock = default_clock if clock is None else clock
+        self.heartbeat_wheel = TimingWheel(heartbeat_interval, slots=heartbeat_slots,
+                                           jitter=heartbeat_jitter, clock=self.clock)
+
+        # per session send queue limits
+        if queue_overflow not in OVERFLOW_POLICIES:
+            raise ValueError("Unknown queue overflow policy: %r" % (queue_overflow,))
+        self.max_queue_size = max_queue_size
+        self.max_queue_bytes = max_queue_bytes
+        self.queue_overflow = queue_overflow
+
+        self.metrics = SessionMetrics()
+        self.overflow_stats = self.metrics.overflows  # policy -> times applied
+        self.hooks = Hooks() if hooks is None else hooks
+        self.codec = get_codec(codec)
+        self.replay_size = replay_size  # message frames logged per session for resuming streams
+
+        self.session_config = SessionConfig(handler, timeout=session_timeout,
+                                            heartbeat_interval=heartbeat_interval, debug=debug,
+                                            clock=self.clock, max_queue_size=max_queue_size,
+                                            max_queue_bytes=max_queue_bytes, queue_overflow=queue_overflow,
+                                            hooks=self.hooks, codec=self.codec, replay_size=replay_size)
 
         self._acquired_map = {}
-        self._sessions = []
+        self._topics = {}  # topic -> subscribed sessions
+        self._subscriptions = {}  # session id -> subscribed topics
+        self._expiry_index = ExpiryIndex()
+
+        # shared session store
+        self.store = store
+        self.store_poll_interval = store_poll_interval
+        self.owner = uuid.uuid4().hex
+        self._outbox = {}  # session -> frames to be queued in the store
+        self._outbox_task = None
+        self._store_polled = {}  # session id -> acquired session polled in the store
+        self._store_renew_at = {}  # session id -> clock time to renew its store lock and record
+        self._store_poll_task = None
 
     def __str__(self):
         return "SessionManager<%s>" % self.route_name
@@ -318,8 +835,9 @@ class SessionManager(dict):
 
     def start(self):
         if not self._gc_timer:
-            loop = asyncio.get_event_loop()
-            self._gc_timer = loop.call_later(self.gc_interval, self._gc)
+            self._gc_timer = self.clock.call_later(self.gc_interval, self._gc)
+        if len(self.heartbeat_wheel):
+            self.heartbeat_wheel.start()
 
     def stop(self):
         if self._gc_timer is not None:
@@ -328,58 +846,116 @@ class SessionManager(dict):
         if self._gc_future_task is not None:
             self._gc_future_task.cancel()
             self._gc_future_task = None
+        self.heartbeat_wheel.stop()
 
     def _gc(self):
         if self._gc_future_task is None:
             self._gc_future_task = asyncio.ensure_future(self._gc_task())
 
     async def _gc_task(self):
-        if self._sessions:
-            now = datetime.now()
-
-            idx = 0
-            while idx < len(self._sessions):
-                session = self._sessions[idx]
-
-                if session.expires < now or session.expired:
-                    session._feed(FRAME_CLOSE, (3000, "Session timeout!"))
-
-                    # Session is to be GC"d immediately
-                    if session.state == STATE_OPEN:
-                        await session.remote_close()
-                    if session.state == STATE_CLOSING:
-                        await session.remote_closed()
-                    if session.id in self._acquired_map:
-                        await self.release(session)
-
-                    del self[session.id]
-                    del self._sessions[idx]
-                    continue
-
-                idx += 1
-
-        self._gc_future_task = None
         loop = asyncio.get_event_loop()
-        self._gc_timer = loop.call_later(self.gc_interval, self._gc)
+        started = loop.time()
+        deadline = started + self.gc_budget
+        now = self.clock.time()
+        delay = self.gc_interval
+        reaped = 0
+        session = None
+        cancelled = False
+
+        try:
+            while True:
+                session = self._expiry_index.pop(now, deadline, loop.time)
+                if session is None:
+                    if loop.time() >= deadline:
+                        delay = 0  # stale entries are left to re-index
+                    break
+                if dict.get(self, session.id) is not session:
+                    continue  # already collected
+
+                if self.store is not None and session.id not in self._acquired_map:
+                    # Only the process holding the store lock may close the session.
+                    key = self._store_key(session.id)
+                    in_use = not await self.store.lock(key, self.owner, session.timeout)
+                    if not in_use and not session.expired:
+                        record = await self.store.get(key)
+                        in_use = record is not None and record["expires"] > self.clock.wall()
+                        if in_use:
+                            await self.store.unlock(key, self.owner)
+                    if in_use:
+                        # Session is in use by another process, forget local copy only.
+                        session.stop_heartbeat()
+                        self._remove(session)
+                        continue
+
+                session._feed(FRAME_CLOSE, (3000, "Session timeout!"))
+
+                # Session is to be GC"d immediately
+                if session.state == STATE_OPEN:
+                    await session.remote_close()
+                if session.state == STATE_CLOSING:
+                    await session.remote_closed()
+                if session.id in self._acquired_map:
+                    await self.release(session)
+
+                self._remove(session)
+                reaped += 1
+                if self.store is not None:
+                    try:
+                        await self.store.delete(self._store_key(session.id))
+                    except Exception:
+                        logger.exception("Can not delete session %s from session store.", session.id)
+
+                # Leave the rest to the next pass to not block the loop for long.
+                if loop.time() >= deadline:
+                    delay = 0
+                    break
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        except Exception:
+            # i.e. the session store is down, the session is collected by a later pass
+            logger.exception("Can not collect session %s.", session.id)
+            if dict.get(self, session.id) is session:
+                self._expiry_index.push(session)
+        finally:
+            duration = loop.time() - started
+            self.metrics.gc_pass(duration, reaped)
+            if self.hooks.on_gc_pass is not None:
+                self.hooks.on_gc_pass(self, duration, reaped)
+            if not cancelled:
+                self._gc_future_task = None
+                self._gc_timer = self.clock.call_later(delay, self._gc)
 
     def _add(self, session):
         if session.expired:
             raise ValueError("Can not add expired session.")
 
         session.manager = self
+        session._expiry_index = self._expiry_index
+        session._metrics = self.metrics
+        if self.store is not None:
+            session._shared_feed = self._store_feed
 
+        self.metrics.add_session(session)
         self[session.id] = session
-        self._sessions.append(session)
+        self._expiry_index.push(session)
         return session
 
+    def _remove(self, session):
+        self.metrics.remove_session(session)
+        session._metrics = None
+        self._expiry_index.discard(session)
+        self.unsubscribe(session)
+        del self[session.id]
+
+    def _create(self, sid, scope):
+        return self.factory(sid, self.handler, scope, config=self.session_config)
+
     def get(self, sid, create=False, scope=None, default=empty):
         session = super().get(sid, None)
         if session is None:
             if create:
-                session = self._add(
-                    self.factory(sid, self.handler, scope, timeout=self.session_timeout,
-                                 heartbeat_interval=self.heartbeat_interval, debug=self.debug)
-                )
+                session = self._add(self._create(sid, scope))
             else:
                 if default is not empty:
                     return default
@@ -397,9 +973,22 @@ class SessionManager(dict):
         if sid not in self:
             raise KeyError("Unknown session")
 
-        await session.acquire(self)
+        if self.store is not None:
+            if not await self.store.lock(self._store_key(sid), self.owner, session.timeout):
+                raise SessionIsAcquired("Another connection still open")
+
+        try:
+            await session.acquire(self)
+        except BaseException:
+            if self.store is not None:
+                await self.store.unlock(self._store_key(sid), self.owner)
+            raise
 
         self._acquired_map[sid] = True
+        self.metrics.acquired += 1
+
+        if self.store is not None:
+            await self._store_attach(session)
         return session
 
     def is_acquired(self, session):
@@ -409,6 +998,130 @@ class SessionManager(dict):
         if session.id in self._acquired_map:
             session.release()
             del self._acquired_map[session.id]
+            self.metrics.acquired -= 1
+
+            if self.store is not None:
+                await self._store_detach(session)
+
+    # shared session store
+    # --------------------
+
+    def _store_key(self, sid):
+        return "%s:%s" % (self.name, sid)
+
+    async def aget(self, sid, create=False, scope=None, default=empty):
+        """Get session, looking for sessions of other processes in the session store."""
+        if self.store is not None and not dict.__contains__(self, sid):
+            record = await self.store.get(self._store_key(sid))
+            if record is not None and not dict.__contains__(self, sid):
+                session = self._add(self._create(sid, scope))
+                session.state = record["state"]
+                return session
+
+        return self.get(sid, create, scope=scope, default=default)
+
+    async def _store_save(self, session):
+        record = {"state": session.state, "expires": self.clock.wall() + session.timeout}
+        await self.store.set(self._store_key(session.id), record, session.timeout)
+
+    def _store_load(self, session, frames):
+        for frame, data in frames:
+            if frame == FRAME_MESSAGE:
+                for message in data:
+                    session._feed(frame, message)
+            else:
+                session._feed(frame, data)
+
+    async def _store_attach(self, session):
+        key = self._store_key(session.id)
+        self._store_load(session, await self.store.pull(key, session.timeout))
+        await self._store_save(session)
+
+        self._store_polled[session.id] = session
+        self._store_renew_at[session.id] = self.clock.time() + session.timeout * STORE_RENEW_RATIO
+        if self._store_poll_task is None:
+            self._store_poll_task = asyncio.ensure_future(self._store_poll())
+
+    async def _store_poll(self):
+        # One task for all sessions held here. Every poll interval it picks up the
+        # frames other processes queued for them in one batch. Their locks and
+        # records are renewed once a part of the session timeout has passed, so
+        # other processes do not take or collect them.
+        polled = self._store_polled
+        try:
+            while polled:
+                await asyncio.sleep(self.store_poll_interval)
+                now = self.clock.time()
+                renew = [session for sid, session in polled.items() if self._store_renew_at[sid] <= now]
+                if renew:
+                    await asyncio.gather(*[self._store_renew(session) for session in renew])
+                if polled:
+                    await self._store_pull(list(polled.values()))
+        finally:
+            self._store_poll_task = None
+
+    async def _store_renew(self, session):
+        key = self._store_key(session.id)
+        try:
+            if not await self.store.lock(key, self.owner, session.timeout):
+                logger.error("Session %s is held by another process.", session.id)
+                return
+            if self._store_polled.get(session.id) is not session:
+                await self.store.unlock(key, self.owner)  # released meanwhile, do not keep the lock
+                return
+            await self._store_save(session)
+            self._store_renew_at[session.id] = self.clock.time() + session.timeout * STORE_RENEW_RATIO
+        except Exception:
+            logger.exception("Can not renew session %s in session store.", session.id)
+
+    async def _store_pull(self, sessions):
+        keys = {self._store_key(session.id): session for session in sessions}
+        try:
+            pulled = await self.store.pull_many(list(keys), max(session.timeout for session in sessions))
+        except Exception:
+            logger.exception("Can not pull queued frames from session store.")
+            return
+        for key, frames in pulled.items():
+            # a session released meanwhile queues them in the store again
+            self._store_load(keys[key], frames)
+
+    async def _store_detach(self, session):
+        self._store_polled.pop(session.id, None)
+        self._store_renew_at.pop(session.id, None)
+
+        key = self._store_key(session.id)
+        if session._queue:
+            frames = [self._store_frame(frame, data) for frame, data in session._take_queue()]
+            await self.store.push(key, frames, session.timeout)
+
+        await self._store_save(session)
+        await self.store.unlock(key, self.owner)
+
+    @staticmethod
+    def _store_frame(frame, data):
+        if frame == FRAME_MESSAGE_BLOB:
+            return frame, str(data)
+        return frame, data
+
+    def _store_feed(self, session, frame, data):
+        if frame == FRAME_MESSAGE:
+            data = [data]
+        self._outbox.setdefault(session, []).append(self._store_frame(frame, data))
+
+        if self._outbox_task is None:
+            self._outbox_task = asyncio.ensure_future(self._store_flush())
+
+    async def _store_flush(self):
+        try:
+            while self._outbox:
+                outbox, self._outbox = self._outbox, {}
+                for session, frames in outbox.items():
+                    try:
+                        await self.store.push(self._store_key(session.id), frames, session.timeout)
+                    except Exception:
+                        logger.exception("Can not queue frames of session %s in session store.", session.id)
+        finally:
+            self._outbox_task = None
 
     def active_sessions(self):
         for session in list(self.values()):
@@ -421,17 +1134,77 @@ class SessionManager(dict):
             if session.state != STATE_CLOSED:
                 await session.remote_closed()
 
-        self._sessions.clear()
+        for session in self.values():
+            self.metrics.remove_session(session)
+            session._metrics = None
+            self._expiry_index.discard(session)
+        self._expiry_index.clear()
+        self._store_polled.clear()
+        self._store_renew_at.clear()
+        if self._store_poll_task is not None:
+            self._store_poll_task.cancel()
+            self._store_poll_task = None
+        self.heartbeat_wheel.clear()
+        self._topics.clear()
+        self._subscriptions.clear()
         super().clear()
 
+    @threadsafe
     def broadcast(self, message):
-        blob = message_frame(message)
+        blob = SharedFrame(self.codec.message_frame(message), (message,))
         for session in list(self.values()):
             if not session.expired:
                 session.send_frame(blob)
 
+    @threadsafe
+    def subscribe(self, session, topic):
+        """Subscribe session to messages published to topic."""
+        if dict.get(self, session.id) is not session:
+            raise KeyError("Unknown session")
+
+        self._topics.setdefault(topic, {})[session] = None
+        self._subscriptions.setdefault(session.id, set()).add(topic)
+
+    @threadsafe
+    def unsubscribe(self, session, topic=None):
+        """Unsubscribe session from topic, or from all topics if topic is not given."""
+        topics = self._subscriptions.get(session.id)
+        if not topics:
+            return
+
+        if topic is None:
+            del self._subscriptions[session.id]
+        elif topic in topics:
+            topics.discard(topic)
+            if not topics:
+                del self._subscriptions[session.id]
+            topics = (topic,)
+        else:
+            return
+
+        for topic in topics:
+            subscribers = self._topics[topic]
+            subscribers.pop(session, None)
+            if not subscribers:
+                del self._topics[topic]
+
+    def subscribers(self, topic):
+        return list(self._topics.get(topic, ()))
+
+    @threadsafe
+    def publish(self, topic, message):
+        """Send message to all sessions subscribed to topic."""
+        subscribers = self._topics.get(topic)
+        if not subscribers:
+            return
+
+        blob = SharedFrame(self.codec.message_frame(message), (message,))
+        for session in list(subscribers):
+            if not session.expired:
+                session.send_frame(blob)
+
     def __del__(self):
-        if len(self._sessions):
+        if len(self):
             warnings.warn(
                 "Unclosed _sessions! "
                 "Please call `await SessionManager.clear()` before del",
@@ -0,0 +1,246 @@
+import time
+
+from asgiref.sync import sync_to_async
+
+
+class SessionStore(object):
+    """ Session state shared between worker processes
+
+    Lets a session started by one process be picked up by another, so polling
+    transports work behind a load balancer without sticky sessions. The store
+    holds a small record per session (state and expiry), the acquisition lock
+    and frames queued while no process holds the session.
+
+    Keys are built by the session manager, records and frames are plain
+    picklable python objects.
+
+    """
+
+    async def get(self, key):
+        """Return session record or ``None``."""
+        raise NotImplementedError
+
+    async def set(self, key, record, timeout):
+        raise NotImplementedError
+
+    async def delete(self, key):
+        """Delete session record, lock and queued frames."""
+        raise NotImplementedError
+
+    async def lock(self, key, owner, timeout):
+        """Acquire session for ``owner``, return ``False`` if it is held by someone else."""
+        raise NotImplementedError
+
+    async def unlock(self, key, owner):
+        raise NotImplementedError
+
+    async def push(self, key, frames, timeout):
+        """Append ``(frame, data)`` pairs to the session queue."""
+        raise NotImplementedError
+
+    async def pull(self, key, timeout):
+        """Remove and return all queued ``(frame, data)`` pairs."""
+        raise NotImplementedError
+
+    async def pull_many(self, keys, timeout):
+        """Pull the queues of several sessions, return a dict of the keys that had frames."""
+        pulled = {}
+        for key in keys:
+            frames = await self.pull(key, timeout)
+            if frames:
+                pulled[key] = frames
+        return pulled
+
+
+class MemorySessionStore(SessionStore):
+    """ In-process session store
+
+    Shares sessions between session managers of one process, useful for
+    tests and as reference implementation.
+
+    """
+
+    def __init__(self):
+        self._records = {}
+        self._locks = {}
+        self._queues = {}
+
+    def _alive(self, items, key):
+        item = items.get(key)
+        if item is None:
+            return None
+        if item[1] < time.monotonic():
+            del items[key]
+            return None
+        return item
+
+    async def get(self, key):
+        item = self._alive(self._records, key)
+        return None if item is None else item[0]
+
+    async def set(self, key, record, timeout):
+        self._records[key] = (record, time.monotonic() + timeout)
+
+    async def delete(self, key):
+        self._records.pop(key, None)
+        self._locks.pop(key, None)
+        self._queues.pop(key, None)
+
+    async def lock(self, key, owner, timeout):
+        item = self._alive(self._locks, key)
+        if item is not None and item[0] != owner:
+            return False
+        self._locks[key] = (owner, time.monotonic() + timeout)
+        return True
+
+    async def unlock(self, key, owner):
+        item = self._locks.get(key)
+        if item is not None and item[0] == owner:
+            del self._locks[key]
+
+    async def push(self, key, frames, timeout):
+        item = self._alive(self._queues, key)
+        queue = [] if item is None else item[0]
+        queue.extend(frames)
+        self._queues[key] = (queue, time.monotonic() + timeout)
+
+    async def pull(self, key, timeout):
+        item = self._alive(self._queues, key)
+        if item is None:
+            return []
+        del self._queues[key]
+        return item[0]
+
+
+class CacheSessionStore(SessionStore):
+    """ Session store on top of a Django cache
+
+    Any cache shared by the worker processes works, i.e. redis or memcached.
+    Locks rely on atomic ``add()``, queued frames are stored one key per frame
+    numbered with atomic ``incr()``, so concurrent writers do not lose frames.
+
+    A frame that is still missing ``lost_frame_timeout`` seconds after it was
+    counted, evicted or counted by a writer that died before storing it, is
+    skipped, so it does not hold back the frames after it.
+
+    """
+
+    def __init__(self, cache="default", prefix="sockjs", lost_frame_timeout=10.0):
+        if isinstance(cache, str):
+            from django.core.cache import caches
+            cache = caches[cache]
+
+        self.cache = cache
+        self.prefix = prefix
+        self.lost_frame_timeout = lost_frame_timeout
+
+    def _key(self, key, suffix):
+        return "%s:%s:%s" % (self.prefix, key, suffix)
+
+    @sync_to_async(thread_sensitive=False)
+    def get(self, key):
+        return self.cache.get(self._key(key, "record"))
+
+    @sync_to_async(thread_sensitive=False)
+    def set(self, key, record, timeout):
+        self.cache.set(self._key(key, "record"), record, timeout)
+
+    @sync_to_async(thread_sensitive=False)
+    def delete(self, key):
+        cache = self.cache
+        counters = cache.get_many([self._key(key, "seq"), self._key(key, "read")])
+        seq = counters.get(self._key(key, "seq"), 0)
+        read = counters.get(self._key(key, "read"), 0)
+        keys = [self._key(key, suffix) for suffix in ("record", "lock", "seq", "read", "gap")]
+        keys.extend(self._key(key, "frame:%d" % idx) for idx in range(read + 1, seq + 1))
+        cache.delete_many(keys)
+
+    @sync_to_async(thread_sensitive=False)
+    def lock(self, key, owner, timeout):
+        lock_key = self._key(key, "lock")
+        if self.cache.add(lock_key, owner, timeout):
+            return True
+        if self.cache.get(lock_key) == owner:
+            self.cache.touch(lock_key, timeout)
+            return True
+        return False
+
+    @sync_to_async(thread_sensitive=False)
+    def unlock(self, key, owner):
+        lock_key = self._key(key, "lock")
+        if self.cache.get(lock_key) == owner:
+            self.cache.delete(lock_key)
+
+    @sync_to_async(thread_sensitive=False)
+    def push(self, key, frames, timeout):
+        cache = self.cache
+        seq_key = self._key(key, "seq")
+        cache.add(seq_key, 0, timeout)
+
+        items = {}
+        for frame in frames:
+            seq = cache.incr(seq_key)
+            items[self._key(key, "frame:%d" % seq)] = frame
+        cache.set_many(items, timeout)
+        cache.touch(seq_key, timeout)
+
+    @sync_to_async(thread_sensitive=False)
+    def pull(self, key, timeout):
+        return self._pull_many([key], timeout).get(key, [])
+
+    @sync_to_async(thread_sensitive=False)
+    def pull_many(self, keys, timeout):
+        return self._pull_many(keys, timeout)
+
+    def _pull_many(self, keys, timeout):
+        # One get_many() for the counters of all sessions and one for their frames,
+        # so polling held sessions costs the same round trips for one or many.
+        cache = self.cache
+        counter_keys = {key: (self._key(key, "seq"), self._key(key, "read"), self._key(key, "gap")) for key in keys}
+        counters = cache.get_many([item_key for item_keys in counter_keys.values() for item_key in item_keys])
+
+        ranges = {}
+        for key, (seq_key, read_key, gap_key) in counter_keys.items():
+            seq = counters.get(seq_key, 0)
+            read = counters.get(read_key, 0)
+            gap = counters.get(gap_key)  # (seq, time) when a missing frame was first seen
+            if seq < read:
+                read, gap = 0, None  # the counter has expired and started over
+            if seq > read:
+                ranges[key] = (read, gap, [self._key(key, "frame:%d" % idx) for idx in range(read + 1, seq + 1)])
+        if not ranges:
+            return {}
+
+        found = cache.get_many([item_key for _, _, frame_keys in ranges.values() for item_key in frame_keys])
+        now = time.time()
+        pulled = {}
+        updates = {}
+        deleted = []
+        for key, (read, gap, frame_keys) in ranges.items():
+            frames = []
+            done = 0  # frames read or skipped as lost
+            for item_key in frame_keys:
+                if item_key in found:
+                    frames.append(found[item_key])
+                elif gap is None or read + done >= gap[0] or now - gap[1] < self.lost_frame_timeout:
+                    break  # a writer may have counted a frame it has not stored yet, stop there
+                done += 1
+
+            _, read_key, gap_key = counter_keys[key]
+            if done < len(frame_keys):
+                if gap is None or read + done >= gap[0]:
+                    updates[gap_key] = (read + len(frame_keys), now)
+            elif gap is not None:
+                deleted.append(gap_key)
+
+            if done:
+                updates[read_key] = read + done
+                deleted.extend(frame_keys[:done])
+            if frames:
+                pulled[key] = frames
+
+        if updates:
+            cache.set_many(updates, timeout)
+        if deleted:
+            cache.delete_many(deleted)
+        return pulled
@@ -0,0 +1,144 @@
+import logging
+import random
+
+from .clock import default_clock
+from .constants import DEFAULT_HEARTBEAT_SLOTS, DEFAULT_HEARTBEAT_JITTER
+
+logger = logging.getLogger("sockjs")
+
+
+class TimerHandle(object):
+    """Periodic callback handle returned by ``TimingWheel.schedule``."""
+
+    __slots__ = ("_wheel", "_slot", "_callback", "cancelled")
+
+    def __init__(self, wheel, slot, callback):
+        self._wheel = wheel
+        self._slot = slot
+        self._callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        if not self.cancelled:
+            self.cancelled = True
+            self._wheel._remove(self)
+
+
+class TimingWheel(object):
+    """ Hashed timing wheel that runs periodic callbacks in batches
+
+    The wheel is split into ``slots`` buckets, one loop timer advances it by
+    one bucket every ``interval / slots`` seconds and runs all callbacks of that
+    bucket, so every callback is invoked once per ``interval``.
+
+    New callbacks are placed into a bucket picked from the last ``jitter`` part
+    of the rotation, the less loaded of two random candidates wins, so the first
+    call happens within ``interval`` and load is spread evenly over the buckets.
+
+    """
+
+    def __init__(self, interval, *, slots=DEFAULT_HEARTBEAT_SLOTS, jitter=DEFAULT_HEARTBEAT_JITTER, clock=None):
+        self.interval = interval
+        self.clock = default_clock if clock is None else clock
+        self.slots = max(1, int(slots))
+        self.tick_interval = interval / self.slots
+        self.jitter = max(0, min(int(self.slots * jitter), self.slots - 1))
+
+        self._buckets = [{} for _ in range(self.slots)]
+        self._cursor = 0
+        self._size = 0
+        self._timer = None
+        self._deadline = None
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def started(self):
+        return self._timer is not None
+
+    def schedule(self, callback):
+        """Call ``callback`` every ``interval`` seconds until the handle is cancelled."""
+        handle = TimerHandle(self, self._pick_slot(), callback)
+        self._buckets[handle._slot][handle] = None
+        self._size += 1
+
+        if self._timer is None:
+            self.start()
+        return handle
+
+    def start(self):
+        if self._timer is None:
+            self._deadline = self.clock.time() + self.tick_interval
+            self._timer = self.clock.call_at(self._deadline, self._tick)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def clear(self):
+        self.stop()
+        for bucket in self._buckets:
+            for handle in bucket:
+                handle.cancelled = True
+            bucket.clear()
+        self._size = 0
+
+    def _pick_slot(self):
+        # The bucket just behind the cursor is reached after a full rotation.
+        last = self._cursor - 1
+        if not self.jitter:
+            return last % self.slots
+
+        first = (last - random.randint(0, self.jitter)) % self.slots
+        second = (last - random.randint(0, self.jitter)) % self.slots
+        if len(self._buckets[second]) < len(self._buckets[first]):
+            return second
+        return first
+
+    def _remove(self, handle):
+        bucket = self._buckets[handle._slot]
+        if handle in bucket:
+            del bucket[handle]
+            self._size -= 1
+
+    def _tick(self):
+        bucket = self._buckets[self._cursor]
+        self._cursor = (self._cursor + 1) % self.slots
+
+        if bucket:
+            for handle in list(bucket):
+                if handle.cancelled:
+                    continue
+                try:
+                    handle._callback()
+                except Exception:
+                    logger.exception("Exception in timing wheel callback.")
+
+        if self._size:
+            self._deadline += self.tick_interval
+            self._timer = self.clock.call_at(self._deadline, self._tick)
+        else:
+            self._timer = None
+
+
+class PeriodicTimer(object):
+    """Standalone periodic callback, used when no timing wheel is available."""
+
+    __slots__ = ("interval", "clock", "_callback", "_handle")
+
+    def __init__(self, interval, callback, clock=None):
+        self.interval = interval
+        self.clock = default_clock if clock is None else clock
+        self._callback = callback
+        self._handle = self.clock.call_later(interval, self._run)
+
+    def _run(self):
+        self._handle = self.clock.call_later(self.interval, self._run)
+        self._callback()
+
+    def cancel(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
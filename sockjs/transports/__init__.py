@@ -1,4 +1,5 @@
-from .base import GreetingConsumer, InfoConsumer, IframeConsumer
+from .base import GreetingConsumer, InfoConsumer, IframeConsumer, StatsConsumer
+from .base import HttpStreamingConsumer, StreamingBudget
 from .eventsource import EventsourceConsumer
 from .htmlfile import HTMLFileConsumer
 from .jsonp import JSONPollingConsumer
@@ -2,36 +2,44 @@ import asyncio
 import json
 import random
 
+from channels.consumer import get_handler_name
 from channels.exceptions import StopConsumer
 from channels.generic.http import AsyncHttpConsumer
 from channels.generic.websocket import AsyncWebsocketConsumer
 
-from .utils import CACHE_CONTROL, cors_headers, session_cookie, cache_headers
+from .utils import CACHE_CONTROL, HeaderTemplate, cache_headers
+from ..clock import to_seconds
 from ..constants import SOCKJS_CDN
 from ..exceptions import SessionIsAcquired, SessionIsClosed
-from ..protocol import FRAME_MESSAGE, FRAME_CLOSE
+from ..hooks import clock as hooks_clock
+from ..metrics import render_prometheus
+from ..protocol import FRAME_MESSAGE, FRAME_CLOSE, EMPTY_MESSAGES_FRAME_BYTES
 from ..protocol import IFRAME_HTML, IFRAME_MD5
 from ..protocol import STATE_CLOSING, STATE_CLOSED
-from ..protocol import close_frame
+from ..protocol import close_frame_bytes, encode_frame, frame_bytes
 
 
 class GreetingConsumer(AsyncHttpConsumer):
-    async def handle(self, body):
-        payload = b"Welcome to SockJS!\n"
+    payload = b"Welcome to SockJS!\n"
 
-        headers = {
-            b"Connection": b"keep-alive",
-            b"Content-Type": b"text/plain; charset=UTF-8",
-            b"Content-Length": str(len(payload)).encode("utf-8"),
-            b"Cache-Control": CACHE_CONTROL,
-        }
-        headers.update(session_cookie(self.scope))
-        headers.update(cors_headers(self.scope["headers"]))
+    headers = HeaderTemplate({
+        b"Connection": b"keep-alive",
+        b"Content-Type": b"text/plain; charset=UTF-8",
+        b"Content-Length": str(len(payload)).encode("utf-8"),
+        b"Cache-Control": CACHE_CONTROL,
+    })
 
-        await self.send_response(200, payload, headers=headers)
+    async def handle(self, body):
+        await self.send_response(200, self.payload, headers=self.headers.render(self.scope))
 
 
 class InfoConsumer(AsyncHttpConsumer):
+    headers = HeaderTemplate({
+        b"Connection": b"keep-alive",
+        b"Content-Type": b"application/json; charset=UTF-8",
+        b"Cache-Control": CACHE_CONTROL,
+    })
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.cookie_needed = kwargs.get("cookie_needed", True)
@@ -45,14 +53,27 @@ class InfoConsumer(AsyncHttpConsumer):
 
         payload = json.dumps(info).encode("utf-8")
 
-        headers = {
-            b"Connection": b"keep-alive",
-            b"Content-Type": b"application/json; charset=UTF-8",
-            b"Content-Length": str(len(payload)).encode("utf-8"),
-            b"Cache-Control": CACHE_CONTROL,
-        }
-        headers.update(session_cookie(self.scope))
-        headers.update(cors_headers(self.scope["headers"]))
+        headers = self.headers.render(self.scope)
+        headers.append((b"Content-Length", str(len(payload)).encode("utf-8")))
+
+        await self.send_response(200, payload, headers=headers)
+
+
+class StatsConsumer(AsyncHttpConsumer):
+    headers = HeaderTemplate({
+        b"Content-Type": b"text/plain; version=0.0.4; charset=utf-8",
+        b"Cache-Control": CACHE_CONTROL,
+    }, cookie=False, cors=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.manager = kwargs.get("manager", None)
+
+    async def handle(self, body):
+        payload = render_prometheus([self.manager]).encode("utf-8")
+
+        headers = self.headers.render(self.scope)
+        headers.append((b"Content-Length", str(len(payload)).encode("utf-8")))
 
         await self.send_response(200, payload, headers=headers)
 
@@ -61,6 +82,7 @@ class IframeConsumer(AsyncHttpConsumer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         sockjs_cdn = kwargs.get("sockjs_cdn", SOCKJS_CDN)
+        self.clock = kwargs.get("clock", None)
         self.iframe_html = (IFRAME_HTML % sockjs_cdn).encode("utf-8")
         self.iframe_html_hxd = IFRAME_MD5.encode("utf-8")
 
@@ -69,7 +91,7 @@ class IframeConsumer(AsyncHttpConsumer):
         cached = headers.get(b"if-none-match", None)
         if cached:
             headers = {b"Content-Type": b""}
-            headers.update(cache_headers())
+            headers.update(cache_headers(self.clock))
             await self.send_response(304, b"", headers=headers)
             return
 
@@ -79,11 +101,44 @@ class IframeConsumer(AsyncHttpConsumer):
             b"Content-Length": str(len(self.iframe_html)).encode("utf-8"),
             b"ETag": self.iframe_html_hxd,
         }
-        headers.update(cache_headers())
+        headers.update(cache_headers(self.clock))
         await self.send_response(200, self.iframe_html, headers=headers)
 
 
-class BaseWebsocketConsumer(AsyncWebsocketConsumer):
+class SessionConsumerMixin(object):
+    """ Lightweight ASGI entry point of session transports
+
+    Session transports talk to the session, not to the channel layer, so
+    messages are read straight from ``receive`` instead of racing it with a
+    channel layer receive in separate tasks, and dispatch does not close old
+    database connections in a worker thread for every message. Transports do
+    not use the database, sync handlers close old connections around each
+    call in the thread they run in, see ``sockjs.executor``.
+
+    """
+
+    channel_layer = None
+    channel_name = None
+
+    async def __call__(self, scope, receive, send):
+        self.scope = scope
+        self.base_send = send
+        try:
+            while True:
+                await self.dispatch(await receive())
+        except StopConsumer:
+            pass
+
+    async def dispatch(self, message):
+        handler = getattr(self, get_handler_name(message), None)
+        if handler is None:
+            raise ValueError("No handler for message type %s" % message["type"])
+        await handler(message)
+
+
+class BaseWebsocketConsumer(SessionConsumerMixin, AsyncWebsocketConsumer):
+    transport = None  # name in metrics
+
     def __init__(self, *args, **kwargs):
         manager = kwargs.pop("manager", None)
         session = kwargs.pop("session", None)
@@ -98,16 +153,86 @@ class BaseWebsocketConsumer(AsyncWebsocketConsumer):
         self.session = session
         self.create = create
 
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        # Counts the bytes written and skips the layers of generic consumer sends.
+        if text_data is not None:
+            size = len(text_data) if text_data.isascii() else len(text_data.encode("utf-8"))
+            message = {"type": "websocket.send", "text": text_data}
+        elif bytes_data is not None:
+            size = len(bytes_data)
+            message = {"type": "websocket.send", "bytes": bytes_data}
+        else:
+            raise ValueError("You must pass one of bytes_data or text_data")
+
+        manager = self.manager
+        manager.metrics.bytes_written[self.transport] += size
+        if manager.hooks.on_transport_write is not None:
+            manager.hooks.on_transport_write(self.transport, self.session, size, hooks_clock())
+        await self.base_send(message)
+        if close:
+            await self.close(close)
+
+
+class StreamingBudget(object):
+    """ How much a streaming response sends before it ends
+
+    A response ends once it has sent ``max_bytes`` bytes, ``max_messages``
+    frames (frames sent together count once) or is ``max_age`` seconds
+    old, whichever comes first, and the client reconnects. ``None``
+    disables a limit. The age is checked as frames are sent, heartbeats
+    bound how late an idle response ends.
+
+    With ``adaptive`` the byte and message limits of a session double, up to
+    ``adaptive`` times, each time a response uses them up in less than
+    ``min_age`` seconds, and halve when a response takes longer, so busy
+    clients reconnect less often.
+
+    """
+
+    __slots__ = ("max_bytes", "max_messages", "max_age", "adaptive", "min_age")
+
+    def __init__(self, max_bytes=131072, max_messages=None, max_age=None, *, adaptive=None, min_age=10.0):
+        self.max_bytes = max_bytes
+        self.max_messages = max_messages
+        self.max_age = max_age
+        self.adaptive = adaptive
+        self.min_age = min_age
+
+    def limits(self, session):
+        """Return byte, message and age limits of a response of session."""
+        scale = session.stream_scale if self.adaptive else 1
+        max_bytes = None if self.max_bytes is None else self.max_bytes * scale
+        max_messages = None if self.max_messages is None else self.max_messages * scale
+        return max_bytes, max_messages, self.max_age
+
+    def spent(self, session, age):
+        """Adapt the limits of session to a response that used them up in ``age`` seconds."""
+        if self.adaptive:
+            if age < self.min_age:
+                session.stream_scale = min(session.stream_scale * 2, self.adaptive)
+            else:
+                session.stream_scale = max(session.stream_scale // 2, 1)
+
 
-class HttpStreamingConsumer(AsyncHttpConsumer):
+class HttpStreamingConsumer(SessionConsumerMixin, AsyncHttpConsumer):
+    transport = None  # name in metrics
+    streaming = True  # sends frames until its budget is spent, endpoint budgets apply
+    resumable = False  # logs message frames in the session replay log, see resume()
+    encode_messages = None  # set to send the frames ready at a wakeup as one chunk
+    budget = None  # StreamingBudget, the limits below apply without one
     size = 0  # bytes has sent
+    messages = 0  # frames has sent
     maxsize = 131072  # 128K bytes
-    timeout = None  # timeout to wait for message
+    max_messages = None
+    max_age = None  # seconds
+    timeout = None  # seconds to wait for a frame before an empty frame is sent
 
     def __init__(self, *args, **kwargs):
         manager = kwargs.pop("manager", None)
         session = kwargs.pop("session", None)
         create = kwargs.pop("create", False)
+        budget = kwargs.pop("budget", None)
+        timeout = kwargs.pop("timeout", None)
 
         super().__init__(*args, **kwargs)
 
@@ -117,16 +242,34 @@ class HttpStreamingConsumer(AsyncHttpConsumer):
         self.manager = manager
         self.session = session
         self.create = create
+        self.started = None  # time the request was handled
+        if timeout is not None:
+            self.timeout = to_seconds(timeout)
+
+        if budget is not None:
+            self.started = manager.clock.time()
+            self.budget = budget
+            maxsize, self.max_messages, self.max_age = budget.limits(session)
+            self.maxsize = float("inf") if maxsize is None else maxsize
 
     async def handle(self, body):
         raise NotImplementedError(
             "Subclasses of HttpStreamingConsumer must provide a handle() method."
         )
 
+    async def send_body(self, body, *, more_body=False):
+        # Counts the bytes written and skips the layers of generic consumer sends.
+        manager = self.manager
+        manager.metrics.bytes_written[self.transport] += len(body)
+        if manager.hooks.on_transport_write is not None:
+            manager.hooks.on_transport_write(self.transport, self.session, len(body), hooks_clock())
+        await self.base_send({"type": "http.response.body", "body": body, "more_body": more_body})
+
     async def http_request(self, message):
         if "body" in message:
             self.body.append(message["body"])
         if not message.get("more_body"):
+            self.started = self.manager.clock.time()
             try:
                 await self.handle(b"".join(self.body))
             except asyncio.CancelledError:
@@ -140,48 +283,94 @@ class HttpStreamingConsumer(AsyncHttpConsumer):
                 await self.disconnect()
                 raise StopConsumer()
 
+    @staticmethod
+    def encode_message(payload):
+        """Wrap encoded frame into the transport's wire format."""
+        return payload + b"\n"
+
     async def send_message(self, payload, *, more_body=False):
-        body = (payload + "\n").encode("utf-8")
+        return await self.send_chunk(encode_frame(frame_bytes(payload), self.encode_message), more_body=more_body)
+
+    async def send_ready(self, payload):
+        """Send ``payload`` and the frames that are ready after it in one chunk."""
+        payloads = [payload]
+        more_body = True
+        while self.session.message_length:
+            frame, payload = await self.session.wait(encoded=True, replay=self.resumable)
+            payloads.append(payload)
+            if frame == FRAME_CLOSE:
+                await self.session.remote_closed()
+                more_body = False
+                break
+        return await self.send_chunk(self.encode_messages(payloads), more_body=more_body)
+
+    async def resume(self):
+        """Send what the client missed before the queued frames, return True to end the response."""
+        return False
+
+    async def send_chunk(self, body, *, more_body=False):
         if more_body:
             self.size += len(body)
-            if self.size < self.maxsize:
-                more_body = True
-            else:
+            self.messages += 1
+            if self.size >= self.maxsize:
+                self.spent("bytes")
+                more_body = False
+            elif self.max_messages is not None and self.messages >= self.max_messages:
+                self.spent("messages")
+                more_body = False
+            elif self.max_age is not None and self.manager.clock.time() - self.started >= self.max_age:
+                self.spent("age")
                 more_body = False
         await self.send_body(body, more_body=more_body)
         stop_send = not more_body
         return stop_send
 
+    def spent(self, limit):
+        """Record the end of the response on its budget."""
+        if not self.streaming:
+            return  # polling responses end after a frame, their budget is not spent
+        self.manager.metrics.budget_spent[self.transport, limit] += 1
+        if self.budget is not None and limit != "age":
+            self.budget.spent(self.session, self.manager.clock.time() - self.started)
+
     async def handle_session(self):
+        codec = self.manager.codec
         if self.session.interrupted:  # session was interrupted
-            await self.send_message(close_frame(1002, "Connection interrupted"))
+            await self.send_message(close_frame_bytes(1002, "Connection interrupted", codec))
             return
         elif self.session.state in (STATE_CLOSING, STATE_CLOSED):  # session is closing or closed
             await self.session.remote_closed()
-            await self.send_message(close_frame(3000, "Go away!"))
+            await self.send_message(close_frame_bytes(3000, "Go away!", codec))
             return
 
         # acquire session
         try:
             await self.manager.acquire(self.session)
         except SessionIsAcquired:
-            await self.send_message(close_frame(2010, "Another connection still open"))
+            await self.send_message(close_frame_bytes(2010, "Another connection still open", codec))
             return
 
+        if self.streaming and self.session.hits > 1:  # polls are not reconnects
+            self.manager.metrics.reconnected(self.transport, self.started)
+
         try:
+            if await self.resume():
+                return
+
             while True:
-                if self.timeout:
-                    try:
-                        frame, payload = await asyncio.wait_for(self.session.wait(), timeout=self.timeout)
-                    except asyncio.exceptions.TimeoutError:
-                        frame, payload = FRAME_MESSAGE, "a[]"
+                result = await self.session.wait(encoded=True, timeout=self.timeout, replay=self.resumable)
+                if result is None:  # nothing to send in time
+                    frame, payload = FRAME_MESSAGE, EMPTY_MESSAGES_FRAME_BYTES
                 else:
-                    frame, payload = await self.session.wait()
+                    frame, payload = result
 
                 if frame == FRAME_CLOSE:
                     await self.session.remote_closed()
                     await self.send_message(payload)
                     break
+                elif self.encode_messages is not None and self.session.message_length:
+                    if await self.send_ready(payload):
+                        break
                 else:
                     stop = await self.send_message(payload, more_body=True)
                     if stop:
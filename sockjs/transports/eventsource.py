@@ -1,29 +1,50 @@
 from .base import HttpStreamingConsumer
-from .utils import CACHE_CONTROL, session_cookie
+from .utils import CACHE_CONTROL, HeaderTemplate
+from ..protocol import encode_frame, frame_bytes
 
 
 class EventsourceConsumer(HttpStreamingConsumer):
+    transport = "eventsource"
+    resumable = True
+    last_event_id = None  # sent by a reconnecting client
+    headers = HeaderTemplate({
+        b"Connection": b"keep-alive",
+        b"Content-Type": b"text/event-stream",
+        b"Cache-Control": CACHE_CONTROL,
+    }, cors=False)
+
     async def handle(self, body):
-        headers = {
-            b"Connection": b"keep-alive",
-            b"Content-Type": b"text/event-stream",
-            b"Cache-Control": CACHE_CONTROL,
-        }
-        headers.update(session_cookie(self.scope))
+        last_event_id = dict(self.scope["headers"]).get(b"last-event-id", b"")
+        if last_event_id.isdigit():
+            self.last_event_id = int(last_event_id)
 
-        await self.send_headers(status=200, headers=headers)
+        await self.send_headers(status=200, headers=self.headers.render(self.scope))
 
         await self.send_body(b"\r\n", more_body=True)
 
         await self.handle_session()
 
+    @staticmethod
+    def encode_message(payload):
+        return b"".join((b"data: ", payload, b"\r\n\r\n"))
+
     async def send_message(self, payload, *, more_body=False):
-        body = "".join(("data: ", payload, "\r\n\r\n")).encode("utf-8")
-        if more_body:
-            self.size += len(body)
-            if self.size < self.maxsize:
-                more_body = True
-            else:
-                more_body = False
-        await self.send_body(body, more_body=more_body)
-        return not more_body
+        # Message frames the session logged for replay are sent as events with their number as id.
+        replay = self.session.replay
+        if replay is not None and replay.last is payload:
+            return await self.send_event(replay.seq, payload, more_body=more_body)
+        return await super().send_message(payload, more_body=more_body)
+
+    async def send_event(self, seq, payload, *, more_body=False):
+        body = encode_frame(frame_bytes(payload), self.encode_message)
+        return await self.send_chunk(b"id: %d\r\n%s" % (seq, body), more_body=more_body)
+
+    async def resume(self):
+        replay = self.session.replay
+        if self.last_event_id is None or replay is None:
+            return False
+
+        for seq, payload in replay.since(self.last_event_id):
+            if await self.send_event(seq, payload, more_body=True):
+                return True
+        return False
@@ -1,17 +1,23 @@
-import json
 import re
 
 from django import http
 from django.core import exceptions
 
 from .base import HttpStreamingConsumer
-from .utils import CACHE_CONTROL, session_cookie, cors_headers
-from ..protocol import HTMLFILE_HTML
+from .utils import CACHE_CONTROL, HeaderTemplate, escape_script
+from ..protocol import HTMLFILE_HTML, encode_frame, frame_bytes
 
 
 class HTMLFileConsumer(HttpStreamingConsumer):
+    transport = "htmlfile"
     check_callback = re.compile(r"^[a-zA-Z0-9_.]+$")
 
+    headers = HeaderTemplate({
+        b"Content-Type": b"text/html; charset=UTF-8",
+        b"Cache-Control": CACHE_CONTROL,
+        b"Connection": b"close",
+    })
+
     async def handle(self, body):
         query_params = http.QueryDict(self.scope.get("query_string", ""))
         callback = query_params.get("c", None)
@@ -23,28 +29,20 @@ class HTMLFileConsumer(HttpStreamingConsumer):
             await self.session.remote_closed()
             raise exceptions.BadRequest('invalid "callback" parameter')
 
-        headers = {
-            b"Content-Type": b"text/html; charset=UTF-8",
-            b"Cache-Control": CACHE_CONTROL,
-            b"Connection": b"close",
-        }
-        headers.update(session_cookie(self.scope))
-        headers.update(cors_headers(self.scope["headers"]))
-
-        await self.send_headers(status=200, headers=headers)
+        await self.send_headers(status=200, headers=self.headers.render(self.scope))
 
         await self.send_body((HTMLFILE_HTML % callback).encode("utf-8"), more_body=True)
 
         await self.handle_session()
 
     async def send_message(self, payload, *, more_body=False):
-        body = ("<script>\np(%s);\n</script>\r\n" % json.dumps(payload)).encode("utf-8")
-        if more_body:
-            self.size += len(body)
-            if self.size < self.maxsize:
-                more_body = True
-            else:
-                more_body = False
-        await self.send_body(body, more_body=more_body)
-        stop_send = not more_body
-        return stop_send
+        return await self.send_chunk(self.encode_messages((frame_bytes(payload),)), more_body=more_body)
+
+    def encode_messages(self, payloads):
+        # One script for all frames, the codec quotes each frame once even when it is shared.
+        quote_frame = self.manager.codec.quote_frame
+        parts = [b"<script>\n"]
+        for payload in payloads:
+            parts += (b"p(", escape_script(encode_frame(payload, quote_frame)), b");\n")
+        parts.append(b"</script>\r\n")
+        return b"".join(parts)
@@ -5,14 +5,27 @@ from django import http
 from django.core import exceptions
 
 from .base import HttpStreamingConsumer
-from .utils import CACHE_CONTROL, session_cookie, cors_headers
-from ..protocol import loads, dumps
+from .utils import CACHE_CONTROL, HeaderTemplate, escape_script
+from ..protocol import encode_frame, frame_bytes
 
 
 class JSONPollingConsumer(HttpStreamingConsumer):
+    transport = "jsonp"
+    streaming = False
     check_callback = re.compile(r"^[a-zA-Z0-9_.]+$")
     callback = ""
 
+    headers = HeaderTemplate({
+        b"Content-Type": b"application/javascript; charset=UTF-8",
+        b"Cache-Control": CACHE_CONTROL,
+        b"Connection": b"keep-alive",
+    })
+    post_headers = HeaderTemplate({
+        b"Content-Type": b"text/html; charset=UTF-8",
+        b"Cache-Control": CACHE_CONTROL,
+        b"Connection": b"keep-alive",
+    }, cors=False)
+
     async def handle(self, body):
         if self.scope["method"] == "GET":
             query_params = http.QueryDict(self.scope.get("query_string", ""))
@@ -25,15 +38,7 @@ class JSONPollingConsumer(HttpStreamingConsumer):
                 await self.session.remote_closed()
                 raise exceptions.BadRequest('invalid "callback" parameter')
 
-            headers = {
-                b"Content-Type": b"application/javascript; charset=UTF-8",
-                b"Cache-Control": CACHE_CONTROL,
-                b"Connection": b"keep-alive",
-            }
-            headers.update(session_cookie(self.scope))
-            headers.update(cors_headers(self.scope["headers"]))
-
-            await self.send_headers(status=200, headers=headers)
+            await self.send_headers(status=200, headers=self.headers.render(self.scope))
 
             await self.handle_session()
 
@@ -45,25 +50,16 @@ class JSONPollingConsumer(HttpStreamingConsumer):
                     raise exceptions.BadRequest("Payload expected.")
 
                 body = unquote_plus(body[2:].decode())
-            else:
-                body = body.decode()
 
             if not body:
                 raise exceptions.BadRequest("Payload expected.")
 
             try:
-                messages = loads(body)
+                messages = self.manager.codec.loads(body)
             except Exception:
                 raise exceptions.BadRequest("Broken JSON encoding.")
 
-            headers = {
-                b"Content-Type": b"text/html; charset=UTF-8",
-                b"Cache-Control": CACHE_CONTROL,
-                b"Connection": b"keep-alive",
-            }
-            headers.update(session_cookie(self.scope))
-
-            await self.send_headers(status=200, headers=headers)
+            await self.send_headers(status=200, headers=self.post_headers.render(self.scope))
 
             await self.session.remote_messages(messages)
 
@@ -81,6 +77,7 @@ class JSONPollingConsumer(HttpStreamingConsumer):
             return await self.send_response(400, msg.encode("utf-8"), headers=headers)
 
     async def send_message(self, payload, *, more_body=False):
-        body = "/**/%s(%s);\r\n" % (self.callback, dumps(payload))
-        await self.send_body(body.encode("utf-8"), more_body=False)
+        data = escape_script(encode_frame(frame_bytes(payload), self.manager.codec.quote_frame))
+        body = b"".join((b"/**/", self.callback.encode("utf-8"), b"(", data, b");\r\n"))
+        await self.send_body(body, more_body=False)
         return True
@@ -2,10 +2,11 @@ import asyncio
 
 from .base import BaseWebsocketConsumer
 from ..exceptions import SessionIsClosed
-from ..protocol import FRAME_CLOSE, FRAME_MESSAGE, FRAME_MESSAGE_BLOB, loads
+from ..protocol import FRAME_CLOSE, FRAME_MESSAGE, FRAME_MESSAGE_BLOB, SharedFrame
 
 
 class RawWebsocketConsumer(BaseWebsocketConsumer):
+    transport = "raw_websocket"
     session_loop_task = None
 
     async def connect(self):
@@ -43,7 +44,10 @@ class RawWebsocketConsumer(BaseWebsocketConsumer):
                     for data in payload:
                         await self.send(data)
                 elif frame == FRAME_MESSAGE_BLOB:
-                    payload = loads(payload[1:])
+                    if isinstance(payload, SharedFrame) and payload.messages is not None:
+                        payload = payload.messages
+                    else:
+                        payload = self.manager.codec.loads(payload[1:])
                     for data in payload:
                         await self.send(data)
                 elif frame == FRAME_CLOSE:
@@ -1,8 +1,26 @@
 import http.cookies
-from datetime import datetime, timedelta
+from datetime import timedelta
+from email.utils import formatdate
+
+from ..clock import default_clock
 
 CACHE_CONTROL = b"no-store, no-cache, no-transform, must-revalidate, max-age=0"
 
+LINE_SEPARATOR = "\u2028".encode("utf-8")
+PARAGRAPH_SEPARATOR = "\u2029".encode("utf-8")
+
+
+def escape_script(data):
+    """Escape encoded JSON to be embedded in a script."""
+    # single byte checks first, they are several times faster than substring searches
+    if b"\xe2" in data:
+        # U+2028 and U+2029 end string literals in older javascript engines
+        data = data.replace(LINE_SEPARATOR, b"\\u2028").replace(PARAGRAPH_SEPARATOR, b"\\u2029")
+    if b"<" in data:
+        # "</script>" in a string literal ends an inline script
+        data = data.replace(b"</", b"<\\/")
+    return data
+
 
 def cors_headers(headers, force=False):
     headers = dict(headers)
@@ -10,9 +28,12 @@ def cors_headers(headers, force=False):
     if force:
         origin = b"*"
 
+    return _cors_headers(origin, headers.get(b"access-control-request-headers"))
+
+
+def _cors_headers(origin, ac_headers):
     cors = {b"Access-Control-Allow-Origin": origin}
 
-    ac_headers = headers.get(b"access-control-request-headers")
     if ac_headers:
         cors[b"Access-Control-Allow-Headers"] = ac_headers
 
@@ -33,11 +54,75 @@ def session_cookie(scope):
 td365 = timedelta(days=365)
 td365seconds = str(int(td365.total_seconds())).encode("utf-8")
 
+_expires = (None, ())  # expires timestamp, cache headers
+
+
+def cache_header_items(clock=None):
+    global _expires
+
+    if clock is None:
+        clock = default_clock
+
+    expires = int(clock.wall() + td365.total_seconds())
+    if _expires[0] != expires:
+        _expires = (expires, (
+            (b"Access-Control-Max-Age", td365seconds),
+            (b"Cache-Control", b"max-age=%s, public" % td365seconds),
+            (b"Expires", formatdate(expires, usegmt=True).encode("utf-8")),
+        ))
+
+    return _expires[1]
+
+
+def cache_headers(clock=None):
+    return dict(cache_header_items(clock))
+
+
+class HeaderTemplate(object):
+    """ Response headers of one transport and method
+
+    Static headers are built once. The session cookie and CORS headers of a
+    request are spliced in from a cache keyed on the cookie value, origin and
+    requested headers, cache headers are added when ``cache`` is set.
+
+    """
+
+    maxsize = 1024  # rendered header blocks to keep
+
+    def __init__(self, headers, *, cookie=True, cors=True, cache=False):
+        self.headers = tuple(headers.items())
+        self.cookie = cookie
+        self.cors = cors
+        self.cache = cache
+        self._rendered = {}
+
+    def render(self, scope, clock=None):
+        """Return response headers for scope as a list of pairs."""
+        session_id = origin = ac_headers = None
+        if self.cookie:
+            session_id = scope.get("cookies", {}).get("sessionID", "dummy")
+        if self.cors:
+            origin = b"*"
+            for name, value in scope["headers"]:
+                if name == b"origin":
+                    origin = value
+                elif name == b"access-control-request-headers":
+                    ac_headers = value
+
+        key = (session_id, origin, ac_headers)
+        headers = self._rendered.get(key)
+        if headers is None:
+            headers = list(self.headers)
+            if self.cookie:
+                headers.extend(session_cookie(scope).items())
+            if self.cors:
+                headers.extend(_cors_headers(origin, ac_headers).items())
+
+            headers = tuple(headers)
+            if len(self._rendered) >= self.maxsize:
+                self._rendered.clear()
+            self._rendered[key] = headers
 
-def cache_headers():
-    d = datetime.now() + td365
-    return {
-        b"Access-Control-Max-Age": td365seconds,
-        b"Cache-Control": b"max-age=%s, public" % td365seconds,
-        b"Expires": d.strftime("%a, %d %b %Y %H:%M:%S").encode("utf-8"),
-    }
+        if self.cache:
+            return [*headers, *cache_header_items(clock)]
+        return list(headers)
@@ -2,10 +2,11 @@ import asyncio
 
 from .base import BaseWebsocketConsumer
 from ..exceptions import SessionIsClosed, SessionIsAcquired
-from ..protocol import loads, STATE_CLOSED, FRAME_CLOSE, close_frame, STATE_CLOSING
+from ..protocol import STATE_CLOSED, FRAME_CLOSE, STATE_CLOSING
 
 
 class WebsocketConsumer(BaseWebsocketConsumer):
+    transport = "websocket"
     session_loop_task = None
 
     async def connect(self):
@@ -19,7 +20,7 @@ class WebsocketConsumer(BaseWebsocketConsumer):
             if payload.startswith("["):
                 payload = payload[1:-1]
 
-            data = loads(payload)
+            data = self.manager.codec.loads(payload)
             await self.session.remote_message(data)
         except Exception as exc:
             await self.session.remote_close(exc=exc)
@@ -27,6 +28,7 @@ class WebsocketConsumer(BaseWebsocketConsumer):
             await self.close()
 
     async def handle_session(self):
+        close_frame = self.manager.codec.close_frame
         if self.session.interrupted:
             await self.send(close_frame(1002, "Connection interrupted"))
         elif self.session.state in (STATE_CLOSING, STATE_CLOSED):
@@ -1,27 +1,27 @@
 from .base import HttpStreamingConsumer
-from .utils import CACHE_CONTROL, session_cookie, cors_headers, cache_headers
+from .utils import CACHE_CONTROL, HeaderTemplate
 
 
 class XHRConsumer(HttpStreamingConsumer):
+    transport = "xhr"
+    streaming = False
     maxsize = 0
 
-    async def handle(self, body):
-        headers = {
-            b"Content-Type": b"application/javascript; charset=UTF-8",
-        }
-        headers.update(session_cookie(self.scope))
-        headers.update(cors_headers(self.scope["headers"]))
+    headers = HeaderTemplate({
+        b"Content-Type": b"application/javascript; charset=UTF-8",
+        b"Connection": b"keep-alive",
+        b"Cache-Control": CACHE_CONTROL,
+    })
+    options_headers = HeaderTemplate({
+        b"Content-Type": b"application/javascript; charset=UTF-8",
+        b"Access-Control-Allow-Methods": b"OPTIONS, POST",
+    }, cache=True)
 
+    async def handle(self, body):
         if self.scope["method"] == "OPTIONS":
-            headers.update(cache_headers())
-            headers[b"Access-Control-Allow-Methods"] = b"OPTIONS, POST"
+            headers = self.options_headers.render(self.scope, self.manager.clock)
             return await self.send_response(204, b"", headers=headers)
 
-        headers.update({
-            b"Connection": b"keep-alive",
-            b"Cache-Control": CACHE_CONTROL,
-        })
-
-        await self.send_headers(status=200, headers=headers)
+        await self.send_headers(status=200, headers=self.headers.render(self.scope))
 
         await self.handle_session()
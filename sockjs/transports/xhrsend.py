@@ -1,11 +1,22 @@
 from django.core import exceptions
 
 from .base import HttpStreamingConsumer
-from .utils import CACHE_CONTROL, session_cookie, cors_headers, cache_headers
-from ..protocol import loads
+from .utils import CACHE_CONTROL, HeaderTemplate
 
 
 class XHRSendConsumer(HttpStreamingConsumer):
+    transport = "xhr_send"
+    streaming = False
+    headers = HeaderTemplate({
+        b"Connection": b"keep-alive",
+        b"Content-Type": b"text/plain; charset=UTF-8",
+        b"Cache-Control": CACHE_CONTROL,
+    })
+    options_headers = HeaderTemplate({
+        b"Access-Control-Allow-Methods": b"OPTIONS, POST",
+        b"Content-Type": b"application/javascript; charset=UTF-8",
+    }, cache=True)
+
     async def handle(self, body):
         allowed_methods = ("POST", "OPTIONS")
 
@@ -21,32 +32,18 @@ class XHRSendConsumer(HttpStreamingConsumer):
             return await self.send_response(403, msg.encode("utf-8"), headers=headers)
 
         if self.scope["method"] == "OPTIONS":
-            headers = {
-                b"Access-Control-Allow-Methods": b"OPTIONS, POST",
-                b"Content-Type": b"application/javascript; charset=UTF-8",
-            }
-            headers.update(session_cookie(self.scope))
-            headers.update(cors_headers(self.scope["headers"]))
-            headers.update(cache_headers())
+            headers = self.options_headers.render(self.scope, self.manager.clock)
             return await self.send_response(204, b"", headers=headers)
 
         if not body:
             raise exceptions.BadRequest("Payload expected.")
 
         try:
-            messages = loads(body)
+            messages = self.manager.codec.loads(body)
         except Exception:
             raise exceptions.BadRequest("Broken JSON encoding.")
 
-        headers = {
-            b"Connection": b"keep-alive",
-            b"Content-Type": b"text/plain; charset=UTF-8",
-            b"Cache-Control": CACHE_CONTROL,
-        }
-        headers.update(session_cookie(self.scope))
-        headers.update(cors_headers(self.scope["headers"]))
-
-        await self.send_headers(status=204, headers=headers)
+        await self.send_headers(status=204, headers=self.headers.render(self.scope))
 
         await self.session.remote_messages(messages)
 
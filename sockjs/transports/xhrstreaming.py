@@ -1,24 +1,28 @@
 from .base import HttpStreamingConsumer
-from .utils import CACHE_CONTROL, session_cookie, cors_headers, cache_headers
+from .utils import CACHE_CONTROL, HeaderTemplate
+from ..protocol import SharedBytes
 
 
 class XHRStreamingConsumer(HttpStreamingConsumer):
-    open_seq = "h" * 2048
+    transport = "xhr_streaming"
+    open_seq = SharedBytes(b"h" * 2048)
+
+    headers = HeaderTemplate({
+        b"Content-Type": b"application/javascript; charset=UTF-8",
+        b"Cache-Control": CACHE_CONTROL,
+    })
+    options_headers = HeaderTemplate({
+        b"Content-Type": b"application/javascript; charset=UTF-8",
+        b"Access-Control-Allow-Methods": b"OPTIONS, POST",
+    }, cache=True)
 
     async def handle(self, body):
-        headers = {
-            b"Content-Type": b"application/javascript; charset=UTF-8",
-            b"Cache-Control": CACHE_CONTROL,
-        }
-        headers.update(session_cookie(self.scope))
-        headers.update(cors_headers(self.scope["headers"]))
-
         if self.scope["method"] == "OPTIONS":
-            headers[b"Access-Control-Allow-Methods"] = b"OPTIONS, POST"
-            headers.update(cache_headers())
+            headers = self.options_headers.render(self.scope, self.manager.clock)
             return await self.send_response(204, b"", headers=headers)
 
-        headers[b"Connection"] = dict(self.scope["headers"]).get(b"connection", b"close")
+        headers = self.headers.render(self.scope)
+        headers.append((b"Connection", dict(self.scope["headers"]).get(b"connection", b"close")))
 
         await self.send_headers(status=200, headers=headers)
 
@@ -0,0 +1,61 @@
+import asyncio
+from datetime import timedelta
+
+from django.test import TestCase
+
+from sockjs.clock import LoopClock, VirtualClock, to_seconds
+
+
+class TestClock(TestCase):
+    def test_to_seconds(self):
+        self.assertEqual(to_seconds(timedelta(minutes=1)), 60.0)
+        self.assertEqual(to_seconds(5), 5.0)
+
+    async def test_loop_clock_is_coarse(self):
+        clock = LoopClock()
+        now = clock.time()
+        wall = clock.wall()
+        self.assertLessEqual(now, asyncio.get_running_loop().time())
+
+        await asyncio.sleep(0.002)
+        self.assertGreater(clock.time(), now)
+        self.assertGreater(clock.wall(), wall)
+
+        now = clock.time()
+        for _ in range(1000):
+            self.assertEqual(clock.time(), now)
+
+    def test_loop_clock_without_loop(self):
+        clock = LoopClock()
+        self.assertGreater(clock.time(), 0)
+        self.assertGreater(clock.wall(), 0)
+
+    async def test_virtual_clock(self):
+        calls = []
+        clock = VirtualClock(start=10.0, epoch=1000.0)
+        self.assertEqual(clock.time(), 10.0)
+        self.assertEqual(clock.wall(), 1010.0)
+
+        clock.call_later(5, lambda: calls.append(("b", clock.time())))
+        clock.call_at(12, lambda: calls.append(("a", clock.time())))
+        handle = clock.call_later(1, lambda: calls.append(("c", clock.time())))
+        handle.cancel()
+        clock.call_later(100, lambda: calls.append(("d", clock.time())))
+        self.assertEqual(len(clock), 3)
+
+        await clock.advance(10)
+        self.assertEqual(clock.time(), 20.0)
+        self.assertEqual(calls, [("a", 12.0), ("b", 15.0)])
+        self.assertEqual(len(clock), 1)
+
+    async def test_virtual_clock_reschedule(self):
+        calls = []
+        clock = VirtualClock()
+
+        def callback():
+            calls.append(clock.time())
+            clock.call_later(1, callback)
+
+        clock.call_later(1, callback)
+        await clock.advance(3600)
+        self.assertEqual(len(calls), 3600)
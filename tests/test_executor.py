@@ -0,0 +1,148 @@
+import asyncio
+import threading
+from unittest import mock
+
+from django.test import TestCase
+
+from sockjs import protocol, Session
+from sockjs.executor import HandlerExecutor, sync_handler
+from sockjs.metrics import SessionMetrics
+from .utils import make_manager, patch_session, queued
+
+
+class TestHandlerExecutor(TestCase):
+    async def test_call(self):
+        calls = []
+        metrics = SessionMetrics()
+        executor = HandlerExecutor(lambda msg, session: calls.append((msg, session)) or msg * 2, 2, metrics=metrics)
+
+        self.assertEqual(await executor(1, "s1"), 2)
+        self.assertEqual(calls, [(1, "s1")])
+        self.assertEqual(metrics.handler_calls, 1)
+        self.assertEqual(metrics.handler_queued, 0)
+        self.assertGreaterEqual(metrics.handler_wait_seconds, 0.0)
+        self.assertEqual(executor._tails, {})
+
+        def fail(msg, session):
+            raise ValueError(msg)
+
+        executor.handler = fail
+        with self.assertRaises(ValueError):
+            await executor(1, "s1")
+        self.assertEqual(metrics.handler_calls, 2)
+        executor.shutdown()
+
+    async def test_session_order(self):
+        release = threading.Event()
+        calls = []
+
+        def handler(msg, session):
+            if msg == 0:
+                release.wait(5)
+            calls.append((session, msg))
+
+        executor = HandlerExecutor(handler, 4)
+        s1 = [asyncio.ensure_future(executor(idx, "s1")) for idx in range(3)]
+        await asyncio.sleep(0.05)
+
+        # the first call of s1 blocks the calls after it, not other sessions
+        await executor(10, "s2")
+        self.assertEqual(calls, [("s2", 10)])
+
+        release.set()
+        await asyncio.gather(*s1)
+        self.assertEqual(calls[1:], [("s1", 0), ("s1", 1), ("s1", 2)])
+        executor.shutdown()
+
+    async def test_cancelled_call(self):
+        release = threading.Event()
+        calls = []
+
+        def handler(msg, session):
+            if msg == 0:
+                release.wait(5)
+            calls.append(msg)
+
+        metrics = SessionMetrics()
+        executor = HandlerExecutor(handler, 2, metrics=metrics)
+        first = asyncio.ensure_future(executor(0, "s1"))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        second = asyncio.ensure_future(executor(1, "s1"))
+        await asyncio.sleep(0.05)
+
+        # the cancelled call still runs to its end before the next one
+        self.assertEqual(calls, [])
+        release.set()
+        await second
+        self.assertEqual(calls, [0, 1])
+        self.assertEqual(metrics.handler_queued, 0)
+        executor.shutdown()
+
+    async def test_queue_depth(self):
+        release = threading.Event()
+        metrics = SessionMetrics()
+        executor = HandlerExecutor(lambda msg, session: release.wait(5), 1, metrics=metrics)
+        calls = [asyncio.ensure_future(executor(None, sid)) for sid in ("s1", "s2", "s3")]
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(metrics.handler_queued, 2)
+
+        release.set()
+        await asyncio.gather(*calls)
+        self.assertEqual(metrics.handler_queued, 0)
+        self.assertEqual(metrics.handler_calls, 3)
+        self.assertGreater(metrics.handler_wait_seconds, 0.0)
+        executor.shutdown()
+
+    async def test_session_calls_on_loop(self):
+        threads = []
+        feed = Session._feed
+        patch_session(self, "_feed", lambda *args: threads.append(threading.get_ident()) or feed(*args))
+
+        def handler(msg, session):
+            session.send(msg)
+            session.manager.broadcast(msg)
+            session.close()
+
+        for wrapped in (HandlerExecutor(handler, 2), sync_handler(handler)):
+            threads.clear()
+            manager = make_manager()
+            session = manager.get("s1", True)
+            session.state = protocol.STATE_OPEN
+
+            self.assertIsNone(await wrapped("msg", session))
+            self.assertEqual(queued(session), [
+                (protocol.FRAME_MESSAGE, ["msg"]),
+                (protocol.FRAME_MESSAGE_BLOB, 'a["msg"]'),
+                (protocol.FRAME_CLOSE, (3000, "Go away!")),
+            ])
+            self.assertEqual(threads, [threading.get_ident()] * 3)
+            await manager.clear()
+
+    async def test_manager_calls_on_loop(self):
+        def handler(msg, session):
+            manager = session.manager
+            manager.publish("room", msg)
+            manager.unsubscribe(session, "room")
+            manager.subscribe(session, "lobby")
+            session.expire()
+
+        for wrapped in (HandlerExecutor(handler, 2), sync_handler(handler)):
+            manager = make_manager()
+            session = manager.get("s1", True)
+            session.state = protocol.STATE_OPEN
+            manager.subscribe(session, "room")
+
+            self.assertIsNone(await wrapped("msg", session))
+            self.assertEqual(queued(session), [(protocol.FRAME_MESSAGE_BLOB, 'a["msg"]')])
+            self.assertEqual(manager.subscribers("room"), [])
+            self.assertEqual(manager.subscribers("lobby"), [session])
+            self.assertTrue(session.expired)
+            await manager.clear()
+
+    async def test_close_old_connections(self):
+        for wrapped in (HandlerExecutor(lambda msg, session: None, 1), sync_handler(lambda msg, session: None)):
+            with mock.patch("sockjs.executor.close_old_connections") as close_old_connections:
+                await wrapped("msg", "s1")
+            self.assertEqual(close_old_connections.call_count, 2)  # before and after the call
@@ -0,0 +1,76 @@
+from channels.routing import URLRouter
+from channels.testing import HttpCommunicator
+from django.test import TestCase
+
+import sockjs
+from sockjs import protocol, Hooks
+from .utils import make_handler
+
+
+class TestHooks(TestCase):
+    def test_register(self):
+        hooks = Hooks()
+        self.assertIsNone(hooks.on_feed)
+
+        calls = []
+        first = hooks.register("on_feed", lambda *args: calls.append(("first",) + args))
+        self.assertIs(hooks.on_feed, first)
+
+        @hooks.register("on_feed")
+        def second(*args):
+            calls.append(("second",) + args)
+
+        hooks.on_feed(1, 2)
+        self.assertEqual(calls, [("first", 1, 2), ("second", 1, 2)])
+
+        hooks.unregister("on_feed", first)
+        self.assertIs(hooks.on_feed, second)
+        hooks.unregister("on_feed", second)
+        self.assertIsNone(hooks.on_feed)
+
+        with self.assertRaises(ValueError):
+            hooks.register("on_unknown", second)
+
+    async def test_session_hooks(self):
+        calls = []
+        hooks = Hooks()
+        for name in sockjs.hooks.HOOKS:
+            hooks.register(name, lambda *args, name=name: calls.append((name,) + args))
+
+        sm = sockjs.SessionManager("sm", make_handler([]), hooks=hooks)
+        session = sm.get("s1", True)
+        self.assertIs(session.config.hooks, hooks)
+
+        await sm.acquire(session)
+        await session.wait()
+        await session.remote_message("msg")
+        session._tick(-1.0)
+        await sm._gc_task()
+        sm.stop()
+
+        names = [call[0] for call in calls]
+        self.assertEqual(names, ["on_feed", "on_handler_start", "on_handler_end", "on_dequeue",
+                                 "on_handler_start", "on_handler_end",
+                                 "on_feed", "on_handler_start", "on_handler_end",
+                                 "on_handler_start", "on_handler_end", "on_gc_pass"])
+        self.assertEqual(calls[0][1:3], (session, protocol.FRAME_OPEN))
+        self.assertEqual(calls[2][1].id, "s1")
+        self.assertIsNone(calls[2][4])  # no exception
+        self.assertEqual(calls[-1][1:], (sm, calls[-1][2], 1))
+
+        await sm.clear()
+
+    async def test_transport_write_hook(self):
+        calls = []
+        hooks = Hooks()
+        hooks.register("on_transport_write", lambda *args: calls.append(args))
+
+        routing = sockjs.make_routing(make_handler([]), name="test", hooks=hooks)
+        communicator = HttpCommunicator(URLRouter(routing.http), "POST", "/sockjs/000/s1/xhr")
+        await communicator.get_response()
+
+        manager = sockjs.get_manager(routing, "test")
+        self.assertIs(manager.hooks, hooks)
+        self.assertEqual(calls[0][:3], ("xhr", manager["s1"], 2))
+
+        await manager.clear()
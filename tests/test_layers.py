@@ -0,0 +1,180 @@
+import asyncio
+import threading
+from unittest import mock
+
+from channels.layers import InMemoryChannelLayer
+from django.test import TestCase
+
+import sockjs
+from sockjs import protocol, LayerSessionManager, Session
+from .utils import make_handler, patch_session, queued
+
+
+def make_layer_manager(layer, name="sm", **kwargs):
+    return LayerSessionManager(name, make_handler([]), channel_layer=layer, **kwargs)
+
+
+async def wait_for_layer():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+class TestLayerSessionManager(TestCase):
+    async def test_not_configured(self):
+        with mock.patch("sockjs.layers.get_channel_layer", return_value=None):
+            with self.assertRaises(ValueError):
+                make_layer_manager(None)
+
+    async def test_group(self):
+        sm = make_layer_manager(InMemoryChannelLayer(), name="chat room")
+        self.assertEqual(sm.group, "sockjs.chat_room")
+
+    async def test_broadcast_across_managers(self):
+        layer = InMemoryChannelLayer()
+        sm1 = make_layer_manager(layer)
+        sm2 = make_layer_manager(layer)
+        sm1.start()
+        sm2.start()
+        await wait_for_layer()
+
+        s1 = sm1.get("s1", True)
+        s1.state = protocol.STATE_OPEN
+        s2 = sm2.get("s2", True)
+        s2.state = protocol.STATE_OPEN
+
+        sm1.broadcast("msg")
+        self.assertEqual(queued(s1), [(protocol.FRAME_MESSAGE_BLOB, 'a["msg"]')])
+
+        await wait_for_layer()
+        self.assertEqual(queued(s1), [(protocol.FRAME_MESSAGE_BLOB, 'a["msg"]')])
+        self.assertEqual(queued(s2), [(protocol.FRAME_MESSAGE_BLOB, 'a["msg"]')])
+
+        sm1.stop()
+        sm2.stop()
+        await sm1.clear()
+        await sm2.clear()
+
+    async def test_publish_across_managers(self):
+        layer = InMemoryChannelLayer()
+        sm1 = make_layer_manager(layer)
+        sm2 = make_layer_manager(layer)
+        sm1.start()
+        sm2.start()
+        await wait_for_layer()
+
+        s2 = sm2.get("s2", True)
+        s2.state = protocol.STATE_OPEN
+        s3 = sm2.get("s3", True)
+        s3.state = protocol.STATE_OPEN
+        sm2.subscribe(s2, "room")
+
+        sm1.publish("room", "msg")
+        await wait_for_layer()
+        self.assertEqual(queued(s2), [(protocol.FRAME_MESSAGE_BLOB, 'a["msg"]')])
+        self.assertEqual(queued(s3), [])
+
+        sm1.stop()
+        sm2.stop()
+        await sm1.clear()
+        await sm2.clear()
+
+    async def test_batching(self):
+        layer = InMemoryChannelLayer()
+        sm = make_layer_manager(layer, batch_size=2)
+        layer.group_send = mock.Mock(wraps=layer.group_send)
+
+        sm.broadcast("msg1")
+        sm.publish("room", "msg2")
+        sm.broadcast("msg3")
+        self.assertFalse(layer.group_send.called)
+
+        await wait_for_layer()
+        self.assertEqual(layer.group_send.call_count, 2)
+        first = layer.group_send.call_args_list[0][0][1]
+        second = layer.group_send.call_args_list[1][0][1]
+        self.assertEqual(first["messages"], [[None, "msg1"], ["room", "msg2"]])
+        self.assertEqual(second["messages"], [[None, "msg3"]])
+        self.assertEqual(first["origin"], sm.origin)
+
+        await sm.clear()
+
+    async def test_batches_in_order(self):
+        layer = InMemoryChannelLayer()
+        sm = make_layer_manager(layer, batch_size=1)
+        sent = []
+
+        async def group_send(group, message):
+            await asyncio.sleep(0.01 if message["messages"][0][1] == "msg1" else 0)
+            sent.append(message["messages"])
+
+        layer.group_send = group_send
+        sm.broadcast("msg1")
+        await asyncio.sleep(0)
+        sm.broadcast("msg2")
+        sm.broadcast("msg3")
+
+        await asyncio.sleep(0.05)
+        self.assertEqual(sent, [[[None, "msg1"]], [[None, "msg2"]], [[None, "msg3"]]])
+        await sm.clear()
+
+    async def test_broadcast_from_thread(self):
+        layer = InMemoryChannelLayer()
+        sm = make_layer_manager(layer)
+        sm.start()
+        await wait_for_layer()
+        s1 = sm.get("s1", True)
+        s1.state = protocol.STATE_OPEN
+
+        threads = []
+        feed = Session._feed
+        patch_session(self, "_feed", lambda *args: threads.append(threading.get_ident()) or feed(*args))
+
+        await asyncio.get_running_loop().run_in_executor(None, sm.broadcast, "msg")
+        await wait_for_layer()
+        self.assertEqual(queued(s1), [(protocol.FRAME_MESSAGE_BLOB, 'a["msg"]')])
+        self.assertEqual(threads, [threading.get_ident()])  # fanned out on the loop thread
+
+        sm.stop()
+        await sm.clear()
+
+    async def test_listener_restart(self):
+        layer = InMemoryChannelLayer()
+        sm1 = make_layer_manager(layer)
+        sm2 = make_layer_manager(layer)
+        sm2._retry_delay = 0.01
+        receive = layer.receive
+        failures = [ConnectionError("connection lost")]
+
+        async def failing_receive(channel):
+            if failures and channel == sm2._channel:
+                raise failures.pop()
+            return await receive(channel)
+
+        layer.receive = failing_receive
+        with self.assertLogs("sockjs", "ERROR"):
+            sm2.start()
+            await asyncio.sleep(0.05)
+        self.assertFalse(sm2._listener.done())
+
+        s2 = sm2.get("s2", True)
+        s2.state = protocol.STATE_OPEN
+        sm1.broadcast("msg")
+        await wait_for_layer()
+        self.assertEqual(queued(s2), [(protocol.FRAME_MESSAGE_BLOB, 'a["msg"]')])
+
+        # a listener that ended is started again
+        sm2._listener.cancel()
+        await asyncio.sleep(0)
+        sm2.start()
+        self.assertFalse(sm2._listener.done())
+
+        sm2.stop()
+        await sm1.clear()
+        await sm2.clear()
+
+    async def test_make_routing(self):
+        layer = InMemoryChannelLayer()
+        routing = sockjs.make_routing(make_handler([]), name="layer", channel_layer=layer)
+        manager = sockjs.get_manager(routing, "layer")
+        self.assertIsInstance(manager, LayerSessionManager)
+        self.assertIs(manager.channel_layer, layer)
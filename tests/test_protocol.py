@@ -1,4 +1,5 @@
 import json
+from datetime import datetime
 
 from django.test import TestCase
 
@@ -16,6 +17,39 @@ class ProtocolTests(TestCase):
         self.assertEqual(protocol.loads(json.dumps(["test"])), ["test"])
         self.assertEqual(protocol.loads(json.dumps('"test"')), '"test"')
 
+    def test_codecs(self):
+        date = [datetime(2021, 5, 3, 10, 20, 30)]
+
+        for name in protocol.CODECS:
+            try:
+                codec = protocol.get_codec(name)
+            except ImportError:
+                continue  # not installed
+
+            self.assertEqual(codec.name, name)
+            self.assertEqual(codec.dumps(["msg", 1]), '["msg",1]')
+            self.assertEqual(codec.dumpb(["msg", 1]), b'["msg",1]')
+            self.assertEqual(codec.loads('["msg",1]'), ["msg", 1])
+            self.assertEqual(codec.loads(b'["msg",1]'), ["msg", 1])
+            self.assertEqual(codec.loads(codec.dumpb(["\u2028 \xe9"])), ["\u2028 \xe9"])
+
+            self.assertEqual(codec.message_frame("msg"), 'a["msg"]')
+            self.assertEqual(codec.messages_frame(["msg1", "msg2"]), 'a["msg1","msg2"]')
+            self.assertEqual(codec.close_frame(3000, "Go away!"), 'c[3000,"Go away!"]')
+            self.assertEqual(codec.message_frame_bytes("msg"), b'a["msg"]')
+            self.assertEqual(codec.messages_frame_bytes(["msg1", "msg2"]), b'a["msg1","msg2"]')
+            self.assertEqual(codec.close_frame_bytes(3000, "Go away!"), b'c[3000,"Go away!"]')
+            frame = 'a["\\"\\\\ \u2028 \xe9"]'
+            self.assertEqual(json.loads(codec.quote_frame(frame.encode("utf-8"))), frame)
+            if name != "ujson":
+                self.assertEqual(codec.dumps(date), '["Mon, 03 May 2021 10:20:30 -0000"]')
+
+        codec = protocol.get_codec("json")
+        self.assertIs(protocol.get_codec(codec), codec)
+        self.assertIs(protocol.get_codec(), protocol.default_codec)
+        with self.assertRaises(ValueError):
+            protocol.get_codec("unknown")
+
     def test_close_frame(self):
         msg = protocol.close_frame(1000, "Internal error")
         self.assertEqual(msg, 'c[1000,"Internal error"]')
@@ -27,3 +61,45 @@ class ProtocolTests(TestCase):
     def test_messages_frame(self):
         msg = protocol.messages_frame(["msg1", "msg2"])
         self.assertEqual(msg, "a%s" % protocol.dumps(["msg1", "msg2"]))
+
+    def test_encode_frame(self):
+        calls = []
+
+        def encoder(frame):
+            calls.append(frame)
+            return frame.encode("utf-8")
+
+        self.assertEqual(protocol.encode_frame('a["msg"]', encoder), b'a["msg"]')
+        self.assertEqual(protocol.encode_frame('a["msg"]', encoder), b'a["msg"]')
+        self.assertEqual(len(calls), 2)
+
+        frame = protocol.SharedFrame('a["msg"]', ["msg"])
+        self.assertEqual(frame, 'a["msg"]')
+        self.assertEqual(frame.messages, ["msg"])
+        encoded = protocol.encode_frame(frame, encoder)
+        self.assertEqual(encoded, b'a["msg"]')
+        self.assertIs(protocol.encode_frame(frame, encoder), encoded)
+        self.assertEqual(len(calls), 3)
+
+    def test_frame_bytes(self):
+        self.assertEqual(protocol.frame_bytes('a["\u00e9"]'), 'a["\u00e9"]'.encode("utf-8"))
+        frame = b'a["msg"]'
+        self.assertIs(protocol.frame_bytes(frame), frame)
+
+        frame = protocol.SharedFrame('a["msg"]', ["msg"])
+        encoded = protocol.frame_bytes(frame)
+        self.assertEqual(encoded, b'a["msg"]')
+        self.assertEqual(encoded.messages, ["msg"])
+        self.assertIs(protocol.frame_bytes(frame), encoded)
+
+    def test_close_frame_bytes(self):
+        frame = protocol.close_frame_bytes(3000, "Go away!")
+        self.assertEqual(frame, b'c[3000,"Go away!"]')
+        self.assertIs(protocol.close_frame_bytes(3000, "Go away!"), frame)
+        self.assertEqual(protocol.close_frame_bytes(3001, "Bye"), b'c[3001,"Bye"]')
+
+        # common close frames are built once per codec, with that codec
+        codec = protocol.get_codec("json")
+        codec.close_frame_bytes = lambda code, reason: b"c[%d]" % code
+        self.assertEqual(protocol.close_frame_bytes(3000, "Go away!", codec), b"c[3000]")
+        self.assertIs(protocol.close_frame_bytes(3000, "Go away!", codec), codec.common_close_frames[3000, "Go away!"])
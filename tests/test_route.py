@@ -1,9 +1,11 @@
+from channels.routing import URLRouter
 from channels.testing import HttpCommunicator, WebsocketCommunicator
 from django.test import TestCase
 
 import sockjs
+from sockjs.executor import HandlerExecutor
 from sockjs.transports.base import HttpStreamingConsumer
-from .utils import make_application
+from .utils import make_application, make_handler
 
 
 class RouteTests(TestCase):
@@ -70,6 +72,112 @@ class RouteTests(TestCase):
         self.assertEqual(response["body"].decode(), text)
         self.assertIn(b"ETag", dict(response["headers"]))
 
+    async def test_stats(self):
+        routing = sockjs.make_routing(make_handler([]), name="test", stats=True)
+        application = URLRouter(routing.http)
+
+        communicator = HttpCommunicator(application, "POST", "/sockjs/000/s1/xhr")
+        await communicator.get_response()
+
+        communicator = HttpCommunicator(application, "GET", "/sockjs/stats")
+        response = await communicator.get_response()
+        self.assertEqual(response["status"], 200)
+        self.assertIn((b"Content-Type", b"text/plain; version=0.0.4; charset=utf-8"), response["headers"])
+
+        body = response["body"].decode()
+        self.assertIn("# TYPE sockjs_sessions gauge\n", body)
+        self.assertIn('sockjs_sessions{manager="test",state="open"} 1\n', body)
+        self.assertIn('sockjs_bytes_written_total{manager="test",transport="xhr"} 2\n', body)
+
+        endpoint = routing.config["__sockjs_endpoints__"]["sockjs"]
+        self.assertEqual(sockjs.SockJSDispatcher(routing).resolve("sockjs/stats"), (endpoint.stats, {}))
+
+        await sockjs.get_manager(routing, "test").clear()
+
+    async def test_streaming_budget(self):
+        budget = sockjs.StreamingBudget(max_bytes=1 << 20)
+        routing = sockjs.make_routing(make_handler([]), name="test", streaming_budget=budget)
+        factories = routing.config["__sockjs_endpoints__"]["sockjs"].route.factories
+        self.assertIs(factories["eventsource"][1].keywords["budget"], budget)
+        self.assertIs(factories["htmlfile"][1].keywords["budget"], budget)
+        self.assertNotIn("budget", factories["xhr"][1].keywords)
+        self.assertNotIn("budget", factories["xhr_send"][1].keywords)
+        self.assertNotIn("budget", factories["jsonp_send"][1].keywords)
+        self.assertNotIn("budget", factories["websocket"][1].keywords)
+        await sockjs.get_manager(routing, "test").clear()
+
+        routing = sockjs.make_routing(make_handler([]), name="test2", streaming_budget={"xhr_streaming": budget})
+        factories = routing.config["__sockjs_endpoints__"]["sockjs"].route.factories
+        self.assertIs(factories["xhr_streaming"][1].keywords["budget"], budget)
+        self.assertNotIn("budget", factories["eventsource"][1].keywords)
+        await sockjs.get_manager(routing, "test2").clear()
+
+        # polling responses end after a frame, a budget would keep them open
+        for cid in ("xhr", "jsonp", "xhr_send", "websocket"):
+            with self.assertRaises(ValueError):
+                sockjs.make_routing(make_handler([]), name="test3", streaming_budget={cid: budget})
+
+    async def test_poll_timeout(self):
+        routing = sockjs.make_routing(make_handler([]), name="test", poll_timeout=0.01)
+        factories = routing.config["__sockjs_endpoints__"]["sockjs"].route.factories
+        self.assertEqual(factories["xhr"][1].keywords["timeout"], 0.01)
+        self.assertEqual(factories["jsonp"][1].keywords["timeout"], 0.01)
+        self.assertNotIn("timeout", factories["xhr_streaming"][1].keywords)
+        self.assertNotIn("timeout", factories["websocket"][1].keywords)
+
+        application = URLRouter(routing.http)
+        communicator = HttpCommunicator(application, "POST", "/sockjs/000/s1/xhr")
+        self.assertEqual((await communicator.get_response())["body"], b"o\n")
+        communicator = HttpCommunicator(application, "POST", "/sockjs/000/s1/xhr")
+        self.assertEqual((await communicator.get_response())["body"], b"a[]\n")
+        await sockjs.get_manager(routing, "test").clear()
+
+    async def test_handler_threads(self):
+        messages = []
+        routing = sockjs.make_routing(lambda msg, session: messages.append(msg), name="test", handler_threads=2,
+                                      stats=True)
+        manager = sockjs.get_manager(routing, "test")
+        executor = manager.handler
+        self.assertIsInstance(executor, HandlerExecutor)
+        self.assertIs(executor.metrics, manager.metrics)
+        self.assertEqual(executor.executor._max_workers, 2)
+
+        session = manager.get("s1", create=True)
+        await session.remote_message("msg")
+        self.assertEqual(messages, [sockjs.protocol.SockjsMessage(sockjs.MSG_MESSAGE, "msg")])
+        self.assertEqual(manager.metrics.handler_calls, 1)
+
+        communicator = HttpCommunicator(URLRouter(routing.http), "GET", "/sockjs/stats")
+        body = (await communicator.get_response())["body"].decode()
+        self.assertIn('sockjs_handler_queued{manager="test"} 0\n', body)
+        self.assertIn('sockjs_handler_calls_total{manager="test"} 1\n', body)
+
+        await manager.clear()
+        executor.shutdown()
+
+    async def test_reconnect_metrics(self):
+        routing = sockjs.make_routing(make_handler([]), name="test", stats=True,
+                                      streaming_budget=sockjs.StreamingBudget(max_messages=2))
+        application = URLRouter(routing.http)
+        manager = sockjs.get_manager(routing, "test")
+        for sid, transport in (("s1", "xhr"), ("s2", "xhr_streaming")):
+            for _ in range(3):
+                communicator = HttpCommunicator(application, "POST", "/sockjs/000/%s/%s" % (sid, transport))
+                await communicator.get_response()
+                manager[sid].send("msg")
+
+        # repeated polls are neither reconnects nor spent budgets
+        self.assertEqual(manager.metrics.reconnects, {"xhr_streaming": 2})
+        self.assertEqual(manager.metrics.budget_spent, {("xhr_streaming", "messages"): 3})
+
+        communicator = HttpCommunicator(application, "GET", "/sockjs/stats")
+        body = (await communicator.get_response())["body"].decode()
+        self.assertIn('sockjs_reconnects_total{manager="test",transport="xhr_streaming"} 2\n', body)
+        self.assertIn('sockjs_reconnects_per_minute{manager="test",transport="xhr_streaming"} ', body)
+        self.assertNotIn('sockjs_reconnects_total{manager="test",transport="xhr"}', body)
+
+        await manager.clear()
+
     async def test_iframe_cache(self):
         communicator = HttpCommunicator(make_application(), "GET", "/sockjs/iframe.html",
                                         headers=[(b"if-none-match", b"test")])
@@ -160,3 +268,73 @@ class RouteTests(TestCase):
         communicator = WebsocketCommunicator(app, "/sockjs/websocket")
         accepted, _ = await communicator.connect()
         self.assertFalse(accepted)
+
+    async def test_disabled_consumer(self):
+        app = make_application(disable_consumers=("xhr",))
+        communicator = HttpCommunicator(app, "POST", "/sockjs/000/s1/xhr")
+        response = await communicator.get_response()
+        self.assertEqual(response["status"], 404)
+        self.assertEqual(response["body"], b"SockJS consumer handler not found.")
+
+
+def make_dispatcher(fallback=None):
+    routing = sockjs.make_routing(make_handler([]), name="test")
+    sockjs.routing.add_endpoint(routing, make_handler([]), name="api", prefix="api/sockjs")
+    return sockjs.SockJSDispatcher(routing, fallback=fallback)
+
+
+class DispatcherTests(TestCase):
+    def test_resolve(self):
+        dispatcher = make_dispatcher()
+        test = dispatcher.endpoints["sockjs"]
+        api = dispatcher.endpoints["api/sockjs"]
+
+        self.assertEqual(dispatcher.resolve("sockjs"), (test.greeting, {}))
+        self.assertEqual(dispatcher.resolve("sockjs/"), (test.greeting, {}))
+        self.assertEqual(dispatcher.resolve("sockjs/info"), (test.info, {}))
+        self.assertEqual(dispatcher.resolve("sockjs/iframe.html"), (test.iframe, {}))
+        self.assertEqual(dispatcher.resolve("sockjs/iframe-v1_2.html"), (test.iframe, {"version": "-v1_2"}))
+        self.assertEqual(dispatcher.resolve("sockjs/000/s1/xhr"),
+                         (test.route.handler, {"server": "000", "sid": "s1", "cid": "xhr"}))
+        self.assertEqual(dispatcher.resolve("api/sockjs/000/s1/xhr_send"),
+                         (api.route.handler, {"server": "000", "sid": "s1", "cid": "xhr_send"}))
+        self.assertEqual(dispatcher.resolve("api/sockjs/info"), (api.info, {}))
+
+        self.assertIsNone(dispatcher.resolve("admin/"))
+        self.assertIsNone(dispatcher.resolve("sockjs/000/s1/x.y"))
+        self.assertIsNone(dispatcher.resolve("sockjs/websocket"))
+        self.assertIsNone(dispatcher.resolve("sockjs/stats"))
+
+    def test_resolve_websocket(self):
+        dispatcher = make_dispatcher()
+        test = dispatcher.endpoints["sockjs"]
+
+        self.assertEqual(dispatcher.resolve("sockjs/websocket", websocket=True), (test.route.websocket, {}))
+        self.assertEqual(dispatcher.resolve("sockjs/000/s1/websocket", websocket=True),
+                         (test.route.handler, {"server": "000", "sid": "s1", "cid": "websocket"}))
+        self.assertIsNone(dispatcher.resolve("sockjs/info", websocket=True))
+        self.assertIsNone(dispatcher.resolve("sockjs/000//websocket", websocket=True))
+
+    async def test_dispatch(self):
+        communicator = HttpCommunicator(make_dispatcher(), "POST", "/sockjs/000/s1/xhr")
+        response = await communicator.get_response()
+        self.assertEqual(response["status"], 200)
+        self.assertEqual(response["body"], b"o\n")
+
+        communicator = WebsocketCommunicator(make_dispatcher(), "/api/sockjs/websocket")
+        accepted, _ = await communicator.connect()
+        self.assertTrue(accepted)
+        await communicator.disconnect()
+
+    async def test_dispatch_fallback(self):
+        communicator = HttpCommunicator(make_dispatcher(), "GET", "/admin/")
+        response = await communicator.get_response()
+        self.assertEqual(response["status"], 404)
+
+        async def fallback(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200})
+            await send({"type": "http.response.body", "body": scope["path"].encode()})
+
+        communicator = HttpCommunicator(make_dispatcher(fallback), "GET", "/admin/")
+        response = await communicator.get_response()
+        self.assertEqual(response["body"], b"/admin/")
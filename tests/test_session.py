@@ -1,34 +1,57 @@
 import asyncio
-from datetime import datetime, timedelta
+from datetime import timedelta
 from unittest import mock
 
 from django.test import TestCase
 
-from sockjs import protocol, Session, SessionIsClosed, SessionIsAcquired
+import sockjs
+from sockjs import protocol, Session, SessionManager, SessionIsClosed, SessionIsAcquired, VirtualClock
+from sockjs.metrics import MinuteRate
 from sockjs.session import DEFAULT_SESSION_TIMEOUT
-from .utils import make_handler, make_session, make_manager, make_scope
+from .utils import make_handler, make_session, make_manager, make_scope, queued, patch_session
 
 
 class TestSession(TestCase):
-    @mock.patch("sockjs.session.datetime")
-    async def test_ctor(self, mock_datetime):
-        now = mock_datetime.now.return_value = datetime.now()
+    async def test_ctor(self):
+        clock = VirtualClock(start=100.0)
 
-        session = make_session(name="id")
+        session = make_session(name="id", clock=clock)
 
         self.assertEqual(session.id, "id")
         self.assertFalse(session.expired)
-        self.assertEqual(session.expires, now + DEFAULT_SESSION_TIMEOUT)
+        self.assertEqual(session.timeout, DEFAULT_SESSION_TIMEOUT.total_seconds())
+        self.assertEqual(session.expires, 100.0 + DEFAULT_SESSION_TIMEOUT.total_seconds())
 
         self.assertEqual(session._hits, 0)
         self.assertEqual(session._heartbeats, 0)
         self.assertEqual(session.state, protocol.STATE_NEW)
 
-        session = make_session(name="id", timeout=timedelta(seconds=15))
+        session = make_session(name="id", timeout=timedelta(seconds=15), clock=clock)
 
         self.assertEqual(session.id, "id")
         self.assertFalse(session.expired)
-        self.assertEqual(session.expires, now + timedelta(seconds=15))
+        self.assertEqual(session.expires, 115.0)
+
+    async def test_dict_session(self):
+        manager = SessionManager("sm", make_handler([]), session_factory=sockjs.DictSession)
+        session = manager.get("id", True)
+        self.assertIsInstance(session, sockjs.DictSession)
+        with self.assertRaises(AttributeError):
+            make_session().user = "user"
+
+        session.user = "user"
+        self.assertEqual(session.user, "user")
+
+        config = session.config
+        session.timeout = timedelta(seconds=15)
+        session.heartbeat_interval = 5.0
+        self.assertEqual(session.timeout, 15.0)
+        self.assertEqual(session.heartbeat_interval, 5.0)
+        self.assertIs(session.config.codec, config.codec)
+        self.assertEqual(config.timeout, DEFAULT_SESSION_TIMEOUT.total_seconds())  # shared settings are kept
+        self.assertIs(manager.get("other", True).config, config)
+
+        await manager.clear()
 
     async def test_str(self):
         session = make_session()
@@ -51,33 +74,33 @@ class TestSession(TestCase):
         session.acquired = True
         self.assertEqual(str(session), "id='test' connected acquired queue[1] hits=10 heartbeats=50")
 
-    @mock.patch("sockjs.session.datetime")
-    async def test_tick(self, mock_datetime):
-        now = mock_datetime.now.return_value = datetime.now()
-        session = make_session()
-        self.assertEqual(session.expires, now + session.timeout)
+    async def test_tick(self):
+        clock = VirtualClock()
+        session = make_session(clock=clock)
+        self.assertEqual(session.expires, session.timeout)
 
-        now = mock_datetime.now.return_value = now + timedelta(hours=1)
+        await clock.advance(3600)
         session._tick()
-        self.assertEqual(session.expires, now + session.timeout)
+        self.assertEqual(session.expires, 3600 + session.timeout)
 
-    @mock.patch("sockjs.session.datetime")
-    async def test_tick_different_timeout(self, mock_datetime):
-        now = mock_datetime.now.return_value = datetime.now()
-        session = make_session(name="test", timeout=timedelta(seconds=20))
+    async def test_tick_different_timeout(self):
+        clock = VirtualClock()
+        session = make_session(name="test", timeout=timedelta(seconds=20), clock=clock)
 
-        now = mock_datetime.now.return_value = now + timedelta(hours=1)
+        await clock.advance(3600)
         session._tick()
-        self.assertEqual(session.expires, now + timedelta(seconds=20))
+        self.assertEqual(session.expires, 3620)
 
-    @mock.patch("sockjs.session.datetime")
-    async def test_tick_custom(self, mock_datetime):
-        now = mock_datetime.now.return_value = datetime.now()
-        session = make_session(name="test", timeout=timedelta(seconds=20))
+    async def test_tick_custom(self):
+        clock = VirtualClock()
+        session = make_session(name="test", timeout=timedelta(seconds=20), clock=clock)
 
-        now = mock_datetime.now.return_value = now + timedelta(hours=1)
+        await clock.advance(3600)
         session._tick(timedelta(seconds=30))
-        self.assertEqual(session.expires, now + timedelta(seconds=30))
+        self.assertEqual(session.expires, 3630)
+
+        session._tick(40)
+        self.assertEqual(session.expires, 3640)
 
     async def test_heartbeat(self):
         session = make_session()
@@ -95,7 +118,46 @@ class TestSession(TestCase):
         session.state = protocol.STATE_OPEN
         session._heartbeat_consumer = True
         session._heartbeat()
-        self.assertEqual(list(session._queue), [(protocol.FRAME_HEARTBEAT, protocol.FRAME_HEARTBEAT)])
+        self.assertEqual(queued(session), [(protocol.FRAME_HEARTBEAT, protocol.FRAME_HEARTBEAT)])
+
+    async def test_heartbeat_not_consumed(self):
+        session = make_session()
+        session.state = protocol.STATE_OPEN
+        session._heartbeat()
+        self.assertFalse(session._heartbeat_consumed)
+
+        session._heartbeat()
+        await asyncio.sleep(0)
+        self.assertEqual(session._heartbeats, 1)
+        self.assertEqual(session.state, protocol.STATE_CLOSED)
+
+    async def test_start_heartbeat_timing_wheel(self):
+        sm = make_manager()
+        session = sm.get("test", True)
+        session.state = protocol.STATE_OPEN
+        session._heartbeat_consumer = True
+
+        session.start_heartbeat()
+        self.assertEqual(len(sm.heartbeat_wheel), 1)
+        self.assertTrue(sm.heartbeat_wheel.started)
+
+        session.stop_heartbeat()
+        self.assertIsNone(session._heartbeat_timer)
+        self.assertEqual(len(sm.heartbeat_wheel), 0)
+
+        await sm.clear()
+
+    async def test_start_heartbeat_own_timer(self):
+        session = make_session(heartbeat_interval=0.01)
+        session.state = protocol.STATE_OPEN
+        session._heartbeat_consumer = True
+
+        session.start_heartbeat()
+        await asyncio.sleep(0.015)
+        self.assertEqual(session._heartbeats, 1)
+
+        session.stop_heartbeat()
+        self.assertIsNone(session._heartbeat_timer)
 
     async def test_expire(self):
         session = make_session()
@@ -108,12 +170,12 @@ class TestSession(TestCase):
         session = make_session()
         session.send("message")
 
-        self.assertEqual(list(session._queue), [])
+        self.assertEqual(queued(session), [])
 
         session.state = protocol.STATE_OPEN
         session.send("message")
 
-        self.assertEqual(list(session._queue), [(protocol.FRAME_MESSAGE, ["message"])])
+        self.assertEqual(queued(session), [(protocol.FRAME_MESSAGE, ["message"])])
 
     async def test_send_non_str(self):
         session = make_session()
@@ -124,12 +186,12 @@ class TestSession(TestCase):
         session = make_session()
 
         session.send_frame('a["message"]')
-        self.assertEqual(list(session._queue), [])
+        self.assertEqual(queued(session), [])
 
         session.state = protocol.STATE_OPEN
 
         session.send_frame('a["message"]')
-        self.assertEqual(list(session._queue), [(protocol.FRAME_MESSAGE_BLOB, 'a["message"]')])
+        self.assertEqual(queued(session), [(protocol.FRAME_MESSAGE_BLOB, 'a["message"]')])
 
     async def test_feed(self):
         session = make_session()
@@ -143,7 +205,7 @@ class TestSession(TestCase):
             (protocol.FRAME_CLOSE, (3001, "reason")),
         ]
 
-        self.assertEqual(list(session._queue), queue_data)
+        self.assertEqual(queued(session), queue_data)
 
     async def test_feed_msg_packing(self):
         session = make_session()
@@ -158,7 +220,7 @@ class TestSession(TestCase):
             (protocol.FRAME_MESSAGE, ["msg3"]),
         ]
 
-        self.assertEqual(list(session._queue), queue_data)
+        self.assertEqual(queued(session), queue_data)
 
     async def test_feed_with_waiter(self):
         session = make_session()
@@ -166,7 +228,7 @@ class TestSession(TestCase):
         session._waiter = waiter = loop.create_future()
         session._feed(protocol.FRAME_MESSAGE, "msg")
 
-        self.assertEqual(list(session._queue), [(protocol.FRAME_MESSAGE, ["msg"])])
+        self.assertEqual(queued(session), [(protocol.FRAME_MESSAGE, ["msg"])])
         self.assertIsNone(session._waiter)
         self.assertTrue(waiter.done())
 
@@ -221,19 +283,146 @@ class TestSession(TestCase):
         self.assertEqual(frame, protocol.FRAME_CLOSE)
         self.assertEqual(payload, (3000, "Go away!"))
 
+    async def test_wait_coalesce(self):
+        session = make_session()
+        session.state = protocol.STATE_OPEN
+        session.send("msg1")
+        session.send_frame(protocol.SharedFrame('a["msg2"]'))
+        session.send_frame("a[]")
+        session.send("msg3")
+        session.close()
+        session.send_frame('a["msg4"]')
+
+        frame, payload = await session.wait()
+        self.assertEqual(frame, protocol.FRAME_MESSAGE)
+        self.assertEqual(payload, 'a["msg1","msg2","msg3"]')
+        self.assertEqual(session._queue_size, 0)
+
+        frame, payload = await session.wait()
+        self.assertEqual(frame, protocol.FRAME_CLOSE)
+
+    async def test_wait_single_blob(self):
+        session = make_session()
+        session.state = protocol.STATE_OPEN
+        blob = protocol.SharedFrame('a["msg1"]')
+        session.send_frame(blob)
+        session._feed(protocol.FRAME_HEARTBEAT, protocol.FRAME_HEARTBEAT)
+
+        frame, payload = await session.wait()
+        self.assertEqual(frame, protocol.FRAME_MESSAGE_BLOB)
+        self.assertIs(payload, blob)
+
+        frame, payload = await session.wait()
+        self.assertEqual(frame, protocol.FRAME_HEARTBEAT)
+
+    async def test_wait_timeout(self):
+        clock = VirtualClock()
+        session = make_session(clock=clock)
+        session.state = protocol.STATE_OPEN
+
+        waiter = asyncio.ensure_future(session.wait(timeout=5))
+        await asyncio.sleep(0)
+        self.assertEqual(len(clock), 1)
+        await clock.advance(5)
+        self.assertIsNone(await waiter)
+        self.assertIsNone(session._waiter)
+
+        # a frame in time cancels the timer
+        waiter = asyncio.ensure_future(session.wait(timeout=5))
+        await asyncio.sleep(0)
+        session.send("msg")
+        self.assertEqual(await waiter, (protocol.FRAME_MESSAGE, 'a["msg"]'))
+        self.assertEqual(len(clock), 0)
+
+        waiter = asyncio.ensure_future(session.wait(timeout=5))
+        await asyncio.sleep(0)
+        await session.remote_closed()
+        with self.assertRaises(SessionIsClosed):
+            await waiter
+
+    async def test_wait_encoded(self):
+        session = make_session()
+        session.state = protocol.STATE_OPEN
+        blob = protocol.SharedFrame('a["msg2"]')
+        session._feed(protocol.FRAME_HEARTBEAT, protocol.FRAME_HEARTBEAT)
+        session.send("msg1")
+        session.send_frame(blob)
+        session.send_frame(blob)
+        session.close()
+
+        frame, payload = await session.wait(encoded=True)
+        self.assertEqual(frame, protocol.FRAME_HEARTBEAT)
+        self.assertIs(payload, protocol.HEARTBEAT_FRAME_BYTES)
+
+        frame, payload = await session.wait(encoded=True)
+        self.assertEqual(frame, protocol.FRAME_MESSAGE)
+        self.assertEqual(payload, b'a["msg1","msg2","msg2"]')
+
+        frame, payload = await session.wait(encoded=True)
+        self.assertEqual(frame, protocol.FRAME_CLOSE)
+        self.assertIs(payload, protocol.close_frame_bytes(3000, "Go away!"))
+
+        # a single shared frame is encoded once for all sessions
+        sessions = [make_session(str(idx)) for idx in range(2)]
+        payloads = []
+        for session in sessions:
+            session.state = protocol.STATE_OPEN
+            session.send_frame(blob)
+            frame, payload = await session.wait(encoded=True)
+            payloads.append(payload)
+        self.assertEqual(frame, protocol.FRAME_MESSAGE_BLOB)
+        self.assertEqual(payloads[0], b'a["msg2"]')
+        self.assertIs(payloads[0], payloads[1])
+
+    async def test_wait_replay(self):
+        manager = SessionManager("sm", make_handler([]), replay_size=2)
+        session = manager.get("test", True)
+        session.state = protocol.STATE_OPEN
+        self.assertIsNone(session.replay)
+
+        for message in ("msg1", "msg2", "msg3"):
+            session.send(message)
+            await session.wait(encoded=True, replay=True)
+        session._feed(protocol.FRAME_HEARTBEAT, protocol.FRAME_HEARTBEAT)
+        await session.wait(encoded=True, replay=True)
+        session.send("msg4")
+        await session.wait(encoded=True)  # the waiting transport cannot resume
+
+        replay = session.replay
+        self.assertEqual(replay.seq, 3)
+        self.assertEqual(len(replay), 2)
+        self.assertEqual(replay.last, b'a["msg3"]')
+        self.assertEqual(replay.since(0), [(2, b'a["msg2"]'), (3, b'a["msg3"]')])
+        self.assertEqual(replay.since(2), [(3, b'a["msg3"]')])
+        self.assertEqual(replay.since(3), [])
+        self.assertEqual(replay.since(10), [])
+
+        await manager.clear()
+
+    async def test_wait_unpack_does_not_coalesce(self):
+        session = make_session()
+        session.state = protocol.STATE_OPEN
+        session.send("msg1")
+        session.send_frame('a["msg2"]')
+
+        frame, payload = await session.wait(pack=False)
+        self.assertEqual(payload, ["msg1"])
+        frame, payload = await session.wait(pack=False)
+        self.assertEqual(payload, 'a["msg2"]')
+
     async def test_close(self):
         session = make_session()
         session.state = protocol.STATE_OPEN
         session.close()
         self.assertEqual(session.state, protocol.STATE_CLOSING)
-        self.assertEqual(list(session._queue), [(protocol.FRAME_CLOSE, (3000, "Go away!"))])
+        self.assertEqual(queued(session), [(protocol.FRAME_CLOSE, (3000, "Go away!"))])
 
     async def test_close_idempotent(self):
         session = make_session()
         session.state = protocol.STATE_CLOSED
         session.close()
         self.assertEqual(session.state, protocol.STATE_CLOSED)
-        self.assertEqual(list(session._queue), [])
+        self.assertEqual(queued(session), [])
 
     async def test_acquire_new_session(self):
         manager = object()
@@ -247,7 +436,7 @@ class TestSession(TestCase):
         self.assertEqual(session.state, protocol.STATE_OPEN)
         self.assertIs(session.manager, manager)
         self.assertTrue(session._heartbeat_consumer)
-        self.assertEqual(list(session._queue), [(protocol.FRAME_OPEN, protocol.FRAME_OPEN)])
+        self.assertEqual(queued(session), [(protocol.FRAME_OPEN, protocol.FRAME_OPEN)])
         self.assertEqual(messages, [(protocol.OpenMessage, session)])
 
     async def test_acquire_exception_in_handler(self):
@@ -266,7 +455,7 @@ class TestSession(TestCase):
             (protocol.FRAME_OPEN, protocol.FRAME_OPEN),
             (protocol.FRAME_CLOSE, (3000, "Internal error")),
         ]
-        self.assertEqual(list(session._queue), queue_data)
+        self.assertEqual(queued(session), queue_data)
 
     async def test_remote_close(self):
         messages = []
@@ -376,6 +565,69 @@ class TestSession(TestCase):
         await session.remote_messages(("msg1", "msg2"))
         self.assertEqual(messages, [])
 
+    async def test_queue_drop_oldest(self):
+        session = make_session(max_queue_size=2)
+        session.state = protocol.STATE_OPEN
+
+        session.send("msg1")
+        session.send_frame('a["msg2"]')
+        session.send("msg3")
+        self.assertEqual(queued(session), [
+            (protocol.FRAME_MESSAGE_BLOB, 'a["msg2"]'),
+            (protocol.FRAME_MESSAGE, ["msg3"]),
+        ])
+        self.assertEqual(session.dropped, 1)
+
+        session.send("msg4")
+        self.assertEqual(queued(session), [(protocol.FRAME_MESSAGE, ["msg3", "msg4"])])
+        self.assertEqual(session.dropped, 2)
+
+        await session.wait()
+        session.send("msg5")
+        self.assertEqual(queued(session), [(protocol.FRAME_MESSAGE, ["msg5"])])
+        self.assertEqual(session.dropped, 2)
+
+    async def test_queue_drop_oldest_keeps_control_frames(self):
+        session = make_session(max_queue_bytes=8)
+        session.state = protocol.STATE_OPEN
+        session._feed(protocol.FRAME_OPEN, protocol.FRAME_OPEN)
+
+        session.send("msg1")
+        session.send("msg2")
+        session.send("msg3")
+        self.assertEqual(queued(session), [
+            (protocol.FRAME_OPEN, protocol.FRAME_OPEN),
+            (protocol.FRAME_MESSAGE, ["msg2", "msg3"]),
+        ])
+        self.assertEqual(session._queue_bytes, 8)
+
+        # a message over the limit replaces the whole queue
+        session.send("long message")
+        self.assertEqual(queued(session), [
+            (protocol.FRAME_OPEN, protocol.FRAME_OPEN),
+            (protocol.FRAME_MESSAGE, ["long message"]),
+        ])
+
+    async def test_queue_drop_newest(self):
+        session = make_session(max_queue_size=1, queue_overflow=sockjs.OVERFLOW_DROP_NEWEST)
+        session.state = protocol.STATE_OPEN
+
+        session.send("msg1")
+        session.send("msg2")
+        self.assertEqual(queued(session), [(protocol.FRAME_MESSAGE, ["msg1"])])
+        self.assertEqual(session.dropped, 1)
+
+    async def test_queue_overflow_close(self):
+        session = make_session(max_queue_size=2, queue_overflow=sockjs.OVERFLOW_CLOSE)
+        session.state = protocol.STATE_OPEN
+
+        session.send("msg1")
+        session.send("msg2")
+        session.send("msg3")
+        self.assertEqual(session.state, protocol.STATE_CLOSING)
+        self.assertEqual(queued(session), [(protocol.FRAME_CLOSE, (3000, "Send queue overflow"))])
+        self.assertEqual(session.dropped, 3)
+
 
 class TestSessionManager(TestCase):
     async def test_handler(self):
@@ -448,9 +700,8 @@ class TestSessionManager(TestCase):
         sm = make_manager()
         s1 = make_session()
         sm._add(s1)
-        s1.acquire = mock.Mock()
         loop = asyncio.get_event_loop()
-        s1.acquire.return_value = loop.create_future()
+        patch_session(self, "acquire", mock.Mock(return_value=loop.create_future()))
         s1.acquire.return_value.set_result(1)
 
         scope = make_scope("GET", path="/sockjs/000/000000/test")
@@ -488,7 +739,7 @@ class TestSessionManager(TestCase):
     async def test_release(self):
         sm = make_manager()
         session = sm.get("test", True)
-        session.release = mock.Mock()
+        patch_session(self, "release", mock.Mock())
 
         scope = make_scope("GET", path="/sockjs/000/000000/test")
         await sm.acquire(session)
@@ -522,11 +773,74 @@ class TestSessionManager(TestCase):
         s2.state = protocol.STATE_OPEN
         sm.broadcast("msg")
 
-        self.assertEqual(list(s1._queue), [(protocol.FRAME_MESSAGE_BLOB, 'a["msg"]')])
-        self.assertEqual(list(s2._queue), [(protocol.FRAME_MESSAGE_BLOB, 'a["msg"]')])
+        self.assertEqual(queued(s1), [(protocol.FRAME_MESSAGE_BLOB, 'a["msg"]')])
+        self.assertEqual(queued(s2), [(protocol.FRAME_MESSAGE_BLOB, 'a["msg"]')])
+        self.assertIsInstance(s1._queue[0][1], protocol.SharedFrame)
+        self.assertIs(s1._queue[0][1], s2._queue[0][1])
 
         await sm.clear()
 
+    async def test_subscribe(self):
+        sm = make_manager()
+        s1 = sm.get("test1", True)
+        s2 = sm.get("test2", True)
+
+        sm.subscribe(s1, "room")
+        sm.subscribe(s1, "lobby")
+        sm.subscribe(s2, "room")
+        self.assertEqual(sm.subscribers("room"), [s1, s2])
+        self.assertEqual(sm.subscribers("lobby"), [s1])
+        self.assertEqual(sm.subscribers("unknown"), [])
+
+        with self.assertRaises(KeyError):
+            sm.subscribe(make_session("test3"), "room")
+
+        sm.unsubscribe(s1, "room")
+        self.assertEqual(sm.subscribers("room"), [s2])
+        sm.unsubscribe(s1, "room")
+
+        sm.unsubscribe(s2)
+        self.assertEqual(sm.subscribers("room"), [])
+        self.assertNotIn("room", sm._topics)
+
+        await sm.clear()
+
+    async def test_publish(self):
+        sm = make_manager()
+        s1 = sm.get("test1", True)
+        s1.state = protocol.STATE_OPEN
+        s2 = sm.get("test2", True)
+        s2.state = protocol.STATE_OPEN
+        s3 = sm.get("test3", True)
+        s3.state = protocol.STATE_OPEN
+
+        sm.subscribe(s1, "room")
+        sm.subscribe(s2, "room")
+        sm.publish("room", "msg")
+        sm.publish("lobby", "msg")
+
+        self.assertEqual(queued(s1), [(protocol.FRAME_MESSAGE_BLOB, 'a["msg"]')])
+        self.assertIs(s1._queue[0][1], s2._queue[0][1])
+        self.assertEqual(queued(s3), [])
+
+        await sm.clear()
+
+    async def test_gc_unsubscribe(self):
+        sm = make_manager()
+        s1 = sm.get("test1", True)
+        s2 = sm.get("test2", True)
+        sm.subscribe(s1, "room")
+        sm.subscribe(s2, "room")
+
+        s1._tick(timedelta(seconds=-30))
+        await sm._gc_task()
+
+        self.assertEqual(sm.subscribers("room"), [s2])
+        self.assertNotIn(s1.id, sm._subscriptions)
+
+        await sm.clear()
+        self.assertEqual(sm._topics, {})
+
     async def test_clear(self):
         sm = make_manager()
 
@@ -586,7 +900,7 @@ class TestSessionManager(TestCase):
         await sm.acquire(session)
         await sm.release(session)
 
-        session.expires = datetime.now() - timedelta(seconds=30)
+        session._tick(timedelta(seconds=-30))
 
         await sm._gc_task()
         self.assertNotIn(session.id, sm)
@@ -601,7 +915,7 @@ class TestSessionManager(TestCase):
         sm._add(session)
         scope = make_scope("GET", path="/sockjs/000/000000/test")
         await sm.acquire(session)
-        session.expires = datetime.now() - timedelta(seconds=30)
+        session._tick(timedelta(seconds=-30))
         await sm._gc_task()
 
         self.assertNotIn(session.id, sm)
@@ -624,7 +938,20 @@ class TestSessionManager(TestCase):
         await sm.release(s1)
         await sm.release(s2)
 
-        s1.expires = datetime.now() - timedelta(seconds=30)
+        s1._tick(timedelta(seconds=-30))
+
+        await sm._gc_task()
+        self.assertNotIn(s1.id, sm)
+        self.assertIn(s2.id, sm)
+
+        await sm.clear()
+
+    async def test_gc_manual_expire(self):
+        sm = make_manager()
+        s1 = sm.get("id1", True)
+        s2 = sm.get("id2", True)
+
+        s1.expire()
 
         await sm._gc_task()
         self.assertNotIn(s1.id, sm)
@@ -632,6 +959,92 @@ class TestSessionManager(TestCase):
 
         await sm.clear()
 
+    async def test_gc_extended_expire(self):
+        sm = make_manager()
+        session = sm.get("test", True)
+        session._tick(timedelta(seconds=-30))
+        session._tick()
+
+        await sm._gc_task()
+        self.assertIn(session.id, sm)
+        self.assertGreater(session._expiry_key, sm.clock.time())
+
+        await sm.clear()
+
+    async def test_gc_budget(self):
+        sm = make_manager()
+        sm.gc_budget = 0
+        s1 = sm.get("id1", True)
+        s2 = sm.get("id2", True)
+        s1._tick(timedelta(seconds=-30))
+        s2._tick(timedelta(seconds=-30))
+
+        await sm._gc_task()
+        self.assertEqual(len(sm), 1)
+
+        await sm._gc_task()
+        self.assertEqual(len(sm), 0)
+
+        await sm.clear()
+
+    async def test_gc_budget_reindex(self):
+        sm = make_manager()
+        sm.gc_budget = 0
+        sessions = [sm.get("id%d" % idx, True) for idx in range(3)]
+        for session in sessions:
+            session._tick(timedelta(seconds=-30))
+            session._tick()  # stale index entry
+
+        # the budget bounds re-indexing too, one entry per pass
+        now = sm.clock.time() + 1
+        index = sm._expiry_index
+        self.assertIsNone(index.pop(now, 0.0, lambda: 1.0))
+        self.assertEqual(sum(key < now for key, _, _ in index._heap), 2)
+
+        await sm._gc_task()
+        self.assertEqual(sum(key < now for key, _, _ in index._heap), 1)
+        self.assertEqual(len(sm), 3)
+
+        await sm.clear()
+
+    async def test_virtual_clock_expiry(self):
+        clock = VirtualClock()
+        sm = make_manager(clock=clock)
+        sm.start()
+        s1 = sm.get("id1", True)
+        s2 = sm.get("id2", True)
+
+        await clock.advance(300)
+        s2._tick()
+
+        await clock.advance(310)
+        self.assertNotIn(s1.id, sm)
+        self.assertIn(s2.id, sm)
+
+        await clock.advance(300)
+        self.assertNotIn(s2.id, sm)
+
+        sm.stop()
+        await sm.clear()
+
+    async def test_virtual_clock_heartbeat(self):
+        clock = VirtualClock()
+        sm = make_manager(clock=clock)
+        session = sm.get("test", True)
+        await sm.acquire(session)
+        await session.wait()
+
+        await clock.advance(sm.heartbeat_interval)
+        self.assertEqual(session._heartbeats, 1)
+        frame, _ = await session.wait()
+        self.assertEqual(frame, protocol.FRAME_HEARTBEAT)
+
+        await clock.advance(sm.heartbeat_interval * 2)
+        self.assertEqual(session._heartbeats, 2)
+        self.assertEqual(session.state, protocol.STATE_CLOSED)
+
+        await sm.clear()
+
     async def test_emits_warning_on_del(self):
         sm = make_manager()
         s1 = make_session("id1")
@@ -660,3 +1073,97 @@ class TestSessionManager(TestCase):
 
         await sm.clear()
         getattr(sm, "__del__")()
+
+    async def test_queue_limits(self):
+        sm = SessionManager("sm", make_handler([]), max_queue_size=1,
+                            queue_overflow=sockjs.OVERFLOW_DROP_NEWEST)
+        s1 = sm.get("test1", True)
+        s1.state = protocol.STATE_OPEN
+        s2 = sm.get("test2", True)
+        s2.state = protocol.STATE_OPEN
+
+        sm.broadcast("msg1")
+        sm.broadcast("msg2")
+        s1.send("msg3")
+        self.assertEqual(s2.max_queue_size, 1)
+        self.assertEqual(queued(s2), [(protocol.FRAME_MESSAGE_BLOB, 'a["msg1"]')])
+        self.assertEqual(sm.overflow_stats, {
+            sockjs.OVERFLOW_DROP_OLDEST: 0,
+            sockjs.OVERFLOW_DROP_NEWEST: 3,
+            sockjs.OVERFLOW_CLOSE: 0,
+        })
+
+        with self.assertRaises(ValueError):
+            SessionManager("sm", make_handler([]), queue_overflow="unknown")
+
+        await sm.clear()
+
+    def test_minute_rate(self):
+        rate = MinuteRate()
+        self.assertEqual(rate.value(0.0), 0)
+        for now in (1.0, 2.0, 59.0):
+            rate.add(now)
+        self.assertEqual(rate.value(30.0), 0)
+        self.assertEqual(rate.value(61.0), 3)
+        rate.add(70.0)
+        self.assertEqual(rate.value(80.0), 3)
+        self.assertEqual(rate.value(130.0), 1)
+        self.assertEqual(rate.value(200.0), 0)
+        rate.add(200.0)
+        self.assertEqual(rate.value(200.0), 0)
+
+    async def test_metrics(self):
+        sm = make_manager()
+        metrics = sm.metrics
+        s1 = sm.get("test1", True)
+        s2 = sm.get("test2", True)
+        self.assertEqual(metrics.sessions, {protocol.STATE_NEW: 2, protocol.STATE_OPEN: 0,
+                                            protocol.STATE_CLOSING: 0, protocol.STATE_CLOSED: 0})
+
+        await sm.acquire(s1)
+        await s1.wait()
+        self.assertEqual(metrics.acquired, 1)
+        self.assertEqual(metrics.sessions[protocol.STATE_NEW], 1)
+        self.assertEqual(metrics.sessions[protocol.STATE_OPEN], 1)
+
+        s1.send("msg1")
+        s1.send("msg2")
+        self.assertEqual((metrics.queued_messages, metrics.queued_bytes), (2, 8))
+        await s1.wait()
+        self.assertEqual((metrics.queued_messages, metrics.queued_bytes), (0, 0))
+        self.assertEqual(metrics.messages_out, 2)
+
+        await s1.remote_messages(["msg1", "msg2"])
+        await s1.remote_message("msg3")
+        self.assertEqual(metrics.messages_in, 3)
+
+        s1._heartbeat()
+        s1._heartbeat()
+        self.assertEqual((metrics.heartbeats_sent, metrics.heartbeats_missed), (1, 1))
+
+        await sm.release(s1)
+        self.assertEqual(metrics.acquired, 0)
+
+        s1.send("msg4")
+        s2._tick(-1.0)
+        await sm._gc_task()
+        sm.stop()
+        self.assertEqual((metrics.gc_passes, metrics.sessions_reaped), (1, 1))
+        self.assertEqual(metrics.sessions[protocol.STATE_NEW], 0)
+
+        await sm.clear()
+        self.assertEqual(sum(metrics.sessions.values()), 0)
+        self.assertEqual(metrics.queued_messages, 0)
+
+    async def test_sessions_share_config(self):
+        sm = make_manager()
+        s1 = sm.get("test1", True)
+        s2 = sm.get("test2", True)
+
+        self.assertIs(s1.config, s2.config)
+        self.assertIs(s1.handler, sm.handler)
+        self.assertEqual(s1.timeout, 600.0)
+        self.assertFalse(hasattr(s1, "__dict__"))
+        self.assertIsNone(s1._queue)
+
+        await sm.clear()
@@ -0,0 +1,336 @@
+import asyncio
+import uuid
+from datetime import timedelta
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import TestCase
+
+from sockjs import protocol, SessionManager, SessionIsAcquired
+from sockjs.store import CacheSessionStore, MemorySessionStore
+from .utils import make_handler, queued
+
+
+def make_shared_manager(store, result=None, **kwargs):
+    return SessionManager("sm", make_handler(result if result is not None else []), debug=True,
+                          store=store, **kwargs)
+
+
+async def flush():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+class StoreTests(object):
+    def make_store(self):
+        raise NotImplementedError
+
+    async def test_record(self):
+        store = self.make_store()
+        self.assertIsNone(await store.get("k"))
+
+        await store.set("k", {"state": 1}, 10)
+        self.assertEqual(await store.get("k"), {"state": 1})
+
+        await store.delete("k")
+        self.assertIsNone(await store.get("k"))
+
+    async def test_lock(self):
+        store = self.make_store()
+        self.assertTrue(await store.lock("k", "a", 10))
+        self.assertTrue(await store.lock("k", "a", 10))
+        self.assertFalse(await store.lock("k", "b", 10))
+
+        await store.unlock("k", "b")
+        self.assertFalse(await store.lock("k", "b", 10))
+
+        await store.unlock("k", "a")
+        self.assertTrue(await store.lock("k", "b", 10))
+
+    async def test_queue(self):
+        store = self.make_store()
+        self.assertEqual(await store.pull("k", 10), [])
+
+        await store.push("k", [("a", ["msg1"])], 10)
+        await store.push("k", [("h", "h"), ("c", (3000, "Go away!"))], 10)
+        self.assertEqual(list(await store.pull("k", 10)),
+                         [("a", ["msg1"]), ("h", "h"), ("c", (3000, "Go away!"))])
+        self.assertEqual(await store.pull("k", 10), [])
+
+        await store.push("k", [("a", ["msg2"])], 10)
+        self.assertEqual(list(await store.pull("k", 10)), [("a", ["msg2"])])
+
+
+    async def test_pull_many(self):
+        store = self.make_store()
+        self.assertEqual(await store.pull_many(["k1", "k2"], 10), {})
+
+        await store.push("k1", [("a", ["msg1"])], 10)
+        await store.push("k2", [("a", ["msg2"]), ("h", "h")], 10)
+        pulled = await store.pull_many(["k1", "k2", "k3"], 10)
+        self.assertEqual({key: list(frames) for key, frames in pulled.items()},
+                         {"k1": [("a", ["msg1"])], "k2": [("a", ["msg2"]), ("h", "h")]})
+        self.assertEqual(await store.pull_many(["k1", "k2"], 10), {})
+
+class TestMemorySessionStore(StoreTests, TestCase):
+    def make_store(self):
+        return MemorySessionStore()
+
+
+class TestCacheSessionStore(StoreTests, TestCase):
+    def make_store(self):
+        return CacheSessionStore(LocMemCache(uuid.uuid4().hex, {}))
+
+    async def test_pull_stops_at_missing_frame(self):
+        store = self.make_store()
+        await store.push("k", [("a", ["msg1"]), ("a", ["msg2"])], 10)
+        store.cache.delete("sockjs:k:frame:2")
+
+        self.assertEqual(await store.pull("k", 10), [("a", ["msg1"])])
+        self.assertEqual(await store.pull("k", 10), [])
+
+    async def test_pull_skips_lost_frame(self):
+        store = self.make_store()
+        await store.push("k", [("a", ["msg1"]), ("a", ["msg2"])], 10)
+        store.cache.delete("sockjs:k:frame:1")
+
+        self.assertEqual(await store.pull("k", 10), [])
+        await store.push("k", [("a", ["msg3"])], 10)
+        self.assertEqual(await store.pull("k", 10), [])  # the writer of frame 1 may still store it
+
+        # once the frame is missing for lost_frame_timeout, later frames are read
+        store.lost_frame_timeout = 0
+        self.assertEqual(await store.pull("k", 10), [("a", ["msg2"]), ("a", ["msg3"])])
+        self.assertIsNone(store.cache.get("sockjs:k:gap"))
+
+        await store.push("k", [("a", ["msg4"])], 10)
+        self.assertEqual(await store.pull("k", 10), [("a", ["msg4"])])
+
+        # frames counted after the missing frame was seen get their own time
+        await store.push("k", [("a", ["msg5"])], 10)
+        store.cache.delete("sockjs:k:frame:5")
+        self.assertEqual(await store.pull("k", 10), [])
+        await store.push("k", [("a", ["msg6"])], 10)
+        store.cache.delete("sockjs:k:frame:6")
+        self.assertEqual(await store.pull("k", 10), [])
+        self.assertEqual(store.cache.get("sockjs:k:read"), 5)
+        self.assertEqual(await store.pull("k", 10), [])
+        self.assertEqual(store.cache.get("sockjs:k:read"), 6)
+
+
+class TestSharedSessionManager(TestCase):
+    async def test_session_moves_between_managers(self):
+        store = MemorySessionStore()
+        sm1 = make_shared_manager(store)
+        sm2 = make_shared_manager(store)
+
+        session = sm1.get("s1", True)
+        await sm1.acquire(session)
+        frame, _ = await session.wait()
+        self.assertEqual(frame, protocol.FRAME_OPEN)
+        await sm1.release(session)
+
+        # released session queues its frames in the store
+        session.send("msg1")
+        self.assertEqual(queued(session), [])
+        await flush()
+
+        replica = await sm2.aget("s1")
+        self.assertIsNot(replica, session)
+        self.assertEqual(replica.state, protocol.STATE_OPEN)
+
+        await sm2.acquire(replica)
+        with self.assertRaises(SessionIsAcquired):
+            await sm1.acquire(session)
+
+        frame, payload = await replica.wait()
+        self.assertEqual(payload, 'a["msg1"]')
+
+        replica.send("msg2")
+        await sm2.release(replica)
+        self.assertEqual(queued(replica), [])
+
+        await sm1.acquire(session)
+        frame, payload = await session.wait()
+        self.assertEqual(payload, 'a["msg2"]')
+        await sm1.release(session)
+
+        await sm1.clear()
+        await sm2.clear()
+
+    async def test_aget_unknown(self):
+        sm = make_shared_manager(MemorySessionStore())
+        with self.assertRaises(KeyError):
+            await sm.aget("s1")
+
+        session = await sm.aget("s1", create=True)
+        self.assertIs(sm["s1"], session)
+        self.assertEqual(session.state, protocol.STATE_NEW)
+
+        await sm.clear()
+
+    async def test_poll_frames_while_acquired(self):
+        store = MemorySessionStore()
+        sm1 = make_shared_manager(store)
+        sm2 = make_shared_manager(store, store_poll_interval=0.001)
+
+        session = sm1.get("s1", True)
+        await sm1.acquire(session)
+        await session.wait()
+        await sm1.release(session)
+
+        replica = await sm2.aget("s1")
+        await sm2.acquire(replica)
+
+        session.send("msg1")
+        frame, payload = await asyncio.wait_for(replica.wait(), 1)
+        self.assertEqual(payload, 'a["msg1"]')
+
+        await sm2.release(replica)
+        await sm1.clear()
+        await sm2.clear()
+
+    async def test_poll_batches_pulls_and_renews_rarely(self):
+        store = MemorySessionStore()
+        calls = []
+        for name in ("lock", "set", "pull", "pull_many"):
+            method = getattr(store, name)
+
+            async def call(*args, _name=name, _method=method):
+                calls.append(_name)
+                return await _method(*args)
+
+            setattr(store, name, call)
+
+        sm = make_shared_manager(store, store_poll_interval=0.001)
+        for sid in ("s1", "s2", "s3"):
+            await sm.acquire(sm.get(sid, True))
+        calls.clear()
+
+        await asyncio.sleep(0.05)
+        # one batched pull per poll, locks and records are renewed after a part of the timeout
+        self.assertGreater(calls.count("pull_many"), 5)
+        self.assertEqual(set(calls) - {"pull"}, {"pull_many"})
+
+        for sid in ("s1", "s2", "s3"):
+            sm._store_renew_at[sid] = 0
+        await asyncio.sleep(0.01)
+        self.assertEqual(calls.count("lock"), 3)
+        self.assertEqual(calls.count("set"), 3)
+        self.assertGreater(sm._store_renew_at["s1"], sm.clock.time())
+
+        for sid in ("s1", "s2", "s3"):
+            await sm.release(sm[sid])
+        await sm.clear()
+
+    async def test_gc_keeps_session_used_elsewhere(self):
+        store = MemorySessionStore()
+        messages = []
+        sm1 = make_shared_manager(store, result=messages)
+        sm2 = make_shared_manager(store)
+
+        session = sm1.get("s1", True)
+        await sm1.acquire(session)
+        await sm1.release(session)
+
+        replica = await sm2.aget("s1")
+        await sm2.acquire(replica)
+        await sm2.release(replica)
+
+        session._tick(timedelta(seconds=-30))
+        await sm1._gc_task()
+        self.assertNotIn("s1", sm1)
+        self.assertEqual(messages, [(protocol.OpenMessage, session)])
+        self.assertIsNotNone(await store.get(sm2._store_key("s1")))
+
+        replica._tick(timedelta(seconds=-30))
+        await store.set(sm2._store_key("s1"), {"state": protocol.STATE_OPEN, "expires": 0}, 10)
+        await sm2._gc_task()
+        self.assertNotIn("s1", sm2)
+        self.assertEqual(replica.state, protocol.STATE_CLOSED)
+        self.assertIsNone(await store.get(sm2._store_key("s1")))
+
+        sm1.stop()
+        sm2.stop()
+        await sm1.clear()
+        await sm2.clear()
+
+    async def test_lock_renewed_while_acquired(self):
+        store = MemorySessionStore()
+        sm1 = make_shared_manager(store, session_timeout=timedelta(seconds=0.1), store_poll_interval=0.01)
+        sm2 = make_shared_manager(store, session_timeout=timedelta(seconds=0.1))
+
+        s1 = sm1.get("s1", True)
+        s2 = sm1.get("s2", True)
+        await sm1.acquire(s1)
+        await sm1.acquire(s2)
+        task = sm1._store_poll_task
+        self.assertIsNotNone(task)  # one poll task for all held sessions
+
+        await asyncio.sleep(0.3)  # held longer than the session timeout
+        replica = await sm2.aget("s1")
+        self.assertIsNotNone(replica)
+        with self.assertRaises(SessionIsAcquired):
+            await sm2.acquire(replica)
+
+        await sm1.release(s1)
+        self.assertIs(sm1._store_poll_task, task)
+        await sm1.release(s2)
+        await asyncio.sleep(0.05)
+        self.assertIsNone(sm1._store_poll_task)
+
+        await sm1.clear()
+        await sm2.clear()
+
+    async def test_gc_survives_store_error(self):
+        store = MemorySessionStore()
+        lock = store.lock
+        failures = [ConnectionError("store is down")]
+
+        async def failing_lock(*args):
+            if failures:
+                raise failures.pop()
+            return await lock(*args)
+
+        store.lock = failing_lock
+        sm = make_shared_manager(store)
+        session = sm.get("s1", True)
+        session._tick(timedelta(seconds=-30))
+
+        with self.assertLogs("sockjs", "ERROR"):
+            await sm._gc_task()
+        self.assertIn("s1", sm)
+        self.assertIsNone(sm._gc_future_task)
+        self.assertIsNotNone(sm._gc_timer)  # the next pass is scheduled
+
+        await sm._gc_task()
+        self.assertNotIn("s1", sm)
+
+        sm.stop()
+        await sm.clear()
+
+    async def test_gc_skips_session_locked_elsewhere(self):
+        store = MemorySessionStore()
+        sm1 = make_shared_manager(store)
+        sm2 = make_shared_manager(store)
+
+        session = sm1.get("s1", True)
+        await sm1.acquire(session)
+        await session.wait()
+
+        # a local copy of another process with a stale record
+        replica = await sm2.aget("s1")
+        replica._tick(timedelta(seconds=-30))
+        await store.set(sm2._store_key("s1"), {"state": protocol.STATE_OPEN, "expires": 0}, 10)
+        await sm2._gc_task()
+
+        self.assertNotIn("s1", sm2)
+        self.assertNotEqual(replica.state, protocol.STATE_CLOSED)
+        self.assertIsNotNone(await store.get(sm2._store_key("s1")))
+        self.assertEqual(await store.pull(sm2._store_key("s1"), 10), [])
+        self.assertFalse(await store.lock(sm2._store_key("s1"), sm2.owner, 10))
+
+        await sm1.release(session)
+        sm1.stop()
+        sm2.stop()
+        await sm1.clear()
+        await sm2.clear()
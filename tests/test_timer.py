@@ -0,0 +1,116 @@
+import asyncio
+
+from django.test import TestCase
+
+from sockjs.timer import PeriodicTimer, TimingWheel
+
+
+class TestTimingWheel(TestCase):
+    async def test_schedule(self):
+        wheel = TimingWheel(10.0, slots=10)
+        self.assertFalse(wheel.started)
+
+        handle = wheel.schedule(lambda: None)
+        self.assertTrue(wheel.started)
+        self.assertEqual(len(wheel), 1)
+
+        handle.cancel()
+        self.assertTrue(handle.cancelled)
+        self.assertEqual(len(wheel), 0)
+
+        handle.cancel()
+        self.assertEqual(len(wheel), 0)
+
+        wheel.stop()
+        self.assertFalse(wheel.started)
+
+    async def test_slot_without_jitter(self):
+        wheel = TimingWheel(10.0, slots=10, jitter=0)
+        handle = wheel.schedule(lambda: None)
+        self.assertEqual(handle._slot, 9)
+
+        wheel._tick()
+        handle = wheel.schedule(lambda: None)
+        self.assertEqual(handle._slot, 0)
+
+        wheel.clear()
+
+    async def test_slot_jitter(self):
+        wheel = TimingWheel(10.0, slots=10, jitter=0.5)
+        slots = {wheel.schedule(lambda: None)._slot for _ in range(200)}
+        self.assertTrue(slots <= {4, 5, 6, 7, 8, 9})
+        self.assertGreater(len(slots), 1)
+
+        sizes = [len(bucket) for bucket in wheel._buckets if bucket]
+        self.assertLess(max(sizes) - min(sizes), 20)
+
+        wheel.clear()
+        self.assertEqual(len(wheel), 0)
+        self.assertFalse(wheel.started)
+
+    async def test_tick(self):
+        calls = []
+        wheel = TimingWheel(4.0, slots=4, jitter=0)
+        wheel.schedule(lambda: calls.append(1))
+
+        for _ in range(3):
+            wheel._tick()
+        self.assertEqual(calls, [])
+
+        wheel._tick()
+        self.assertEqual(calls, [1])
+
+        for _ in range(4):
+            wheel._tick()
+        self.assertEqual(calls, [1, 1])
+
+        wheel.clear()
+
+    async def test_tick_cancel_from_callback(self):
+        calls = []
+        wheel = TimingWheel(1.0, slots=1, jitter=0)
+
+        def callback():
+            calls.append(1)
+            second.cancel()
+
+        wheel.schedule(callback)
+        second = wheel.schedule(lambda: calls.append(2))
+
+        wheel._tick()
+        self.assertEqual(calls, [1])
+        self.assertEqual(len(wheel), 1)
+
+        wheel.clear()
+
+    async def test_stops_when_empty(self):
+        wheel = TimingWheel(0.01, slots=2, jitter=0)
+        handle = wheel.schedule(lambda: None)
+        handle.cancel()
+
+        await asyncio.sleep(0.02)
+        self.assertFalse(wheel.started)
+
+    async def test_runs_on_loop(self):
+        calls = []
+        wheel = TimingWheel(0.01, slots=2)
+        wheel.schedule(lambda: calls.append(1))
+
+        await asyncio.sleep(0.05)
+        self.assertGreaterEqual(len(calls), 2)
+
+        wheel.clear()
+
+
+class TestPeriodicTimer(TestCase):
+    async def test_periodic(self):
+        calls = []
+        timer = PeriodicTimer(0.01, lambda: calls.append(1))
+
+        await asyncio.sleep(0.05)
+        self.assertGreaterEqual(len(calls), 2)
+
+        timer.cancel()
+        count = len(calls)
+        await asyncio.sleep(0.02)
+        self.assertEqual(len(calls), count)
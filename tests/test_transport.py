@@ -1,9 +1,12 @@
+from unittest import mock
+
 from channels.testing import HttpCommunicator, WebsocketCommunicator
 from django.test import TestCase
 
-from sockjs import protocol
+from sockjs import SessionManager, VirtualClock, protocol
 from sockjs.transports import base
-from .utils import make_manager, make_mocked_coroutine, make_future, make_scope, make_websocket_scope
+from .utils import make_handler, make_manager, make_mocked_coroutine, make_future
+from .utils import make_scope, make_websocket_scope, patch_session
 
 
 def make_http_transport(scope=None):
@@ -58,6 +61,50 @@ class TestTransport(TestCase):
 
         await transport.manager.clear()
 
+    async def test_streaming_budget(self):
+        clock = VirtualClock()
+        manager = SessionManager("sm", make_handler([]), clock=clock)
+        session = manager.get("TestHttpStreaming", create=True)
+
+        budget = base.StreamingBudget(max_bytes=None, max_messages=2)
+        transport = base.HttpStreamingConsumer(manager=manager, session=session, budget=budget)
+        transport.transport = "test"
+        transport.send_body = make_mocked_coroutine(None)
+        self.assertFalse(await transport.send_message("text data", more_body=True))
+        self.assertTrue(await transport.send_message("text data", more_body=True))
+
+        budget = base.StreamingBudget(max_age=10.0)
+        transport = base.HttpStreamingConsumer(manager=manager, session=session, budget=budget)
+        transport.transport = "test"
+        transport.send_body = make_mocked_coroutine(None)
+        self.assertFalse(await transport.send_message("text data", more_body=True))
+        await clock.advance(10.0)
+        self.assertTrue(await transport.send_message("text data", more_body=True))
+
+        self.assertEqual(manager.metrics.budget_spent, {("test", "messages"): 1, ("test", "age"): 1})
+        await manager.clear()
+
+    async def test_streaming_budget_adaptive(self):
+        clock = VirtualClock()
+        manager = SessionManager("sm", make_handler([]), clock=clock)
+        session = manager.get("TestHttpStreaming", create=True)
+        budget = base.StreamingBudget(max_bytes=10, max_messages=5, adaptive=4, min_age=10.0)
+
+        for limits in ((10, 5), (20, 10), (40, 20), (40, 20)):
+            transport = base.HttpStreamingConsumer(manager=manager, session=session, budget=budget)
+            self.assertEqual((transport.maxsize, transport.max_messages), limits)
+            transport.send_body = make_mocked_coroutine(None)
+            self.assertTrue(await transport.send_message("x" * 100, more_body=True))
+
+        # responses that last longer shrink the limits again
+        transport = base.HttpStreamingConsumer(manager=manager, session=session, budget=budget)
+        transport.send_body = make_mocked_coroutine(None)
+        await clock.advance(10.0)
+        await transport.send_message("x" * 100, more_body=True)
+        self.assertEqual(session.stream_scale, 2)
+
+        await manager.clear()
+
     async def test_handle_session_interrupted(self):
         transport = make_http_transport()
         transport.session.interrupted = True
@@ -74,7 +121,7 @@ class TestTransport(TestCase):
         send = transport.send_body = make_mocked_coroutine(None)
         transport.session.interrupted = False
         transport.session.state = protocol.STATE_CLOSING
-        transport.session.remote_closed = make_future(1)
+        patch_session(self, "remote_closed", make_future(1))
         await transport.handle_session()
         transport.session.remote_closed.assert_called_with()
         send.assert_called_with(b'c[3000,"Go away!"]\n', more_body=False)
@@ -86,7 +133,7 @@ class TestTransport(TestCase):
         send = transport.send_body = make_mocked_coroutine(None)
         transport.session.interrupted = False
         transport.session.state = protocol.STATE_CLOSED
-        transport.session.remote_closed = make_future(1)
+        patch_session(self, "remote_closed", make_future(1))
         await transport.handle_session()
         transport.session.remote_closed.assert_called_with()
         send.assert_called_with(b'c[3000,"Go away!"]\n', more_body=False)
@@ -130,3 +177,15 @@ class TestTransport(TestCase):
         self.assertEqual(transport.session.scope, communicator.scope)
 
         await transport.manager.clear()
+
+    async def test_transport_skips_channel_layer(self):
+        scope = make_scope("POST", "/sockjs/000/000000/test")
+        transport = make_http_transport(scope)
+        communicator = HttpCommunicator(transport, "POST", "/sockjs/000/000000/test")
+        communicator.scope = scope
+        with mock.patch("channels.consumer.get_channel_layer") as get_channel_layer:
+            await communicator.get_response()
+        self.assertFalse(get_channel_layer.called)
+        self.assertIsNone(transport.channel_layer)
+
+        await transport.manager.clear()
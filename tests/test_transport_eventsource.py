@@ -1,15 +1,18 @@
 from channels.testing import HttpCommunicator
 from django.test import TestCase
 
+from sockjs import SessionManager
+from sockjs.protocol import SharedFrame
 from sockjs.transports import eventsource
-from .utils import make_scope, make_manager, make_mocked_coroutine, make_future
+from .utils import make_handler, make_scope, make_manager, make_mocked_coroutine, make_future, patch_session
 
 path = "/sockjs/000/000000/eventsource"
 
 
-def make_transport():
-    scope = make_scope("GET", path=path)
-    manager = make_manager()
+def make_transport(manager=None, headers=None):
+    scope = make_scope("GET", path=path, headers=headers)
+    if manager is None:
+        manager = make_manager()
     session = manager.get("TestSessionEventSource", create=True, scope=scope)
 
     transport = eventsource.EventsourceConsumer(manager=manager, session=session)
@@ -33,6 +36,23 @@ class TestSessionEventSource(TestCase):
 
         await transport.manager.clear()
 
+    async def test_streaming_send_shared_frame(self):
+        t1 = make_transport()
+        t2 = make_transport()
+
+        send1 = t1.send_body = make_mocked_coroutine(None)
+        send2 = t2.send_body = make_mocked_coroutine(None)
+        frame = SharedFrame('a["msg"]')
+        await t1.send_message(frame, more_body=True)
+        await t2.send_message(frame, more_body=True)
+
+        body = send1.call_args[0][0]
+        self.assertEqual(body, b'data: a["msg"]\r\n\r\n')
+        self.assertIs(send2.call_args[0][0], body)
+
+        await t1.manager.clear()
+        await t2.manager.clear()
+
     async def test_process(self):
         transport = make_transport()
         transport.maxsize = 1
@@ -46,7 +66,7 @@ class TestSessionEventSource(TestCase):
 
     async def test_session_has_scope(self):
         transport = make_transport()
-        transport.session.release = make_future(1)
+        patch_session(self, "release", make_future(1))
         transport.maxsize = 1
         communicator = HttpCommunicator(transport, "GET", path)
         communicator.scope = transport.scope
@@ -57,3 +77,30 @@ class TestSessionEventSource(TestCase):
         self.assertEqual(transport.session.scope, communicator.scope)
 
         await transport.manager.clear()
+
+    async def test_resume(self):
+        manager = SessionManager("sm", make_handler([]), replay_size=10)
+        transport = make_transport(manager)
+        session = transport.session
+        send = transport.send_body = make_mocked_coroutine(None)
+
+        await manager.acquire(session)
+        await transport.send_message((await session.wait(encoded=True, replay=True))[1], more_body=True)
+        session.send("msg1")
+        await transport.send_message((await session.wait(encoded=True, replay=True))[1], more_body=True)
+        session.send("msg2")
+        await transport.send_message((await session.wait(encoded=True, replay=True))[1], more_body=True)
+        await manager.release(session)
+        self.assertEqual(send.call_args[0][0], b'id: 2\r\ndata: a["msg2"]\r\n\r\n')
+
+        # the client got the first frame only and reconnects
+        transport = make_transport(manager, headers=[(b"last-event-id", b"1")])
+        transport.maxsize = 1
+        communicator = HttpCommunicator(transport, "GET", path)
+        communicator.scope = transport.scope
+        response = await communicator.get_response()
+
+        self.assertEqual(transport.last_event_id, 1)
+        self.assertEqual(response["body"], b'\r\nid: 2\r\ndata: a["msg2"]\r\n\r\n')
+
+        await manager.clear()
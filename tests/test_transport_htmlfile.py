@@ -1,8 +1,9 @@
 from channels.testing import HttpCommunicator
 from django.test import TestCase
 
+from sockjs import protocol
 from sockjs.transports import htmlfile
-from .utils import make_scope, make_manager, make_mocked_coroutine, make_future
+from .utils import make_scope, make_manager, make_mocked_coroutine, make_future, patch_session
 
 
 def make_transport(path):
@@ -46,7 +47,7 @@ class TestSessionXhr(TestCase):
     async def test_process_no_callback(self):
         path = "/sockjs/000/000000/htmlfile"
         transport = make_transport(path)
-        transport.session.remote_closed = make_future(1)
+        patch_session(self, "remote_closed", make_future(1))
         communicator = HttpCommunicator(transport, "GET", path)
         communicator.scope = transport.scope
         response = await communicator.get_response()
@@ -59,7 +60,7 @@ class TestSessionXhr(TestCase):
     async def test_process_bad_callback(self):
         path = "/sockjs/000/000000/htmlfile?c=callback!!!!"
         transport = make_transport(path)
-        transport.session.remote_closed = make_future(1)
+        patch_session(self, "remote_closed", make_future(1))
         communicator = HttpCommunicator(transport, "GET", path)
         communicator.scope = transport.scope
         response = await communicator.get_response()
@@ -72,7 +73,7 @@ class TestSessionXhr(TestCase):
     async def test_session_has_scope(self):
         path = "/sockjs/000/000000/htmlfile?c=callback"
         transport = make_transport(path)
-        transport.session.release = make_future(1)
+        patch_session(self, "release", make_future(1))
         transport.maxsize = 1
         communicator = HttpCommunicator(transport, "GET", path)
         communicator.scope = transport.scope
@@ -83,3 +84,26 @@ class TestSessionXhr(TestCase):
         self.assertEqual(transport.session.scope, communicator.scope)
 
         await transport.manager.clear()
+
+    async def test_streaming_send_batches_ready_frames(self):
+        transport = make_transport(path="/sockjs/000/000000/htmlfile?c=callback")
+        session = transport.session
+        send = transport.send_body = make_mocked_coroutine(None)
+
+        await transport.manager.acquire(session)
+        session._feed(protocol.FRAME_HEARTBEAT, protocol.FRAME_HEARTBEAT)
+        session.send("</script>")
+        session.close()
+        await transport.manager.release(session)
+        session.state = protocol.STATE_OPEN
+        patch_session(self, "acquire", make_future(None))
+
+        await transport.handle_session()
+        send.assert_called_once()
+        body = send.call_args[0][0]
+        self.assertTrue(body.startswith(b'<script>\np("o");\np("h");\np("a['))
+        self.assertTrue(body.endswith(b'p("c[3000,\\"Go away!\\"]");\n</script>\r\n'))
+        self.assertEqual(body.count(b"</"), 1)
+        self.assertFalse(send.call_args[1]["more_body"])
+
+        await transport.manager.clear()
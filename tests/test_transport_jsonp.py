@@ -1,8 +1,11 @@
+from unittest import skipUnless
+
 from channels.testing import HttpCommunicator
 from django.test import TestCase
 
+from sockjs.protocol import get_codec
 from sockjs.transports import jsonp
-from .utils import make_scope, make_manager, make_mocked_coroutine, make_future
+from .utils import orjson, make_scope, make_manager, make_mocked_coroutine, make_future, patch_session
 
 
 def make_transport(method, path):
@@ -26,6 +29,18 @@ class TestSessionXhr(TestCase):
 
         await transport.manager.clear()
 
+    @skipUnless(orjson, "orjson is not installed")
+    async def test_streaming_send_escapes_line_separators(self):
+        transport = make_transport("GET", path="/sockjs/000/000000/jsonp?c=cb")
+        transport.callback = 'cb'
+        transport.manager.codec = get_codec("orjson")
+
+        send = transport.send_body = make_mocked_coroutine(None)
+        await transport.send_message('a["\u2028\u2029"]')
+        send.assert_called_with(b'/**/cb("a[\\"\\u2028\\u2029\\"]");\r\n', more_body=False)
+
+        await transport.manager.clear()
+
     async def test_process(self):
         path = "/sockjs/000/000000/jsonp?c=cb"
         transport = make_transport("GET", path=path)
@@ -40,7 +55,7 @@ class TestSessionXhr(TestCase):
     async def test_process_no_callback(self):
         path = "/sockjs/000/000000/jsonp"
         transport = make_transport("GET", path)
-        transport.session.remote_closed = make_future(1)
+        patch_session(self, "remote_closed", make_future(1))
         communicator = HttpCommunicator(transport, "GET", path)
         communicator.scope = transport.scope
         response = await communicator.get_response()
@@ -53,7 +68,7 @@ class TestSessionXhr(TestCase):
     async def test_process_bad_callback(self):
         path = "/sockjs/000/000000/jsonp?c=callback!!!!"
         transport = make_transport("GET", path)
-        transport.session.remote_closed = make_future(1)
+        patch_session(self, "remote_closed", make_future(1))
         communicator = HttpCommunicator(transport, "GET", path)
         communicator.scope = transport.scope
         response = await communicator.get_response()
@@ -112,7 +127,7 @@ class TestSessionXhr(TestCase):
     async def test_process_message(self):
         path = "/sockjs/000/000000/jsonp?c=callback"
         transport = make_transport("POST", path)
-        transport.session.remote_messages = make_future(1)
+        patch_session(self, "remote_messages", make_future(1))
         communicator = HttpCommunicator(transport, "POST", path, body=b'["msg1","msg2"]')
         communicator.scope = transport.scope
         response = await communicator.get_response()
@@ -125,7 +140,7 @@ class TestSessionXhr(TestCase):
     async def test_session_has_scope(self):
         path = "/sockjs/000/000000/jsonp?c=callback"
         transport = make_transport("GET", path)
-        transport.session.release = make_future(1)
+        patch_session(self, "release", make_future(1))
         communicator = HttpCommunicator(transport, "GET", path)
         communicator.scope = transport.scope
         await communicator.get_response()
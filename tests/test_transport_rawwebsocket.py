@@ -1,10 +1,12 @@
+from unittest import mock
+
 from channels.testing import WebsocketCommunicator
 from django.test import TestCase
 
 from sockjs import protocol
 from sockjs.protocol import STATE_CLOSED, STATE_OPEN, message_frame
 from sockjs.transports import rawwebsocket
-from .utils import make_websocket_scope, make_manager, make_future
+from .utils import make_websocket_scope, make_manager, make_future, patch_session
 
 path = "/sockjs/websocket"
 
@@ -88,9 +90,25 @@ class TestSessionWebsocket(TestCase):
 
         await transport.manager.clear()
 
+    async def test_broadcast(self):
+        transport = make_transport()
+        codec = transport.manager.codec = mock.Mock(wraps=transport.manager.codec)
+        communicator = WebsocketCommunicator(transport, path)
+        communicator.scope = transport.scope
+        accepted, _ = await communicator.connect()
+        self.assertTrue(accepted)
+
+        transport.manager.broadcast("test msg1")
+
+        response = await communicator.receive_from()
+        self.assertEqual(response, "test msg1")
+        self.assertFalse(codec.loads.called)
+
+        await transport.manager.clear()
+
     async def test_send_close(self):
         transport = make_transport()
-        transport.session.remote_closed = make_future(1)
+        patch_session(self, "remote_closed", make_future(1))
         communicator = WebsocketCommunicator(transport, path)
         communicator.scope = transport.scope
         accepted, _ = await communicator.connect()
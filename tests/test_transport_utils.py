@@ -0,0 +1,57 @@
+from django.test import TestCase
+
+from sockjs import VirtualClock
+from sockjs.transports.utils import HeaderTemplate, cache_headers
+from .utils import make_scope
+
+
+class TestHeaderTemplate(TestCase):
+    def test_render(self):
+        template = HeaderTemplate({b"Content-Type": b"text/plain"})
+        scope = make_scope("GET", "/sockjs/000/000000/xhr", headers=[(b"origin", b"http://example.com")])
+
+        headers = template.render(scope)
+        self.assertEqual(headers, [
+            (b"Content-Type", b"text/plain"),
+            (b"Set-Cookie", b"sessionID=dummy; Path=/"),
+            (b"Access-Control-Allow-Origin", b"http://example.com"),
+            (b"Access-Control-Allow-Credentials", b"true"),
+        ])
+
+        # rendered headers are reused, the returned list is a copy
+        headers.append((b"Content-Length", b"0"))
+        self.assertEqual(len(template.render(scope)), 4)
+        self.assertEqual(len(template._rendered), 1)
+
+    def test_render_per_request(self):
+        template = HeaderTemplate({}, cookie=True, cors=True)
+        scope = make_scope("OPTIONS", "/", headers=[(b"access-control-request-headers", b"x-test")])
+        scope["cookies"] = {"sessionID": "abc"}
+
+        headers = dict(template.render(scope))
+        self.assertEqual(headers[b"Set-Cookie"], b"sessionID=abc; Path=/")
+        self.assertEqual(headers[b"Access-Control-Allow-Origin"], b"*")
+        self.assertEqual(headers[b"Access-Control-Allow-Headers"], b"x-test")
+        self.assertNotIn(b"Access-Control-Allow-Credentials", headers)
+
+        scope["cookies"] = {"sessionID": "def"}
+        headers = dict(template.render(scope))
+        self.assertEqual(headers[b"Set-Cookie"], b"sessionID=def; Path=/")
+        self.assertEqual(len(template._rendered), 2)
+
+    def test_render_static(self):
+        template = HeaderTemplate({b"Content-Type": b"text/plain"}, cookie=False, cors=False)
+        scope = make_scope("GET", "/", headers=[(b"origin", b"http://example.com")])
+        self.assertEqual(template.render(scope), [(b"Content-Type", b"text/plain")])
+
+    def test_render_cache_headers(self):
+        clock = VirtualClock(epoch=0.0)
+        template = HeaderTemplate({}, cookie=False, cors=False, cache=True)
+        self.assertEqual(dict(template.render(make_scope("OPTIONS", "/"), clock)), cache_headers(clock))
+
+    def test_maxsize(self):
+        template = HeaderTemplate({})
+        template.maxsize = 2
+        for origin in (b"http://a", b"http://b", b"http://c"):
+            template.render(make_scope("GET", "/", headers=[(b"origin", origin)]))
+        self.assertEqual(len(template._rendered), 1)
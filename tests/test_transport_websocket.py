@@ -11,6 +11,7 @@ from .utils import (
     make_manager,
     make_mocked_coroutine,
     make_websocket_scope,
+    patch_session,
 )
 
 path = "/sockjs/000/000000/websocket"
@@ -39,12 +40,24 @@ class TestSessionWebsocket(TestCase):
 
         await transport.manager.clear()
 
+    async def test_handle_session_endpoint_codec(self):
+        transport = make_transport()
+        transport.session.interrupted = True
+        transport.manager.codec = protocol.get_codec("json")
+        transport.manager.codec.close_frame = lambda code, reason: "c[%d]" % code
+        send = transport.send = make_mocked_coroutine(None)
+
+        await transport.handle_session()
+        send.assert_called_with("c[1002]")
+
+        await transport.manager.clear()
+
     async def test_handle_session_closing(self):
         transport = make_transport()
         send = transport.send = make_mocked_coroutine(None)
         transport.session.interrupted = False
         transport.session.state = protocol.STATE_CLOSING
-        transport.session.remote_closed = make_future(1)
+        patch_session(self, "remote_closed", make_future(1))
         await transport.handle_session()
         transport.session.remote_closed.assert_called_with()
         send.assert_called_with('c[3000,"Go away!"]')
@@ -56,7 +69,7 @@ class TestSessionWebsocket(TestCase):
         send = transport.send = make_mocked_coroutine(None)
         transport.session.interrupted = False
         transport.session.state = protocol.STATE_CLOSED
-        transport.session.remote_closed = make_future(1)
+        patch_session(self, "remote_closed", make_future(1))
         await transport.handle_session()
         transport.session.remote_closed.assert_called_with()
         send.assert_called_with('c[3000,"Go away!"]')
@@ -66,7 +79,7 @@ class TestSessionWebsocket(TestCase):
     async def test_process_acquire_send_and_remote_closed(self):
         transport = make_transport()
         transport.session.interrupted = False
-        transport.session.remote_closed = make_mocked_coroutine()
+        patch_session(self, "remote_closed", make_mocked_coroutine())
         transport.manager.acquire = make_mocked_coroutine()
         communicator = WebsocketCommunicator(transport, path)
         accepted, _ = await communicator.connect()
@@ -146,7 +159,7 @@ class TestSessionWebsocket(TestCase):
 
     async def test_bad_json(self):
         transport = make_transport()
-        transport.session.remote_closed = make_future(1)
+        patch_session(self, "remote_closed", make_future(1))
         communicator = WebsocketCommunicator(transport, path)
         communicator.scope = transport.scope
         accepted, _ = await communicator.connect()
@@ -2,7 +2,7 @@ from channels.testing import HttpCommunicator
 from django.test import TestCase
 
 from sockjs.transports import xhr
-from .utils import make_scope, make_manager, make_future
+from .utils import make_scope, make_manager, make_future, patch_session
 
 path = "/sockjs/000/000000/xhr"
 
@@ -43,7 +43,7 @@ class TestSessionXhr(TestCase):
 
     async def test_session_has_scope(self):
         transport = make_transport()
-        transport.session.release = make_future(1)
+        patch_session(self, "release", make_future(1))
         communicator = HttpCommunicator(transport, "POST", path)
         communicator.scope = transport.scope
         await communicator.get_response()
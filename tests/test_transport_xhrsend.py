@@ -2,7 +2,7 @@ from channels.testing import HttpCommunicator
 from django.test import TestCase
 
 from sockjs.transports import xhrsend
-from .utils import make_scope, make_manager, make_future
+from .utils import make_scope, make_manager, make_future, patch_session
 
 path = "/sockjs/000/000000/xhr_send"
 
@@ -52,7 +52,7 @@ class TestSessionXhr(TestCase):
 
     async def test_post_message(self):
         transport = make_transport()
-        transport.session.remote_messages = make_future(1)
+        patch_session(self, "remote_messages", make_future(1))
         communicator = HttpCommunicator(transport, "POST", path, body=b'["msg1","msg2"]')
         communicator.scope = transport.scope
         response = await communicator.get_response()
@@ -13,6 +13,11 @@ import sockjs
 from sockjs import Session, SessionManager
 from sockjs.session import DEFAULT_SESSION_TIMEOUT
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
 
 def make_mocked_coroutine(return_value=sentinel, raise_exception=sentinel):
     """Creates a coroutine mock."""
@@ -63,6 +68,18 @@ def make_websocket_scope(path, headers=None, subprotocols=None):
     }
 
 
+def queued(session):
+    """Frames queued in session."""
+    return list(session._queue or ())
+
+
+def patch_session(testcase, name, value):
+    """Replace a method of ``Session``, sessions are slotted and can not be patched one by one."""
+    patcher = mock.patch.object(Session, name, value)
+    testcase.addCleanup(patcher.stop)
+    return patcher.start()
+
+
 def make_handler(result, exc=False):
     if result is None:
         result = []
@@ -76,18 +93,19 @@ def make_handler(result, exc=False):
     return async_handler
 
 
-def make_session(name="test", handler=None, scope=None, timeout=DEFAULT_SESSION_TIMEOUT, result=None):
+def make_session(name="test", handler=None, scope=None, timeout=DEFAULT_SESSION_TIMEOUT, result=None, clock=None,
+                 **kwargs):
     if scope is None:
         scope = make_scope("GET", path="/sockjs/000/000000/test")
     if handler is None:
         handler = make_handler(result)
-    return Session(name, handler, scope, timeout=timeout, debug=True)
+    return Session(name, handler, scope, timeout=timeout, debug=True, clock=clock, **kwargs)
 
 
-def make_manager(handler=None):
+def make_manager(handler=None, clock=None):
     if handler is None:
         handler = make_handler([])
-    return SessionManager("sm", handler, debug=True)
+    return SessionManager("sm", handler, debug=True, clock=clock)
 
 
 def make_application(name="test", prefix="sockjs", consumers=None, disable_consumers=(), handler=None):